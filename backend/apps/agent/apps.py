@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class AgentConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.agent'
+    verbose_name = 'AI Agent'
+
+    def ready(self):
+        import apps.agent.signals  # noqa
@@ -0,0 +1,83 @@
+"""
+Token-budgeted prompt assembly
+
+Every piece of a chat request (system prompt, tool schemas, knowledge base
+chunks, calendar text, history, the user message) is measured with tiktoken
+and added by priority until AGENT_INPUT_TOKEN_BUDGET is used up. Required
+pieces are capped, optional ones are truncated to what is left or dropped.
+The resulting breakdown is stored in Message.metadata['prompt_tokens'].
+"""
+from django.conf import settings
+from apps.embeddings.tokens import count_tokens, truncate_tokens
+
+# Tokens the chat format adds around each message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+class ContextPacker:
+    """Tracks token usage of one request against the input budget"""
+
+    def __init__(self, model, budget=None):
+        self.model = model
+        self.budget = budget or settings.AGENT_INPUT_TOKEN_BUDGET
+        self.used = 0
+        self.parts = {}
+        self.dropped = {}
+        self.truncated = 0
+
+    @property
+    def remaining(self):
+        return self.budget - self.used
+
+    def reserve(self, part, text, max_tokens=None):
+        """Add a required piece (always included, capped at max_tokens)"""
+        if max_tokens:
+            text = self._truncate(text, max_tokens)
+        self._add(part, count_tokens(text, self.model) + MESSAGE_OVERHEAD)
+        return text
+
+    def reserve_tokens(self, part, tokens):
+        """Add a required piece measured elsewhere (e.g. cached with the compiled prompt)"""
+        self._add(part, tokens)
+
+    def fit(self, part, text, max_tokens=None):
+        """
+        Add an optional piece if the budget allows
+
+        Truncated to max_tokens or to what is left of the budget;
+        returns None (and counts it as dropped) if too little is left.
+        """
+        limit = self.remaining - MESSAGE_OVERHEAD
+        if max_tokens:
+            limit = min(limit, max_tokens)
+
+        tokens = count_tokens(text, self.model)
+        if tokens > limit:
+            if limit < settings.AGENT_MIN_CONTEXT_PIECE_TOKENS:
+                self.dropped[part] = self.dropped.get(part, 0) + 1
+                return None
+            text = self._truncate(text, limit)
+            tokens = limit
+
+        self._add(part, tokens + MESSAGE_OVERHEAD)
+        return text
+
+    def stats(self):
+        """Token breakdown of the packed request"""
+        return {
+            'budget': self.budget,
+            'total': self.used,
+            'parts': dict(self.parts),
+            'dropped': dict(self.dropped),
+            'truncated': self.truncated,
+        }
+
+    def _add(self, part, tokens):
+        self.used += tokens
+        self.parts[part] = self.parts.get(part, 0) + tokens
+
+    def _truncate(self, text, max_tokens):
+        truncated = truncate_tokens(text, max_tokens, self.model)
+        if truncated != text:
+            self.truncated += 1
+        return truncated
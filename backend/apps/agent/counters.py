@@ -0,0 +1,127 @@
+"""
+Write-behind counters
+
+Conversation and Integration stats (message_count, total_tokens,
+messages_received, ...) are bumped with F() expressions in a single
+UPDATE instead of a full model save(). With COUNTERS_WRITE_BEHIND the
+increments are only added to a Redis hash per row and written to the
+database by the flush_counters beat task (every 10 seconds), so the chat
+response path does no counter writes at all; counters then lag by up to
+one flush interval.
+"""
+import logging
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django_redis import get_redis_connection
+from apps.accounts.middleware import TenantSchemaContext
+
+logger = logging.getLogger(__name__)
+
+HASH_KEY = 'counters:{label}:{tenant}:{pk}'  # field -> pending increment, touch:<field> -> 1
+DIRTY_KEY = 'counters:dirty'                 # set of "label:tenant:pk" with pending increments
+TOUCH_PREFIX = 'touch:'
+
+# Models living in tenant schemas - their increments must name the schema
+TENANT_MODELS = {'agent.Conversation', 'integrations.Integration'}
+
+
+def increment(model, pk, tenant_schema=None, touch=(), **deltas):
+    """
+    Add deltas to counter fields of one row
+
+    tenant_schema: schema of the row, required for TENANT_MODELS (None - public schema models)
+    touch: datetime fields set to now with the update (auto_now is skipped by update())
+    """
+    label = model._meta.label
+    if label in TENANT_MODELS and not tenant_schema:
+        raise ValueError(f"Counter increment for tenant model {label} needs tenant_schema")
+
+    if settings.COUNTERS_WRITE_BEHIND:
+        try:
+            _buffer(label, pk, tenant_schema, touch, deltas)
+            return
+        except Exception as e:
+            # Redis down - write through rather than lose the increment
+            logger.warning(f"Counter buffer failed for {label} {pk}: {e}")
+
+    # Write through in the same schema a flush would use
+    if tenant_schema:
+        with TenantSchemaContext(tenant_schema):
+            _update(model, pk, touch, deltas)
+    else:
+        _update(model, pk, touch, deltas)
+
+
+def flush(batch_size=None):
+    """Write pending increments to the database; returns number of rows updated"""
+    redis = get_redis_connection('default')
+    members = redis.spop(DIRTY_KEY, batch_size or settings.COUNTERS_FLUSH_BATCH) or []
+
+    rows = {}  # tenant -> [(label, pk, touch, deltas)]
+    for member in members:
+        label, tenant, pk = member.decode().split(':')
+        key = HASH_KEY.format(label=label, tenant=tenant, pk=pk)
+
+        # Read and clear atomically - increments arriving meanwhile start a new hash
+        pipe = redis.pipeline()
+        pipe.hgetall(key)
+        pipe.delete(key)
+        values, _ = pipe.execute()
+        if not values:
+            continue
+
+        deltas, touch = {}, []
+        for field, value in values.items():
+            field = field.decode()
+            if field.startswith(TOUCH_PREFIX):
+                touch.append(field[len(TOUCH_PREFIX):])
+            else:
+                deltas[field] = int(value)
+
+        rows.setdefault(tenant or None, []).append((label, int(pk), touch, deltas))
+
+    flushed = 0
+    for tenant, tenant_rows in rows.items():
+        if tenant:
+            with TenantSchemaContext(tenant):
+                flushed += _update_rows(tenant, tenant_rows)
+        else:
+            flushed += _update_rows(tenant, tenant_rows)
+
+    return flushed
+
+
+def _update_rows(tenant_schema, rows):
+    updated = 0
+    for label, pk, touch, deltas in rows:
+        try:
+            _update(apps.get_model(label), pk, touch, deltas)
+            updated += 1
+        except Exception as e:
+            # Put the increments back for the next flush
+            logger.error(f"Counter flush failed for {label} {pk} ({tenant_schema or 'public'}): {e}")
+            _buffer(label, pk, tenant_schema, touch, deltas)
+
+    return updated
+
+
+def _buffer(label, pk, tenant_schema, touch, deltas):
+    redis = get_redis_connection('default')
+    key = HASH_KEY.format(label=label, tenant=tenant_schema or '', pk=pk)
+
+    pipe = redis.pipeline(transaction=False)
+    for field, delta in deltas.items():
+        pipe.hincrby(key, field, delta)
+    for field in touch:
+        pipe.hset(key, TOUCH_PREFIX + field, 1)
+    pipe.sadd(DIRTY_KEY, f"{label}:{tenant_schema or ''}:{pk}")
+    pipe.execute()
+
+
+def _update(model, pk, touch, deltas):
+    now = timezone.now()
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    values.update({field: now for field in touch})
+    model.objects.filter(pk=pk).update(**values)
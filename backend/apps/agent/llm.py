@@ -0,0 +1,335 @@
+"""
+Shared OpenAI client
+
+One process-wide sync client (and one async client per event loop) with a
+tuned httpx connection pool, used by the agent and the embeddings pipeline
+instead of the module-level openai API. Every call gets a deadline (total
+time incl. retries), 429/5xx and connection errors are retried with
+exponential backoff and jitter, and with LLM_HEDGE_ENABLED a duplicate
+request is sent when the first one is slower than the recent p95 latency
+of that operation.
+
+Set OPENAI_BASE_URL to point the clients at another server (e.g. the local
+fake OpenAI server of the tests, apps/agent/tests/fake_openai.py).
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
+import openai
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,  # includes APITimeoutError
+)
+
+# Latency samples per operation for the hedging threshold
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20
+
+_clients = {}
+_async_clients = {}  # event loop -> (client, closer task)
+_client_lock = threading.Lock()
+_latencies = {}
+_hedge_executor = None
+
+
+class DeadlineExceeded(Exception):
+    """No attempt succeeded before the call deadline"""
+
+
+def get_client():
+    """Process-wide sync OpenAI client"""
+    with _client_lock:
+        if 'sync' not in _clients:
+            _clients['sync'] = openai.OpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL or None,
+                max_retries=0,  # retries are done here, within the deadline
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+            )
+        return _clients['sync']
+
+
+def get_async_client():
+    """
+    Async OpenAI client of the running event loop (httpx async pools are loop-bound)
+
+    The client is closed when its loop shuts down - asyncio.run() cancels
+    leftover tasks before closing the loop, which runs _close_with_loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        if loop not in _async_clients:
+            client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL or None,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+            _async_clients[loop] = (client, loop.create_task(_close_with_loop(loop, client)))
+        return _async_clients[loop][0]
+
+
+async def _close_with_loop(loop, client):
+    """Wait until cancelled at loop shutdown, then close the loop's client"""
+    try:
+        await loop.create_future()
+    finally:
+        with _client_lock:
+            _async_clients.pop(loop, None)
+        await client.close()
+
+
+# Sync API
+
+def chat_completion(deadline=None, hedge=True, **kwargs):
+    """client.chat.completions.create with deadline, retries and optional hedging"""
+    if kwargs.get('stream'):
+        # Streams can't be hedged; retries only cover opening the stream
+        return _call(lambda timeout: get_client().chat.completions.create(timeout=timeout, **kwargs), deadline)
+
+    return _call_hedged(
+        'chat:' + kwargs.get('model', ''),
+        lambda timeout: get_client().chat.completions.create(timeout=timeout, **kwargs),
+        deadline,
+        hedge
+    )
+
+
+def create_embedding(input, model, deadline=None, hedge=True):
+    """Embedding vector(s): list of floats for a string input, list of vectors for a list"""
+    response = _call_hedged(
+        'embed:' + model,
+        lambda timeout: get_client().embeddings.create(input=input, model=model, timeout=timeout),
+        deadline,
+        hedge
+    )
+    if isinstance(input, str):
+        return response.data[0].embedding
+    return [item.embedding for item in response.data]
+
+
+# Async API
+
+async def achat_completion(deadline=None, hedge=True, **kwargs):
+    """Async chat completion with deadline, retries and optional hedging"""
+    if kwargs.get('stream'):
+        return await _acall(lambda timeout: get_async_client().chat.completions.create(timeout=timeout, **kwargs), deadline)
+
+    return await _acall_hedged(
+        'chat:' + kwargs.get('model', ''),
+        lambda timeout: get_async_client().chat.completions.create(timeout=timeout, **kwargs),
+        deadline,
+        hedge
+    )
+
+
+async def acreate_embedding(input, model, deadline=None, hedge=True):
+    response = await _acall_hedged(
+        'embed:' + model,
+        lambda timeout: get_async_client().embeddings.create(input=input, model=model, timeout=timeout),
+        deadline,
+        hedge
+    )
+    if isinstance(input, str):
+        return response.data[0].embedding
+    return [item.embedding for item in response.data]
+
+
+# Retries
+
+def _call(request, deadline=None, cancelled=None):
+    """
+    Run request(timeout) until success, a non-retryable error or the deadline
+
+    cancelled: threading.Event set when another (hedged) attempt already
+    answered - no further retries are made
+    """
+    expires = time.monotonic() + (deadline or settings.LLM_DEADLINE)
+    attempt = 0
+
+    while True:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"OpenAI call exceeded {deadline or settings.LLM_DEADLINE}s deadline")
+
+        try:
+            return request(min(settings.LLM_REQUEST_TIMEOUT, remaining))
+        except RETRYABLE_ERRORS as e:
+            attempt += 1
+            delay = _backoff(attempt, e)
+            if attempt > settings.LLM_MAX_RETRIES or time.monotonic() + delay >= expires:
+                raise
+            logger.warning(f"OpenAI call failed ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+            if cancelled is None:
+                time.sleep(delay)
+            elif cancelled.wait(delay):
+                raise
+
+
+async def _acall(request, deadline=None):
+    expires = time.monotonic() + (deadline or settings.LLM_DEADLINE)
+    attempt = 0
+
+    while True:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"OpenAI call exceeded {deadline or settings.LLM_DEADLINE}s deadline")
+
+        try:
+            return await request(min(settings.LLM_REQUEST_TIMEOUT, remaining))
+        except RETRYABLE_ERRORS as e:
+            attempt += 1
+            delay = _backoff(attempt, e)
+            if attempt > settings.LLM_MAX_RETRIES or time.monotonic() + delay >= expires:
+                raise
+            logger.warning(f"OpenAI call failed ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+def _backoff(attempt, error):
+    """Exponential backoff with full jitter; honours Retry-After on 429"""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), settings.LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(settings.LLM_BACKOFF_BASE * (2 ** (attempt - 1)), settings.LLM_BACKOFF_MAX))
+
+
+# Hedging
+
+def _call_hedged(operation, request, deadline, hedge):
+    threshold = _hedge_threshold(operation) if hedge else None
+    started = time.monotonic()
+
+    if threshold is None:
+        result = _call(request, deadline)
+        _record_latency(operation, time.monotonic() - started)
+        return result
+
+    executor = _get_hedge_executor()
+    cancelled = threading.Event()
+    attempts = [executor.submit(_call, request, deadline, cancelled)]
+
+    try:
+        done, _ = wait(attempts, timeout=threshold)
+
+        if not done:
+            logger.info(f"Hedging {operation} after {threshold:.2f}s")
+            remaining = (deadline or settings.LLM_DEADLINE) - (time.monotonic() - started)
+            attempts.append(executor.submit(_call, request, max(remaining, 0.1), cancelled))
+            done, _ = wait(attempts, return_when=FIRST_COMPLETED)
+
+            # Prefer a successful result if the first finished attempt failed
+            winner = next(iter(done))
+            if winner.exception() is not None:
+                other = attempts[1] if winner is attempts[0] else attempts[0]
+                if other.exception() is None:
+                    winner = other
+            result = winner.result()
+        else:
+            result = attempts[0].result()
+    finally:
+        # The losing attempt makes no more retries (its request in flight is bounded
+        # by LLM_REQUEST_TIMEOUT) and is dropped if still queued on a busy pool
+        cancelled.set()
+        for attempt in attempts:
+            attempt.cancel()
+
+    _record_latency(operation, time.monotonic() - started)
+    return result
+
+
+async def _acall_hedged(operation, request, deadline, hedge):
+    threshold = _hedge_threshold(operation) if hedge else None
+    started = time.monotonic()
+
+    if threshold is None:
+        result = await _acall(request, deadline)
+        _record_latency(operation, time.monotonic() - started)
+        return result
+
+    primary = asyncio.ensure_future(_acall(request, deadline))
+    pending = {primary}
+
+    try:
+        done, pending = await asyncio.wait(pending, timeout=threshold)
+
+        if not done:
+            logger.info(f"Hedging {operation} after {threshold:.2f}s")
+            remaining = (deadline or settings.LLM_DEADLINE) - (time.monotonic() - started)
+            pending.add(asyncio.ensure_future(_acall(request, max(remaining, 0.1))))
+            result, error = None, None
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                task = done.pop()
+                if task.exception() is None:
+                    result, error = task.result(), None
+                    break
+                error = task.exception()
+
+            if error is not None:
+                raise error
+        else:
+            result = primary.result()
+    finally:
+        # Losing attempt - also when the caller itself was cancelled
+        for task in pending:
+            task.cancel()
+
+    _record_latency(operation, time.monotonic() - started)
+    return result
+
+
+def _hedge_threshold(operation):
+    """p95 latency of recent calls, or None if hedging is off / not enough samples"""
+    if not settings.LLM_HEDGE_ENABLED:
+        return None
+
+    samples = _latencies.get(operation)
+    if not samples or len(samples) < MIN_HEDGE_SAMPLES:
+        return None
+
+    ordered = sorted(samples)
+    return ordered[int(len(ordered) * 0.95) - 1]
+
+
+def _record_latency(operation, seconds):
+    _latencies.setdefault(operation, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    with _client_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=settings.LLM_MAX_CONNECTIONS,
+                thread_name_prefix='llm-hedge'
+            )
+        return _hedge_executor
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout():
+    return httpx.Timeout(settings.LLM_REQUEST_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
@@ -0,0 +1,34 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.middleware import TenantSchemaContext
+from apps.agent import partitions
+from apps.agent.models import MessageArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Restore archived chat messages of a tenant for one month from object storage. "
+        "The month is archived again MESSAGE_RESTORE_KEEP_DAYS later."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tenant_schema', help="Tenant schema name, e.g. tenant_abc123")
+        parser.add_argument('month', help="Month to restore, YYYY-MM")
+
+    def handle(self, *args, **options):
+        tenant_schema = options['tenant_schema']
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f"Invalid month '{options['month']}', expected YYYY-MM")
+
+        with TenantSchemaContext(tenant_schema):
+            archive = MessageArchive.objects.filter(month=month).first()
+            if not archive:
+                raise CommandError(f"No message archive for {month:%Y-%m} in {tenant_schema}")
+
+            restored = partitions.restore(archive)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {restored} of {archive.row_count} messages of {month:%Y-%m} into {tenant_schema}"
+        ))
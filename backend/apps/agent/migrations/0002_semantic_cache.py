@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='semantic_cache_enabled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='CachedResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('question', models.TextField()),
+                ('answer', models.TextField()),
+                ('prompt_version', models.IntegerField()),
+                ('hits', models.IntegerField(default=0)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cached Response',
+                'verbose_name_plural': 'Cached Responses',
+                'db_table': 'agent_cached_responses',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user_id', 'prompt_version'], name='cached_resp_user_version_idx')],
+            },
+        ),
+        migrations.RunSQL(
+            sql="ALTER TABLE agent_cached_responses ADD COLUMN IF NOT EXISTS query_vector vector(1536)",
+            reverse_sql="ALTER TABLE agent_cached_responses DROP COLUMN IF EXISTS query_vector",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0003_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='routing_enabled',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='fast_model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.0.1 on 2026-10-19 20:00
+
+from django.db import migrations, models
+
+# messages becomes a table partitioned by month of created_at. Partitioned
+# tables need the partition key in the primary key, hence (id, created_at);
+# ids keep coming from one sequence, so id alone stays unique for Django.
+# Partitions exist from the oldest message up to 3 months ahead - later ones
+# are created by the maintain_message_partitions task (apps.agent.partitions).
+PARTITION_MESSAGES_SQL = """
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER INDEX messages_pkey RENAME TO messages_unpartitioned_pkey;
+ALTER INDEX messages_convers_3ebb41_idx RENAME TO messages_unpartitioned_convers_idx;
+
+CREATE SEQUENCE messages_partitioned_id_seq;
+
+CREATE TABLE messages (
+    id bigint NOT NULL DEFAULT nextval('messages_partitioned_id_seq'),
+    role varchar(20) NOT NULL,
+    content text NOT NULL,
+    photo_id integer NULL,
+    context_used jsonb NOT NULL,
+    tokens_used integer NOT NULL,
+    processing_time double precision NULL,
+    metadata jsonb NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    conversation_id bigint NOT NULL REFERENCES conversations (id) DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX messages_convers_3ebb41_idx ON messages (conversation_id, created_at);
+
+DO $$
+DECLARE
+    part_month date := date_trunc(
+        'month', COALESCE((SELECT MIN(created_at) FROM messages_unpartitioned), now()) AT TIME ZONE 'UTC'
+    )::date;
+    last_month date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+BEGIN
+    WHILE part_month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+            'messages_p' || to_char(part_month, 'YYYY_MM'),
+            part_month::timestamp AT TIME ZONE 'UTC',
+            (part_month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        part_month := (part_month + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+INSERT INTO messages (
+    id, role, content, photo_id, context_used, tokens_used,
+    processing_time, metadata, created_at, conversation_id
+)
+SELECT
+    id, role, content, photo_id, context_used, tokens_used,
+    processing_time, metadata, created_at, conversation_id
+FROM messages_unpartitioned;
+
+SELECT setval('messages_partitioned_id_seq', COALESCE((SELECT MAX(id) FROM messages), 0) + 1, false);
+
+DROP TABLE messages_unpartitioned;
+
+ALTER SEQUENCE messages_partitioned_id_seq RENAME TO messages_id_seq;
+ALTER SEQUENCE messages_id_seq OWNED BY messages.id;
+"""
+
+UNPARTITION_MESSAGES_SQL = """
+ALTER TABLE messages RENAME TO messages_partitioned;
+ALTER INDEX messages_pkey RENAME TO messages_partitioned_pkey;
+ALTER INDEX messages_convers_3ebb41_idx RENAME TO messages_partitioned_convers_idx;
+ALTER SEQUENCE messages_id_seq RENAME TO messages_partitioned_id_seq;
+
+CREATE TABLE messages (
+    id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    role varchar(20) NOT NULL,
+    content text NOT NULL,
+    photo_id integer NULL,
+    context_used jsonb NOT NULL,
+    tokens_used integer NOT NULL,
+    processing_time double precision NULL,
+    metadata jsonb NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    conversation_id bigint NOT NULL REFERENCES conversations (id) DEFERRABLE INITIALLY DEFERRED
+);
+
+CREATE INDEX messages_convers_3ebb41_idx ON messages (conversation_id, created_at);
+CREATE INDEX messages_conversation_id_idx ON messages (conversation_id);
+
+INSERT INTO messages (
+    id, role, content, photo_id, context_used, tokens_used,
+    processing_time, metadata, created_at, conversation_id
+)
+OVERRIDING SYSTEM VALUE
+SELECT
+    id, role, content, photo_id, context_used, tokens_used,
+    processing_time, metadata, created_at, conversation_id
+FROM messages_partitioned;
+
+SELECT setval(pg_get_serial_sequence('messages', 'id'), COALESCE((SELECT MAX(id) FROM messages), 0) + 1, false);
+
+DROP TABLE messages_partitioned;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0004_prompt_routing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('file_path', models.CharField(max_length=500)),
+                ('row_count', models.IntegerField(default=0)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('restored_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Message Archive',
+                'verbose_name_plural': 'Message Archives',
+                'db_table': 'agent_message_archives',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.RunSQL(
+            sql=PARTITION_MESSAGES_SQL,
+            reverse_sql=UNPARTITION_MESSAGES_SQL,
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 21:00
+
+from django.db import migrations
+
+# Catch-all partition: a message outside every monthly partition (maintenance
+# task didn't run, clock skew) lands here instead of failing the insert.
+# apps.agent.partitions moves such rows into their month once it is created.
+CREATE_DEFAULT_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+"""
+
+DROP_DEFAULT_PARTITION_SQL = """
+DROP TABLE IF EXISTS messages_default;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0005_partition_messages'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_DEFAULT_PARTITION_SQL,
+            reverse_sql=DROP_DEFAULT_PARTITION_SQL,
+        ),
+    ]
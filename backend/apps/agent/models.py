@@ -26,6 +26,13 @@ class Prompt(models.Model):
     max_tokens = models.IntegerField(default=500)
     model = models.CharField(max_length=100, default='gpt-4-turbo-preview')
 
+    # Easy turns go to a fast model (see router.py); blank fast_model = AGENT_FAST_MODEL
+    routing_enabled = models.BooleanField(default=True)
+    fast_model = models.CharField(max_length=100, blank=True)
+
+    # Reuse answers to near-identical questions (opt-in, see semantic_cache.py)
+    semantic_cache_enabled = models.BooleanField(default=False)
+
     # Status
     is_active = models.BooleanField(default=True)
     version = models.IntegerField(default=1)
@@ -78,6 +85,11 @@ class Conversation(models.Model):
     message_count = models.IntegerField(default=0)
     total_tokens = models.IntegerField(default=0)
 
+    # Rolling summary of turns older than the history window (see tasks.summarize_conversation)
+    summary = models.TextField(blank=True)
+    summary_message_id = models.BigIntegerField(null=True, blank=True)  # last message folded into summary
+    summary_updated_at = models.DateTimeField(null=True, blank=True)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -99,6 +111,10 @@ class Conversation(models.Model):
 class Message(models.Model):
     """
     Повідомлення в розмові (в tenant schema)
+
+    Table is partitioned by month of created_at (primary key is (id, created_at)
+    in the database, see migration 0005 and partitions.py); old months are moved
+    to object storage as MessageArchive.
     """
     ROLE_CHOICES = [
         ('user', 'User'),
@@ -139,3 +155,62 @@ class Message(models.Model):
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}"
+
+
+class MessageArchive(models.Model):
+    """
+    Місячна партиція повідомлень, вивантажена в object storage (в tenant schema)
+    """
+    month = models.DateField(unique=True)  # first day of the month
+    file_path = models.CharField(max_length=500)  # gzip JSONL, one message per line
+    row_count = models.IntegerField(default=0)
+    size_bytes = models.BigIntegerField(default=0)
+
+    # Set by the restore_messages command; the partition is dropped again after MESSAGE_RESTORE_KEEP_DAYS
+    restored_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'agent_message_archives'
+        verbose_name = 'Message Archive'
+        verbose_name_plural = 'Message Archives'
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"Messages {self.month:%Y-%m} ({self.row_count})"
+
+
+class CachedResponse(models.Model):
+    """
+    Закешована відповідь на питання для семантичного кешу (в tenant schema)
+    """
+    user_id = models.IntegerField(db_index=True)
+    question = models.TextField()
+    answer = models.TextField()
+
+    # Entry is only valid for the prompt version it was answered with;
+    # knowledge base changes delete all entries (see signals.py)
+    prompt_version = models.IntegerField()
+
+    # Question vector (pgvector, 1536 dimensions) - column added with raw SQL in migration
+    # query_vector = vector(1536)
+
+    # Stats
+    hits = models.IntegerField(default=0)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'agent_cached_responses'
+        verbose_name = 'Cached Response'
+        verbose_name_plural = 'Cached Responses'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user_id', 'prompt_version'], name='cached_resp_user_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.question[:50]} ({self.hits} hits)"
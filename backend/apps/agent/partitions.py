@@ -0,0 +1,307 @@
+"""
+Monthly partitions of the messages table
+
+Each tenant's messages table is partitioned by month of created_at
+(messages_pYYYY_MM, see migration 0005). maintain() keeps partitions
+MESSAGE_PARTITIONS_AHEAD months ahead of now, and moves months older than
+the plan's message_retention_months to object storage: the partition is
+detached, exported as gzip JSONL to archives/messages/<tenant>/<YYYY-MM>.jsonl.gz,
+recorded as MessageArchive and dropped. restore() loads an archived month
+back (restore_messages management command); it is dropped again
+MESSAGE_RESTORE_KEEP_DAYS after the restore.
+
+Messages outside every monthly partition go to messages_default (migration
+0006) rather than failing. create_partition() moves them into their month;
+maintain() logs an error while any are left or when lookahead runs low.
+
+All functions work on the current search_path - wrap them in TenantSchemaContext.
+"""
+import gzip
+import json
+import logging
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Conversation, MessageArchive
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = 'messages_p'
+DEFAULT_PARTITION = 'messages_default'
+ARCHIVE_PATH = 'archives/messages/{tenant}/{month:%Y-%m}.jsonl.gz'
+COLUMNS = [
+    'id', 'role', 'content', 'photo_id', 'context_used', 'tokens_used',
+    'processing_time', 'metadata', 'created_at', 'conversation_id',
+]
+JSON_COLUMNS = {'context_used', 'metadata'}
+BATCH_SIZE = 2000
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def month_of(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(months_ahead=None):
+    """Create partitions from the current month up to months_ahead; returns names created"""
+    months_ahead = settings.MESSAGE_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    current = month_of(timezone.now())
+    existing = {name for name, _ in attached_partitions()}
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if partition_name(month) not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+
+    return created
+
+
+def create_partition(month):
+    """Create the month's partition, moving its rows out of the default partition"""
+    name = partition_name(month)
+    bounds = [_month_start(month), _month_start(add_months(month, 1))]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0]:
+            return
+
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s)',
+            bounds
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE "{name}" PARTITION OF messages FOR VALUES FROM (%s) TO (%s)', bounds)
+            return
+
+        # A plain CREATE ... PARTITION OF fails while the default partition holds rows
+        # of the range: build the table, move the rows over, then attach it
+        logger.warning(f"Moving messages of {month:%Y-%m} out of {DEFAULT_PARTITION} into {name}")
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS ('
+            f'    DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s RETURNING *'
+            f') INSERT INTO "{name}" SELECT * FROM moved',
+            bounds
+        )
+        cursor.execute(f'ALTER TABLE messages ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds)
+
+
+def attached_partitions():
+    """[(name, month)] of partitions attached to messages in the current schema, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.oid = 'messages'::regclass
+        """)
+        names = [row[0] for row in cursor.fetchall()]
+
+    return sorted((name, _parse_month(name)) for name in names if _parse_month(name))
+
+
+def detached_partitions():
+    """[(name, month)] of messages_pYYYY_MM tables left detached by an interrupted archive run"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT relname
+            FROM pg_class
+            WHERE relkind = 'r'
+              AND relnamespace = current_schema()::regnamespace
+              AND relname LIKE 'messages\\_p%'
+              AND NOT relispartition
+        """)
+        names = [row[0] for row in cursor.fetchall()]
+
+    return sorted((name, _parse_month(name)) for name in names if _parse_month(name))
+
+
+def maintain(tenant_schema, retention_months):
+    """Create upcoming partitions and archive expired ones; returns stats"""
+    _check_coverage(tenant_schema)
+    stats = {'created': ensure_partitions(), 'archived': [], 'dropped': []}
+
+    default_rows = default_partition_rows()
+    if default_rows:
+        logger.error(
+            f"{default_rows} messages of {tenant_schema} are in {DEFAULT_PARTITION} "
+            f"outside the partitioned months - check their created_at"
+        )
+
+    if not retention_months:
+        return stats
+
+    cutoff = add_months(month_of(timezone.now()), -retention_months)
+    archives = {archive.month: archive for archive in MessageArchive.objects.filter(month__lt=cutoff)}
+    keep_restored_since = timezone.now() - timedelta(days=settings.MESSAGE_RESTORE_KEEP_DAYS)
+
+    expired = [(name, month) for name, month in attached_partitions() if month < cutoff]
+    for name, month in expired:
+        archive = archives.get(month)
+        if archive and archive.restored_at and archive.restored_at > keep_restored_since:
+            continue  # restored on request, kept for a while
+
+        detach_partition(name)
+
+    for name, month in detached_partitions():
+        if month >= cutoff:
+            continue
+
+        if month not in archives:
+            archives[month] = archive_partition(tenant_schema, name, month)
+            stats['archived'].append(name)
+
+        drop_partition(name)
+        stats['dropped'].append(name)
+
+    return stats
+
+
+def default_partition_rows():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM "{DEFAULT_PARTITION}"')
+        return cursor.fetchone()[0]
+
+
+def detach_partition(name):
+    with connection.cursor() as cursor:
+        # A concurrent detach interrupted before the default partition existed is left pending - finish it
+        cursor.execute(
+            "SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = %s::regclass",
+            [name]
+        )
+        row = cursor.fetchone()
+        if row and row[0]:
+            cursor.execute(f'ALTER TABLE messages DETACH PARTITION "{name}" FINALIZE')
+        else:
+            # DETACH CONCURRENTLY isn't allowed next to a default partition. A plain detach
+            # locks messages only briefly - the partition is old, nothing writes to it
+            cursor.execute(f'ALTER TABLE messages DETACH PARTITION "{name}"')
+
+
+def drop_partition(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+
+
+def archive_partition(tenant_schema, name, month):
+    """Export a detached partition to object storage as gzip JSONL, record MessageArchive"""
+    path = ARCHIVE_PATH.format(tenant=tenant_schema, month=month)
+    row_count = 0
+
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as spooled:
+        with gzip.GzipFile(fileobj=spooled, mode='wb') as gz:
+            # Server-side cursor - a month of messages doesn't have to fit in memory
+            with transaction.atomic(), connection.chunked_cursor() as cursor:
+                cursor.execute(f'SELECT row_to_json(m)::text FROM "{name}" m ORDER BY id')
+                while True:
+                    rows = cursor.fetchmany(BATCH_SIZE)
+                    if not rows:
+                        break
+                    for (line,) in rows:
+                        gz.write(line.encode('utf-8') + b'\n')
+                    row_count += len(rows)
+
+        size_bytes = spooled.tell()
+        spooled.seek(0)
+
+        # Re-archiving after an interrupted run replaces the earlier file
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        path = default_storage.save(path, File(spooled, name=path))
+
+    archive, _ = MessageArchive.objects.update_or_create(
+        month=month,
+        defaults={'file_path': path, 'row_count': row_count, 'size_bytes': size_bytes, 'restored_at': None}
+    )
+    logger.info(f"Archived {row_count} messages of {month:%Y-%m} for {tenant_schema} to {path}")
+    return archive
+
+
+def restore(archive):
+    """
+    Load an archived month back into its partition
+
+    Messages of conversations deleted since the archive are skipped.
+    Returns number of restored messages.
+    """
+    create_partition(archive.month)
+    conversation_ids = set(Conversation.objects.values_list('id', flat=True))
+
+    placeholders = ', '.join(['%s'] * len(COLUMNS))
+    insert_sql = (
+        f"INSERT INTO messages ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+        f"ON CONFLICT DO NOTHING"
+    )
+
+    restored = 0
+    with default_storage.open(archive.file_path, 'rb') as stored, gzip.GzipFile(fileobj=stored) as gz:
+        batch = []
+        for line in gz:
+            row = json.loads(line)
+            if row['conversation_id'] not in conversation_ids:
+                continue
+
+            batch.append([
+                json.dumps(row[column]) if column in JSON_COLUMNS else row[column]
+                for column in COLUMNS
+            ])
+            if len(batch) >= BATCH_SIZE:
+                restored += _insert(insert_sql, batch)
+                batch = []
+
+        if batch:
+            restored += _insert(insert_sql, batch)
+
+    archive.restored_at = timezone.now()
+    archive.save(update_fields=['restored_at'])
+    return restored
+
+
+def _insert(sql, rows):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+def _check_coverage(tenant_schema):
+    """Log an error when fewer than two months (current and next) have partitions"""
+    current = month_of(timezone.now())
+    attached = {month for _, month in attached_partitions()}
+
+    covered = 0
+    while add_months(current, covered) in attached:
+        covered += 1
+
+    if covered < 2:
+        logger.error(
+            f"Message partitions of {tenant_schema} cover only {covered} month(s) from {current:%Y-%m} - "
+            f"is maintain_message_partitions running? New messages go to {DEFAULT_PARTITION}"
+        )
+
+
+def _month_start(month):
+    return datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+
+
+def _parse_month(name):
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], '%Y_%m').date()
+    except ValueError:
+        return None
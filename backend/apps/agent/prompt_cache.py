@@ -0,0 +1,113 @@
+"""
+Compiled prompt cache
+
+The system prompt of a user's active Prompt is compiled once per
+(tenant, user, Prompt.version) together with its token count and the token
+count of the tool schemas, and kept in process memory with Redis as the
+shared fallback. A Redis pointer holds the current version, so a chat turn
+needs no Prompt query at all; PromptView.perform_update moves the pointer.
+"""
+import json
+import threading
+from django.core.cache import cache
+from apps.embeddings.tokens import count_tokens
+
+POINTER_KEY = 'agent:prompt:{tenant}:{user_id}'                # -> current version
+COMPILED_KEY = 'agent:prompt:{tenant}:{user_id}:v{version}'  # -> compiled fields
+CACHE_TIMEOUT = 60 * 60 * 24
+MAX_LOCAL_ENTRIES = 1000
+
+_local = {}  # (tenant, user_id, version) -> CompiledPrompt
+_lock = threading.Lock()
+
+
+class CompiledPrompt:
+    """Read-only snapshot of a Prompt with its compiled system prompt"""
+
+    FIELDS = [
+        'id', 'version', 'model', 'fast_model', 'routing_enabled', 'temperature', 'max_tokens',
+        'semantic_cache_enabled',
+        'system_prompt', 'system_tokens', 'tools_tokens',
+    ]
+
+    def __init__(self, **data):
+        for field in self.FIELDS:
+            setattr(self, field, data.get(field))
+
+    @classmethod
+    def compile(cls, prompt, tools):
+        system_prompt = prompt.get_system_prompt()
+        return cls(
+            id=prompt.id,
+            version=prompt.version,
+            model=prompt.model,
+            fast_model=prompt.fast_model,
+            routing_enabled=prompt.routing_enabled,
+            temperature=prompt.temperature,
+            max_tokens=prompt.max_tokens,
+            semantic_cache_enabled=prompt.semantic_cache_enabled,
+            system_prompt=system_prompt,
+            system_tokens=count_tokens(system_prompt, prompt.model),
+            tools_tokens=count_tokens(json.dumps(tools), prompt.model) if tools else 0,
+        )
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def get_system_prompt(self):
+        return self.system_prompt
+
+
+def get_compiled_prompt(tenant_schema, user_id, loader, tools):
+    """
+    Compiled active prompt of user
+
+    loader: returns the Prompt model instance (only called on a cache miss)
+    tools: tool schema list whose token count is cached alongside
+    """
+    version = cache.get(POINTER_KEY.format(tenant=tenant_schema, user_id=user_id))
+
+    if version is not None:
+        compiled = _local.get((tenant_schema, user_id, version))
+        if compiled:
+            return compiled
+
+        data = cache.get(COMPILED_KEY.format(tenant=tenant_schema, user_id=user_id, version=version))
+        if data:
+            compiled = CompiledPrompt(**data)
+            _remember(tenant_schema, user_id, compiled)
+            return compiled
+
+    compiled = CompiledPrompt.compile(loader(), tools)
+    cache.set(
+        COMPILED_KEY.format(tenant=tenant_schema, user_id=user_id, version=compiled.version),
+        compiled.to_dict(),
+        CACHE_TIMEOUT
+    )
+
+    # A slow turn that loaded the prompt before an update must not move the pointer back
+    if version is None or compiled.version >= version:
+        cache.set(POINTER_KEY.format(tenant=tenant_schema, user_id=user_id), compiled.version, CACHE_TIMEOUT)
+
+    _remember(tenant_schema, user_id, compiled)
+    return compiled
+
+
+def invalidate(tenant_schema, user_id, version=None):
+    """Point all processes at a new prompt version (or drop the pointer) and forget local copies"""
+    pointer = POINTER_KEY.format(tenant=tenant_schema, user_id=user_id)
+    if version is None:
+        cache.delete(pointer)
+    else:
+        cache.set(pointer, version, CACHE_TIMEOUT)
+
+    with _lock:
+        for key in [key for key in _local if key[:2] == (tenant_schema, user_id)]:
+            _local.pop(key, None)
+
+
+def _remember(tenant_schema, user_id, compiled):
+    with _lock:
+        if len(_local) >= MAX_LOCAL_ENTRIES:
+            _local.clear()
+        _local[(tenant_schema, user_id, compiled.version)] = compiled
@@ -0,0 +1,120 @@
+"""
+Per-turn model routing
+
+Easy turns (greetings, short questions answered well by the knowledge base)
+go to a fast model, everything else to the model configured in the Prompt.
+The decision is a cheap local heuristic over signals that are already
+computed for the turn - no extra API call:
+
+    length      - tokens in the user message
+    tools       - calendar tools offered and the message is about booking
+    rag         - best knowledge base similarity (confident hit = easy)
+    language    - scripts other than Latin/Cyrillic go to the full model
+    history     - long conversations keep the full model
+
+Tenants override the fast model or switch routing off per Prompt
+(Prompt.fast_model, Prompt.routing_enabled). Every decision is logged as
+one JSON line on the 'apps.agent.router' logger and stored in
+Message.metadata['routing'] for offline evaluation.
+"""
+import json
+import logging
+import unicodedata
+from django.conf import settings
+from apps.embeddings.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+FAST = 'fast'
+FULL = 'full'
+
+GREETINGS = {
+    'hi', 'hello', 'hey', 'thanks', 'thank you', 'ok', 'bye',
+    'привіт', 'вітаю', 'дякую', 'добрий день', 'доброго дня', 'добрий вечір', 'па',
+}
+
+SUPPORTED_SCRIPTS = ('LATIN', 'CYRILLIC')
+
+
+class RoutingDecision:
+    """Chosen model with the signals it was based on"""
+
+    def __init__(self, model, tier, reasons, signals):
+        self.model = model
+        self.tier = tier
+        self.reasons = reasons
+        self.signals = signals
+
+    def to_dict(self):
+        return {'model': self.model, 'tier': self.tier, 'reasons': self.reasons, 'signals': self.signals}
+
+
+def route(prompt, user_message, needs_tools, rag_results, history_length):
+    """
+    Pick the model for one chat turn
+
+    prompt: CompiledPrompt of the user
+    needs_tools: calendar tools are offered and the message is about booking
+    rag_results: search_similar results (ordered by similarity)
+    history_length: messages of this conversation sent as history
+    """
+    text = user_message.strip()
+    signals = {
+        'tokens': count_tokens(text, prompt.model),
+        'needs_tools': bool(needs_tools),
+        'rag_similarity': round(rag_results[0]['similarity'], 4) if rag_results else None,
+        'script': _script(text),
+        'history': history_length,
+    }
+
+    fast_model = prompt.fast_model or settings.AGENT_FAST_MODEL
+    if not (settings.AGENT_ROUTING_ENABLED and prompt.routing_enabled) or not fast_model or fast_model == prompt.model:
+        return _decide(prompt.model, FULL, ['routing disabled'], signals)
+
+    # Any of these makes the turn hard
+    reasons = []
+    if signals['needs_tools']:
+        reasons.append('tool use')
+    if signals['tokens'] > settings.AGENT_ROUTING_MAX_FAST_TOKENS:
+        reasons.append('long message')
+    if signals['script'] not in SUPPORTED_SCRIPTS + (None,):
+        reasons.append(f"script {signals['script'].lower()}")
+    if history_length > settings.AGENT_ROUTING_MAX_FAST_HISTORY:
+        reasons.append('long conversation')
+    if reasons:
+        return _decide(prompt.model, FULL, reasons, signals)
+
+    # Short message - easy if it's small talk or the knowledge base has a confident answer
+    if _is_greeting(text):
+        return _decide(fast_model, FAST, ['greeting'], signals)
+
+    similarity = signals['rag_similarity']
+    if similarity is not None and similarity >= settings.AGENT_ROUTING_MIN_RAG_SIMILARITY:
+        return _decide(fast_model, FAST, ['confident knowledge base hit'], signals)
+
+    return _decide(prompt.model, FULL, ['no confident knowledge base hit'], signals)
+
+
+def _decide(model, tier, reasons, signals):
+    decision = RoutingDecision(model, tier, reasons, signals)
+    logger.info(json.dumps({'event': 'agent_routing', **decision.to_dict()}, ensure_ascii=False))
+    return decision
+
+
+def _is_greeting(text):
+    normalized = text.lower().strip(' !.?,)(')
+    return normalized in GREETINGS
+
+
+def _script(text):
+    """Script of most letters in text (LATIN, CYRILLIC, ARABIC, ...), None without letters"""
+    counts = {}
+    for char in text:
+        if char.isalpha():
+            name = unicodedata.name(char, '')
+            script = name.split(' ')[0] if name else 'UNKNOWN'
+            counts[script] = counts.get(script, 0) + 1
+
+    if not counts:
+        return None
+    return max(counts, key=counts.get)
@@ -0,0 +1,70 @@
+"""
+Semantic response cache
+
+Answers are stored with the vector of the question they answered. A new
+question whose vector is within AGENT_SEMANTIC_CACHE_THRESHOLD cosine
+similarity of a cached one (same user, same Prompt.version) gets the cached
+answer without a completion call.
+
+Only used when Prompt.semantic_cache_enabled is set, and only for the first
+turn of a conversation - the key carries no conversation context, so a
+follow-up like "and on Sunday?" must not match. Turns that called tools or
+used live calendar data are never cached. The tenant's cache is cleared
+once per knowledge change: when create_embeddings changed a source's chunks,
+on vector store rebuild and on document delete (signals.py).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from .models import CachedResponse
+
+
+def lookup(user_id, prompt_version, query_vector):
+    """Cached answer for the closest previous question, or None"""
+    since = timezone.now() - timedelta(hours=settings.AGENT_SEMANTIC_CACHE_TTL_HOURS)
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id, answer, 1 - (query_vector <=> %s::vector) as similarity
+            FROM agent_cached_responses
+            WHERE user_id = %s AND prompt_version = %s AND created_at >= %s
+            ORDER BY query_vector <=> %s::vector
+            LIMIT 1
+        """, [query_vector, user_id, prompt_version, since, query_vector])
+        row = cursor.fetchone()
+
+    if not row or row[2] < settings.AGENT_SEMANTIC_CACHE_THRESHOLD:
+        return None
+
+    CachedResponse.objects.filter(id=row[0]).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+    return {'id': row[0], 'answer': row[1], 'similarity': row[2]}
+
+
+def store(user_id, prompt_version, question, answer, query_vector):
+    entry = CachedResponse.objects.create(
+        user_id=user_id,
+        question=question,
+        answer=answer,
+        prompt_version=prompt_version
+    )
+
+    # Store vector (using raw SQL for pgvector)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE agent_cached_responses SET query_vector = %s::vector WHERE id = %s",
+            [query_vector, entry.id]
+        )
+
+    return entry
+
+
+def clear(user_id=None, keep_version=None):
+    """Drop cached answers in the current tenant schema (optionally one user's stale versions)"""
+    entries = CachedResponse.objects.all()
+    if user_id is not None:
+        entries = entries.filter(user_id=user_id)
+    if keep_version is not None:
+        entries = entries.exclude(prompt_version=keep_version)
+    entries.delete()
@@ -1,11 +1,84 @@
-import openai
 import time
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from django.conf import settings
-from apps.embeddings.tasks import search_similar
+from django.db import close_old_connections
+from django.core.cache import cache
+from apps.accounts.middleware import TenantSchemaContext
+from apps.embeddings.tasks import search_similar, embed_query
+from apps.embeddings.tokens import count_tokens
 from .models import Prompt, Conversation, Message
-
-openai.api_key = settings.OPENAI_API_KEY
+from . import semantic_cache
+from .context_packer import ContextPacker, MESSAGE_OVERHEAD
+from . import prompt_cache
+from . import router
+from . import counters
+from . import llm
+
+logger = logging.getLogger(__name__)
+
+# Shared by all chat turns in the process - context steps are I/O bound
+_context_executor = ThreadPoolExecutor(
+    max_workers=settings.AGENT_CONTEXT_WORKERS,
+    thread_name_prefix='agent-context'
+)
+
+# Separate pool for tool calls (calendar API round trips), so they can't starve context steps
+_tool_executor = ThreadPoolExecutor(
+    max_workers=settings.AGENT_TOOL_WORKERS,
+    thread_name_prefix='agent-tools'
+)
+
+# Tools without side effects - safe to run concurrently (others run serially, in order)
+READ_ONLY_TOOLS = {'check_calendar_availability'}
+
+BOOKING_KEYWORDS = ['запис', 'бронь', 'appointment', 'book', 'schedule', 'slot', 'available']
+
+# Function tools for OpenAI (sent when calendar integration is available)
+CALENDAR_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "check_calendar_availability",
+            "description": "Check available time slots in the calendar for a specific date",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "The date to check (e.g., 'tomorrow', 'next monday', '2024-11-15')"
+                    },
+                    "duration_minutes": {
+                        "type": "integer",
+                        "description": "Appointment duration in minutes (default 60)"
+                    }
+                },
+                "required": ["date"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "book_appointment",
+            "description": "Book an appointment in the calendar",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "customer_name": {"type": "string", "description": "Customer's full name"},
+                    "customer_email": {"type": "string", "description": "Customer's email"},
+                    "service": {"type": "string", "description": "Type of service (e.g., 'Haircut', 'Manicure')"},
+                    "date": {"type": "string", "description": "Date (e.g., 'tomorrow', '2024-11-15')"},
+                    "time": {"type": "string", "description": "Time (e.g., '14:00', '2:00 PM')"},
+                    "duration_minutes": {"type": "integer", "description": "Duration in minutes (default 60)"},
+                    "create_meet": {"type": "boolean", "description": "Create Google Meet link (default true)"}
+                },
+                "required": ["customer_name", "customer_email", "service", "date", "time"]
+            }
+        }
+    }
+]
 
 
 class AgentService:
@@ -16,12 +89,12 @@ class AgentService:
         self.tenant_schema = tenant_schema
         self.calendar_tools = None
 
-        # Load calendar tools if available
+        # Calendar tools - the Google client itself comes from a pool on first tool use
         try:
             from apps.integrations.calendar_ai_tools import get_calendar_tools_for_user
             self.calendar_tools = get_calendar_tools_for_user(user_id, tenant_schema)
         except Exception as e:
-            print(f"Calendar tools not available: {e}")
+            logger.warning(f"Calendar tools not available for user {user_id}: {e}")
 
     def get_or_create_prompt(self):
         """Get active prompt for user"""
@@ -35,45 +108,318 @@ class AgentService:
 
         return prompt
 
+    def get_prompt(self):
+        """Compiled active prompt (system prompt + token counts), cached per Prompt.version"""
+        return prompt_cache.get_compiled_prompt(
+            self.tenant_schema,
+            self.user_id,
+            self.get_or_create_prompt,
+            CALENDAR_TOOLS
+        )
+
     def chat(self, conversation_id, user_message, photo_id=None):
         """
         Process chat message with RAG
         """
+        turn = self._prepare_turn(conversation_id, user_message, photo_id)
+        prompt = turn['prompt']
+        messages = turn['messages']
+        tools = turn['tools']
+
+        # Same question answered before - no completion needed
+        cache_hit = self._cached_answer(turn)
+        if cache_hit:
+            return self._finish_turn(turn, cache_hit['answer'], 0, 0, cache_hit=cache_hit)
+
+        # Call OpenAI API
+        try:
+            # Tool loop: run requested tools, ask again, until a text answer or the step limit
+            responses = []
+            function_calls_made = 0
+
+            for step in range(settings.AGENT_MAX_TOOL_STEPS + 1):
+                response = llm.chat_completion(
+                    model=turn['model'],
+                    messages=messages,
+                    temperature=prompt.temperature,
+                    max_tokens=prompt.max_tokens,
+                    tools=tools if tools else None,
+                    tool_choice=self._tool_choice(tools, step)
+                )
+                responses.append(response)
+
+                # Check if AI wants to call a function
+                response_message = response.choices[0].message
+                tool_calls = response_message.tool_calls
+                if not tool_calls:
+                    break
+
+                # AI wants to use calendar tools - independent calls run concurrently
+                messages.append(response_message)
+                messages.extend(self._execute_tool_calls([
+                    (tool_call.id, tool_call.function.name, tool_call.function.arguments)
+                    for tool_call in tool_calls
+                ]))
+                function_calls_made += len(tool_calls)
+
+            assistant_message = response_message.content
+            usage = self._usage(*responses)
+
+            return self._finish_turn(
+                turn,
+                assistant_message,
+                usage['total_tokens'],
+                function_calls_made,
+                usage=usage
+            )
+
+        except Exception:
+            logger.exception(f"Error in AI chat for user {self.user_id}")
+            raise
+
+    def chat_stream(self, conversation_id, user_message, photo_id=None):
+        """
+        Process chat message with RAG, streaming the reply
+
+        Generator of events:
+            {'type': 'token', 'content': ...}  - piece of the answer
+            {'type': 'tool', 'name': ...}      - tool call is being executed
+            {'type': 'done', ...}              - same fields as chat() result + message_id
+        The assistant Message is saved once the stream ends.
+        """
+        turn = self._prepare_turn(conversation_id, user_message, photo_id)
+        prompt = turn['prompt']
+        messages = turn['messages']
+        tools = turn['tools']
+        chunks = []  # every streamed piece of the answer, over all steps
+
+        # Same question answered before - send the cached answer in one piece
+        cache_hit = self._cached_answer(turn)
+        if cache_hit:
+            yield {'type': 'token', 'content': cache_hit['answer']}
+            yield {'type': 'done', **self._finish_turn(turn, cache_hit['answer'], 0, 0, cache_hit=cache_hit)}
+            return
+
+        tokens_used = 0
+        function_calls_made = 0
+        finished = False
+
+        try:
+            # Tool loop as in chat(); text is streamed as it arrives at every step
+            for step in range(settings.AGENT_MAX_TOOL_STEPS + 1):
+                text, calls = yield from self._stream_completion(prompt, turn['model'], messages, tools, step, chunks)
+                tokens_used += self._estimate_tokens(messages, text, turn['model'], tools)
+
+                if not calls:
+                    break
+
+                messages.append({
+                    "role": "assistant",
+                    "content": text or None,
+                    "tool_calls": [
+                        {
+                            "id": call['id'],
+                            "type": "function",
+                            "function": {"name": call['name'], "arguments": call['arguments']}
+                        }
+                        for call in calls
+                    ]
+                })
+
+                for call in calls:
+                    yield {'type': 'tool', 'name': call['name']}
+                messages.extend(self._execute_tool_calls([
+                    (call['id'], call['name'], call['arguments']) for call in calls
+                ]))
+                function_calls_made += len(calls)
+
+            result = self._finish_turn(turn, ''.join(chunks), tokens_used, function_calls_made)
+            finished = True
+            yield {'type': 'done', **result}
+
+        except Exception:
+            logger.exception(f"Error in AI chat stream for user {self.user_id}")
+            raise
+
+        finally:
+            # Client disconnected (GeneratorExit at a yield) or the completion failed
+            # mid-answer - keep the part of the answer the user has already seen
+            if not finished and chunks:
+                try:
+                    self._finish_turn(turn, ''.join(chunks), tokens_used, function_calls_made, partial=True)
+                except Exception:
+                    logger.exception(f"Saving partial answer failed for user {self.user_id}")
+
+    def _stream_completion(self, prompt, model, messages, tools, step, received):
+        """
+        One streamed completion: yields token events, returns (text, tool_calls)
+
+        Text pieces are also appended to received as they arrive, so a partial
+        answer is known when the stream is interrupted.
+        Tool call id/name arrive in the first delta, arguments in pieces.
+        """
+        stream = llm.chat_completion(
+            model=model,
+            messages=messages,
+            temperature=prompt.temperature,
+            max_tokens=prompt.max_tokens,
+            tools=tools if tools else None,
+            tool_choice=self._tool_choice(tools, step),
+            stream=True
+        )
+
+        chunks = []
+        tool_calls = {}
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                chunks.append(delta.content)
+                received.append(delta.content)
+                yield {'type': 'token', 'content': delta.content}
+
+            for tool_delta in delta.tool_calls or []:
+                call = tool_calls.setdefault(tool_delta.index, {'id': '', 'name': '', 'arguments': ''})
+                if tool_delta.id:
+                    call['id'] = tool_delta.id
+                if tool_delta.function and tool_delta.function.name:
+                    call['name'] += tool_delta.function.name
+                if tool_delta.function and tool_delta.function.arguments:
+                    call['arguments'] += tool_delta.function.arguments
+
+        return ''.join(chunks), [tool_calls[index] for index in sorted(tool_calls)]
+
+    def _tool_choice(self, tools, step):
+        """
+        Tools stay in every request (same prefix for the provider cache);
+        after AGENT_MAX_TOOL_STEPS rounds of tool calls the model must answer
+        """
+        if not tools:
+            return None
+        return "none" if step >= settings.AGENT_MAX_TOOL_STEPS else "auto"
+
+    def _prepare_turn(self, conversation_id, user_message, photo_id=None):
+        """Save user message and build OpenAI messages/tools for this turn"""
         start_time = time.time()
 
         # Get conversation
         conversation = Conversation.objects.get(id=conversation_id, user_id=self.user_id)
 
-        # Get prompt settings
-        prompt = self.get_or_create_prompt()
-
-        # Save user message
+        # Save user message right away - it's part of the conversation even if the
+        # turn fails (excluded from history below - it's appended last)
         user_msg = Message.objects.create(
             conversation=conversation,
             role='user',
             content=user_message,
             photo_id=photo_id
         )
-
-        # Search for relevant context using RAG
-        context_results = search_similar(
-            query_text=user_message,
+        counters.increment(
+            Conversation,
+            conversation.id,
             tenant_schema=self.tenant_schema,
-            limit=5
+            touch=('updated_at',),
+            message_count=1
         )
 
-        # Build context from embeddings
-        rag_context = self._build_rag_context(context_results)
-        context_ids = [r['id'] for r in context_results]
+        calendar_available = self.calendar_tools and self.calendar_tools.is_available()
+
+        # Independent I/O steps run concurrently, each with its own timeout
+        steps = {
+            'prompt': self.get_prompt,
+            'rag': lambda: self._search_knowledge(user_message),
+            'history': lambda: self._get_conversation_history(
+                conversation,
+                limit=settings.AGENT_HISTORY_MESSAGES + 2 * settings.AGENT_SUMMARY_BATCH,
+                exclude_id=user_msg.id,
+                after_id=conversation.summary_message_id
+            ),
+        }
+
+        # Calendar context only if message is about booking/appointment
+        about_booking = any(keyword in user_message.lower() for keyword in BOOKING_KEYWORDS)
+        if calendar_available and about_booking:
+            steps['calendar'] = self.calendar_tools.list_upcoming_appointments
+
+        results = self._gather_context(steps)
+
+        # Prompt settings are required - retry outside the pool
+        prompt = results.get('prompt') or self.get_prompt()
+        query_vector, context_results = results.get('rag') or (None, [])
+        history = results.get('history') or []
+        upcoming = results.get('calendar')
+
+        tools = CALENDAR_TOOLS if calendar_available else []
+
+        # Easy turns go to the fast model, hard ones to prompt.model
+        routing = router.route(
+            prompt,
+            user_message,
+            needs_tools=bool(tools) and about_booking,
+            rag_results=context_results,
+            history_length=len(history)
+        )
+
+        # Fit everything into the input token budget, most valuable pieces first:
+        # system prompt, user message, tools, calendar, knowledge chunks by rank, summary, newest history
+        packer = ContextPacker(prompt.model)
+        packer.reserve_tokens('system', prompt.system_tokens + MESSAGE_OVERHEAD)
+        user_content = packer.reserve('user', user_message, settings.AGENT_USER_MESSAGE_MAX_TOKENS)
+        if tools:
+            packer.reserve_tokens('tools', prompt.tools_tokens)
+
+        calendar_context = None
+        if upcoming:
+            calendar_context = packer.fit(
+                'calendar',
+                f"Calendar Integration Available. Current appointments:\n{upcoming}"
+            )
+
+        rag_results = []
+        for result in context_results:
+            content = packer.fit('rag', result['content'], settings.AGENT_RAG_CHUNK_MAX_TOKENS)
+            if content is not None:
+                rag_results.append({**result, 'content': content})
+
+        # Older turns are only present as the rolling summary
+        summary = None
+        if conversation.summary:
+            summary = packer.fit(
+                'summary',
+                f"Summary of the earlier conversation:\n{conversation.summary}",
+                settings.AGENT_SUMMARY_MAX_TOKENS
+            )
 
-        # Get conversation history
-        history = self._get_conversation_history(conversation, limit=10)
+        packed_history = []
+        for index, msg in enumerate(reversed(history)):
+            content = packer.fit('history', msg['content'], settings.AGENT_HISTORY_MESSAGE_MAX_TOKENS)
+            if content is None:
+                # Older turns without the newer ones would be confusing - stop here
+                packer.dropped['history'] += len(history) - index - 1
+                break
+            packed_history.insert(0, {"role": msg['role'], "content": content})
 
-        # Build messages for OpenAI
+        # Build context from embeddings
+        rag_context = self._build_rag_context(rag_results)
+        context_ids = [r['id'] for r in rag_results]
+
+        # Build messages for OpenAI, most stable first so the provider's prompt
+        # prefix cache covers as much as possible: system prompt (tool schemas
+        # are constant per tenant), summary, history; then per-turn calendar and RAG
         messages = [
-            {"role": "system", "content": prompt.get_system_prompt()},
+            {"role": "system", "content": prompt.system_prompt},
         ]
 
+        # Add conversation summary and recent history
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        messages.extend(packed_history)
+
+        # Add calendar availability context
+        if calendar_context:
+            messages.append({"role": "system", "content": calendar_context})
+
         # Add RAG context if available
         if rag_context:
             messages.append({
@@ -81,176 +427,293 @@ class AgentService:
                 "content": f"Relevant information from your knowledge base:\n{rag_context}"
             })
 
-        # Add calendar availability context if available
-        if self.calendar_tools and self.calendar_tools.is_available():
-            # Check if message is about booking/appointment
-            booking_keywords = ['запис', 'бронь', 'appointment', 'book', 'schedule', 'slot', 'available']
-            if any(keyword in user_message.lower() for keyword in booking_keywords):
-                try:
-                    # Get upcoming appointments as context
-                    upcoming = self.calendar_tools.list_upcoming_appointments()
-                    messages.append({
-                        "role": "system",
-                        "content": f"Calendar Integration Available. Current appointments:\n{upcoming}"
-                    })
-                except:
-                    pass
-
-        # Add conversation history
-        messages.extend(history)
-
         # Add current user message
-        messages.append({"role": "user", "content": user_message})
-
-        # Define function tools for OpenAI
-        tools = []
-        if self.calendar_tools and self.calendar_tools.is_available():
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "check_calendar_availability",
-                        "description": "Check available time slots in the calendar for a specific date",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "date": {
-                                    "type": "string",
-                                    "description": "The date to check (e.g., 'tomorrow', 'next monday', '2024-11-15')"
-                                },
-                                "duration_minutes": {
-                                    "type": "integer",
-                                    "description": "Appointment duration in minutes (default 60)"
-                                }
-                            },
-                            "required": ["date"]
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "book_appointment",
-                        "description": "Book an appointment in the calendar",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "customer_name": {"type": "string", "description": "Customer's full name"},
-                                "customer_email": {"type": "string", "description": "Customer's email"},
-                                "service": {"type": "string", "description": "Type of service (e.g., 'Haircut', 'Manicure')"},
-                                "date": {"type": "string", "description": "Date (e.g., 'tomorrow', '2024-11-15')"},
-                                "time": {"type": "string", "description": "Time (e.g., '14:00', '2:00 PM')"},
-                                "duration_minutes": {"type": "integer", "description": "Duration in minutes (default 60)"},
-                                "create_meet": {"type": "boolean", "description": "Create Google Meet link (default true)"}
-                            },
-                            "required": ["customer_name", "customer_email", "service", "date", "time"]
-                        }
-                    }
-                }
-            ]
+        messages.append({"role": "user", "content": user_content})
+
+        return {
+            'start_time': start_time,
+            'conversation': conversation,
+            'prompt': prompt,
+            'model': routing.model,
+            'routing': routing.to_dict(),
+            'messages': messages,
+            'tools': tools,
+            'context_ids': context_ids,
+            'prompt_tokens': packer.stats(),
+            'user_message': user_message,
+            'query_vector': query_vector,
+            'cacheable': self._is_cacheable(prompt, query_vector, conversation, history, upcoming),
+        }
+
+    def _is_cacheable(self, prompt, query_vector, conversation, history, upcoming):
+        """
+        Whether the turn may use the semantic cache
+
+        The cache is keyed by the question alone, so only standalone turns (no history
+        or summary to depend on) use it. Live calendar data and tool-using conversations never do.
+        """
+        return bool(
+            prompt.semantic_cache_enabled
+            and query_vector is not None
+            and not history
+            and not conversation.summary
+            and not upcoming
+            and not Message.objects.filter(
+                conversation=conversation,
+                role='assistant',
+                metadata__function_calls__gt=0
+            ).exists()
+        )
+
+    def _search_knowledge(self, user_message):
+        """Query vector (also the semantic cache key) and RAG search results"""
+        query_vector = embed_query(user_message)
+        return query_vector, search_similar(
+            query_text=user_message,
+            tenant_schema=self.tenant_schema,
+            limit=5,
+            query_vector=query_vector
+        )
+
+    def _cached_answer(self, turn):
+        """Semantic cache hit for this turn, or None"""
+        if not turn['cacheable']:
+            return None
 
-        # Call OpenAI API
         try:
-            # First call - may request function calls
-            response = openai.chat.completions.create(
-                model=prompt.model,
-                messages=messages,
-                temperature=prompt.temperature,
-                max_tokens=prompt.max_tokens,
-                tools=tools if tools else None,
-                tool_choice="auto" if tools else None
-            )
+            return semantic_cache.lookup(self.user_id, turn['prompt'].version, turn['query_vector'])
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed for user {self.user_id}: {e}")
+            return None
 
-            # Check if AI wants to call a function
-            response_message = response.choices[0].message
-            tool_calls = response_message.tool_calls
+    def _gather_context(self, steps):
+        """
+        Run context steps on the shared thread pool
 
-            if tool_calls:
-                # AI wants to use calendar tools
-                messages.append(response_message)
+        Returns {name: result}; a step that fails or exceeds its timeout
+        (AGENT_CONTEXT_TIMEOUTS) is left out so the turn continues without it.
+        """
+        started = time.monotonic()
+        futures = {
+            name: _context_executor.submit(self._run_in_tenant, func)
+            for name, func in steps.items()
+        }
+
+        results = {}
+        for name, future in futures.items():
+            deadline = started + settings.AGENT_CONTEXT_TIMEOUTS.get(name, 2.0)
+            try:
+                results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                future.cancel()
+                logger.warning(f"Agent context step '{name}' timed out for user {self.user_id}")
+            except Exception as e:
+                logger.warning(f"Agent context step '{name}' failed for user {self.user_id}: {e}")
+
+        return results
+
+    def _run_in_tenant(self, func, *args):
+        """Pool threads have their own DB connection: set tenant schema, release connection after"""
+        close_old_connections()
+        try:
+            with TenantSchemaContext(self.tenant_schema):
+                return func(*args)
+        finally:
+            close_old_connections()
 
-                # Execute each tool call
-                for tool_call in tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-
-                    # Execute the function
-                    if function_name == "check_calendar_availability":
-                        function_response = self.calendar_tools.check_availability(
-                            date_str=function_args.get('date'),
-                            duration_minutes=function_args.get('duration_minutes', 60)
-                        )
-                    elif function_name == "book_appointment":
-                        function_response = self.calendar_tools.book_appointment(
-                            customer_name=function_args.get('customer_name'),
-                            customer_email=function_args.get('customer_email'),
-                            service=function_args.get('service'),
-                            date_str=function_args.get('date'),
-                            time_str=function_args.get('time'),
-                            duration_minutes=function_args.get('duration_minutes', 60),
-                            create_meet=function_args.get('create_meet', True)
-                        )
-                    else:
-                        function_response = "Function not found"
-
-                    # Add function response to messages
-                    messages.append({
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": function_name,
-                        "content": function_response
-                    })
-
-                # Call OpenAI again with function results
-                second_response = openai.chat.completions.create(
-                    model=prompt.model,
-                    messages=messages,
-                    temperature=prompt.temperature,
-                    max_tokens=prompt.max_tokens
-                )
+    def _execute_tool_calls(self, calls):
+        """
+        Run tool calls (tool_call_id, name, arguments) on the tool pool
 
-                assistant_message = second_response.choices[0].message.content
-                tokens_used = response.usage.total_tokens + second_response.usage.total_tokens
+        Read-only tools (READ_ONLY_TOOLS) run concurrently; tools that change
+        something (bookings) run one at a time in the order the model asked for
+        them. Returns tool messages in the order of calls. A call that fails or
+        exceeds AGENT_TOOL_TIMEOUT returns an error message to the model instead.
+        """
+        started = time.monotonic()
+        reads = {
+            index: _tool_executor.submit(self._run_in_tenant, self._execute_tool_call, *call)
+            for index, call in enumerate(calls)
+            if call[1] in READ_ONLY_TOOLS
+        }
+
+        tool_messages = {}
+        for index, call in enumerate(calls):
+            if index not in reads:
+                future = _tool_executor.submit(self._run_in_tenant, self._execute_tool_call, *call)
+                tool_messages[index] = self._tool_result(call, future, time.monotonic())
+
+        for index, future in reads.items():
+            tool_messages[index] = self._tool_result(calls[index], future, started)
+
+        return [tool_messages[index] for index in range(len(calls))]
+
+    def _tool_result(self, call, future, started):
+        """Tool message of a submitted call, or an error message after AGENT_TOOL_TIMEOUT"""
+        tool_call_id, function_name, _ = call
+        try:
+            return future.result(timeout=max(started + settings.AGENT_TOOL_TIMEOUT - time.monotonic(), 0))
+        except Exception as e:
+            future.cancel()
+            logger.warning(f"Tool {function_name} failed for user {self.user_id}: {e!r}")
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",
+                "name": function_name,
+                "content": f"Sorry, {function_name} is not available right now."
+            }
 
-            else:
-                # No function calls, use direct response
-                assistant_message = response_message.content
-                tokens_used = response.usage.total_tokens
+    def _execute_tool_call(self, tool_call_id, function_name, arguments):
+        """Run a calendar tool requested by the model; returns the tool message"""
+        function_args = json.loads(arguments or '{}')
 
-            # Save assistant message
-            assistant_msg = Message.objects.create(
-                conversation=conversation,
-                role='assistant',
-                content=assistant_message,
-                context_used=context_ids,
-                tokens_used=tokens_used,
-                processing_time=time.time() - start_time
+        if function_name == "check_calendar_availability":
+            function_response = self.calendar_tools.check_availability(
+                date_str=function_args.get('date'),
+                duration_minutes=function_args.get('duration_minutes', 60)
             )
+        elif function_name == "book_appointment":
+            function_response = self.calendar_tools.book_appointment(
+                customer_name=function_args.get('customer_name'),
+                customer_email=function_args.get('customer_email'),
+                service=function_args.get('service'),
+                date_str=function_args.get('date'),
+                time_str=function_args.get('time'),
+                duration_minutes=function_args.get('duration_minutes', 60),
+                create_meet=function_args.get('create_meet', True)
+            )
+        else:
+            function_response = "Function not found"
+
+        return {
+            "tool_call_id": tool_call_id,
+            "role": "tool",
+            "name": function_name,
+            "content": function_response
+        }
+
+    def _finish_turn(self, turn, assistant_message, tokens_used, function_calls_made,
+                     cache_hit=None, usage=None, partial=False):
+        """
+        Save assistant message, update conversation stats and the semantic cache
 
-            # Update conversation stats
-            conversation.message_count += 2
-            conversation.total_tokens += tokens_used
-            conversation.save()
+        partial: answer was cut off (stream interrupted) - saved, but never cached
+        """
+        conversation = turn['conversation']
+        processing_time = time.time() - turn['start_time']
+
+        metadata = {
+            'function_calls': function_calls_made,
+            'prompt_tokens': turn['prompt_tokens'],
+            'routing': turn['routing'],
+        }
+        if usage:
+            metadata['usage'] = usage
+        if partial:
+            metadata['partial'] = True
+        elif cache_hit:
+            metadata['semantic_cache'] = {'entry_id': cache_hit['id'], 'similarity': round(cache_hit['similarity'], 4)}
+        elif turn['cacheable'] and not function_calls_made and assistant_message:
+            try:
+                semantic_cache.store(
+                    self.user_id,
+                    turn['prompt'].version,
+                    turn['user_message'],
+                    assistant_message,
+                    turn['query_vector']
+                )
+            except Exception as e:
+                logger.warning(f"Semantic cache store failed for user {self.user_id}: {e}")
 
-            # Track usage
-            from apps.subscriptions.models import Subscription
-            from apps.accounts.models import User
+        # Save assistant message
+        assistant_msg = Message.objects.create(
+            conversation=conversation,
+            role='assistant',
+            content=assistant_message,
+            context_used=turn['context_ids'],
+            tokens_used=tokens_used,
+            processing_time=processing_time,
+            metadata=metadata
+        )
 
-            # This would normally be done in a signal or middleware
-            # subscription.increment_usage('messages')
+        # Update conversation stats (F() update, or buffered with COUNTERS_WRITE_BEHIND)
+        counters.increment(
+            Conversation,
+            conversation.id,
+            tenant_schema=self.tenant_schema,
+            touch=('updated_at',),
+            message_count=1,
+            total_tokens=tokens_used
+        )
 
-            return {
-                'message': assistant_message,
-                'tokens_used': tokens_used,
-                'processing_time': time.time() - start_time,
-                'context_used': len(context_ids),
-                'function_calls_made': len(tool_calls) if tool_calls else 0
-            }
+        self._schedule_summary(conversation)
 
-        except Exception as e:
-            # Log error
-            print(f"Error in AI chat: {e}")
-            raise
+        # Track usage
+        # This would normally be done in a signal or middleware
+        # subscription.increment_usage('messages')
+
+        return {
+            'message': assistant_message,
+            'message_id': assistant_msg.id,
+            'tokens_used': tokens_used,
+            'processing_time': processing_time,
+            'context_used': len(turn['context_ids']),
+            'function_calls_made': function_calls_made,
+            'cached': bool(cache_hit)
+        }
+
+    def _usage(self, *responses):
+        """
+        Provider-reported usage summed over completions of a turn
+
+        cached_tokens: prompt tokens served from the provider's prefix cache
+        (usage.prompt_tokens_details, absent on older API responses)
+        """
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0, 'cached_tokens': 0}
+
+        for response in responses:
+            usage['prompt_tokens'] += response.usage.prompt_tokens
+            usage['completion_tokens'] += response.usage.completion_tokens
+            usage['total_tokens'] += response.usage.total_tokens
+
+            details = getattr(response.usage, 'prompt_tokens_details', None) or {}
+            if not isinstance(details, dict):
+                details = details.model_dump() if hasattr(details, 'model_dump') else vars(details)
+            usage['cached_tokens'] += details.get('cached_tokens') or 0
+
+        return usage
+
+    def _schedule_summary(self, conversation):
+        """Refresh the rolling summary once enough messages left the history window"""
+        unsummarized = Message.objects.filter(
+            conversation=conversation,
+            id__gt=conversation.summary_message_id or 0
+        ).count()
+
+        if unsummarized - settings.AGENT_HISTORY_MESSAGES < settings.AGENT_SUMMARY_BATCH:
+            return
+
+        # One pending summary task per conversation
+        lock_key = f'agent:summarize:{self.tenant_schema}:{conversation.id}'
+        if not cache.add(lock_key, 1, 300):
+            return
+
+        from .tasks import summarize_conversation
+        summarize_conversation.delay(conversation.id, self.tenant_schema)
+
+    def _estimate_tokens(self, messages, completion, model, tools=None):
+        """Token usage of a streamed call - streaming responses carry no usage block"""
+        prompt_tokens = count_tokens(json.dumps(tools), model) if tools else 0
+        for message in messages:
+            if isinstance(message, dict):
+                content = message.get('content') or ''
+                if message.get('tool_calls'):
+                    content += json.dumps(message['tool_calls'])
+            else:
+                content = message.content or ''
+            prompt_tokens += count_tokens(content, model) + 4  # per-message overhead
+
+        return prompt_tokens + count_tokens(completion, model)
 
     def _build_rag_context(self, results):
         """Build context string from search results"""
@@ -265,11 +728,22 @@ class AgentService:
 
         return "\n".join(context_parts)
 
-    def _get_conversation_history(self, conversation, limit=10):
-        """Get recent conversation history"""
+    def _get_conversation_history(self, conversation, limit=10, exclude_id=None, after_id=None):
+        """
+        Get recent conversation history
+
+        after_id: start after this message (last one folded into the summary). History then
+        only grows until the next summary instead of sliding every turn, which keeps the
+        request prefix identical between turns.
+        """
         messages = Message.objects.filter(
             conversation=conversation
-        ).order_by('-created_at')[:limit]
+        )
+        if exclude_id:
+            messages = messages.exclude(id=exclude_id)
+        if after_id:
+            messages = messages.filter(id__gt=after_id)
+        messages = messages.order_by('-created_at')[:limit]
 
         # Reverse to chronological order
         messages = list(reversed(messages))
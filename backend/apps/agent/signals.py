@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from apps.documents.models import Document
+from . import semantic_cache
+
+
+@receiver(post_delete, sender=Document)
+def clear_semantic_cache(sender, **kwargs):
+    """
+    Документ видалено - закешовані відповіді можуть бути застарілими
+
+    Нові й змінені документи очищають кеш один раз, коли create_embeddings завершено
+    """
+    semantic_cache.clear()
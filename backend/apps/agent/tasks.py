@@ -0,0 +1,123 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from apps.accounts.middleware import TenantSchemaContext
+from apps.embeddings.tokens import truncate_tokens
+from .models import Conversation, Message
+from . import llm
+from . import counters
+from . import partitions
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a customer and a business assistant. "
+    "Update the summary with the new messages. Keep every fact that may matter later: names, contacts, "
+    "requested services, dates and times, prices, preferences, decisions and open questions. "
+    "Write concise bullet points in the language of the conversation."
+)
+
+
+@shared_task
+def summarize_conversation(conversation_id, tenant_schema):
+    """
+    Fold messages that left the history window into Conversation.summary
+    """
+    with TenantSchemaContext(tenant_schema):
+        conversation = Conversation.objects.get(id=conversation_id)
+
+        # Messages still sent verbatim with every turn
+        window_ids = list(
+            Message.objects.filter(conversation=conversation)
+            .order_by('-created_at')
+            .values_list('id', flat=True)[:settings.AGENT_HISTORY_MESSAGES]
+        )
+        if not window_ids:
+            return f"Conversation {conversation_id}: nothing to summarize"
+
+        older = Message.objects.filter(
+            conversation=conversation,
+            role__in=['user', 'assistant'],
+            id__lt=min(window_ids)
+        )
+        if conversation.summary_message_id:
+            older = older.filter(id__gt=conversation.summary_message_id)
+        older = list(older.order_by('created_at'))
+
+        if not older:
+            return f"Conversation {conversation_id}: summary up to date"
+
+        transcript = "\n".join(
+            f"{msg.role}: {truncate_tokens(msg.content, settings.AGENT_HISTORY_MESSAGE_MAX_TOKENS)}"
+            for msg in older
+        )
+
+        response = llm.chat_completion(
+            model=settings.AGENT_SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {
+                    "role": "user",
+                    "content": f"Current summary:\n{conversation.summary or '(empty)'}\n\nNew messages:\n{transcript}"
+                },
+            ],
+            temperature=0.2,
+            max_tokens=settings.AGENT_SUMMARY_MAX_TOKENS
+        )
+
+        conversation.summary = response.choices[0].message.content.strip()
+        conversation.summary_message_id = older[-1].id
+        conversation.summary_updated_at = timezone.now()
+        conversation.save(update_fields=['summary', 'summary_message_id', 'summary_updated_at'])
+
+        cache.delete(f'agent:summarize:{tenant_schema}:{conversation_id}')
+
+        logger.info(f"Conversation {conversation_id}: summarized {len(older)} messages")
+        return f"Conversation {conversation_id}: summarized {len(older)} messages"
+
+
+@shared_task
+def flush_counters():
+    """
+    Write buffered Conversation/Integration counter increments to the database
+
+    Runs even with COUNTERS_WRITE_BEHIND off, so increments buffered before it was switched off are kept.
+    """
+    flushed = counters.flush()
+    return f"Flushed counters of {flushed} rows"
+
+
+@shared_task
+def maintain_message_partitions():
+    """
+    Queue partition maintenance (upcoming months, archiving of expired ones) for every tenant
+    """
+    from apps.accounts.models import Organization
+
+    schemas = list(Organization.objects.filter(is_active=True).values_list('schema_name', flat=True))
+    for schema_name in schemas:
+        maintain_tenant_message_partitions.delay(schema_name)
+
+    return f"Queued message partition maintenance for {len(schemas)} tenants"
+
+
+@shared_task
+def maintain_tenant_message_partitions(tenant_schema):
+    """
+    Create upcoming monthly partitions of messages, archive months past the plan's retention
+    """
+    from apps.subscriptions.models import Subscription
+
+    retention = Subscription.objects.filter(
+        organization__schema_name=tenant_schema
+    ).values_list('plan__message_retention_months', flat=True).first()
+    if retention is None:
+        retention = settings.MESSAGE_RETENTION_MONTHS
+
+    with TenantSchemaContext(tenant_schema):
+        stats = partitions.maintain(tenant_schema, retention)
+
+    logger.info(f"Message partitions of {tenant_schema}: {stats}")
+    return f"{tenant_schema}: created {len(stats['created'])}, archived {len(stats['archived'])}, dropped {len(stats['dropped'])}"
@@ -0,0 +1,62 @@
+import pytest
+from django.db import connection
+from django_redis import get_redis_connection
+from apps.agent import llm
+from .fake_openai import FakeOpenAIServer
+
+
+@pytest.fixture
+def fake_openai(settings):
+    """Fake OpenAI server with the shared llm clients pointed at it"""
+    server = FakeOpenAIServer().start()
+
+    settings.OPENAI_API_KEY = 'test-key'
+    settings.OPENAI_BASE_URL = server.base_url
+    settings.LLM_REQUEST_TIMEOUT = 2.0
+    settings.LLM_CONNECT_TIMEOUT = 1.0
+    settings.LLM_DEADLINE = 5.0
+    settings.LLM_MAX_RETRIES = 3
+    settings.LLM_BACKOFF_BASE = 0.05
+    settings.LLM_BACKOFF_MAX = 0.1
+    settings.LLM_HEDGE_ENABLED = False
+
+    llm._clients.clear()
+    llm._latencies.clear()
+    yield server
+
+    for client in llm._clients.values():
+        client.close()
+    llm._clients.clear()
+    llm._latencies.clear()
+    server.stop()
+
+
+@pytest.fixture
+def tenant_schemas(db):
+    """
+    Two tenant schemas with their own conversations table
+
+    Organization's post_save runs a full migrate per schema; a copy of the
+    table is enough here and is rolled back with the test transaction.
+    """
+    schemas = ['tenant_test_a', 'tenant_test_b']
+    with connection.cursor() as cursor:
+        for schema in schemas:
+            cursor.execute(f'CREATE SCHEMA {schema}')
+            cursor.execute(f'CREATE TABLE {schema}.conversations (LIKE public.conversations INCLUDING ALL)')
+    return schemas
+
+
+@pytest.fixture
+def counters_redis():
+    """Redis with pending counter increments cleared before and after"""
+    redis = get_redis_connection('default')
+
+    def clear():
+        keys = redis.keys('counters:*')
+        if keys:
+            redis.delete(*keys)
+
+    clear()
+    yield redis
+    clear()
@@ -0,0 +1,119 @@
+"""
+Local fake OpenAI server for tests
+
+Serves /v1/chat/completions and /v1/embeddings on 127.0.0.1. Responses are
+canned; queue() lines up status codes, delays and headers for the next
+requests to a path, so retries, deadlines and hedging can be exercised
+without the real API.
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 3
+
+
+class FakeOpenAIServer:
+
+    def __init__(self):
+        self.requests = []  # (path, json body) in arrival order
+        self._queued = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def queue(self, path, status=200, delay=0, headers=None, body=None):
+        """Answer the next request to path (e.g. '/v1/chat/completions') this way"""
+        with self._lock:
+            self._queued.setdefault(path, deque()).append((status, delay, headers or {}, body))
+
+    def count(self, path):
+        with self._lock:
+            return sum(1 for request_path, _ in self.requests if request_path == path)
+
+    def _next(self, path, payload):
+        with self._lock:
+            self.requests.append((path, payload))
+            queued = self._queued.get(path)
+            if queued:
+                return queued.popleft()
+        return 200, 0, {}, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                status, delay, headers, body = server._next(self.path, payload)
+
+                if delay:
+                    time.sleep(delay)
+                if body is None:
+                    body = _success(self.path, payload) if status == 200 else _error(status)
+
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (timeout) - expected in deadline tests
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _success(path, payload):
+    if path.endswith('/embeddings'):
+        inputs = payload['input'] if isinstance(payload['input'], list) else [payload['input']]
+        return {
+            'object': 'list',
+            'model': payload['model'],
+            'data': [
+                {'object': 'embedding', 'index': index, 'embedding': [float(index)] * EMBEDDING_DIMENSIONS}
+                for index in range(len(inputs))
+            ],
+            'usage': {'prompt_tokens': len(inputs), 'total_tokens': len(inputs)},
+        }
+
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': payload['model'],
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': f"echo: {payload['messages'][-1]['content']}"},
+            'finish_reason': 'stop',
+        }],
+        'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+    }
+
+
+def _error(status):
+    return {'error': {'message': f'Fake error {status}', 'type': 'server_error', 'param': None, 'code': None}}
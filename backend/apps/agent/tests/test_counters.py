@@ -0,0 +1,91 @@
+import pytest
+from apps.accounts.middleware import TenantSchemaContext
+from apps.agent import counters
+from apps.agent.models import Conversation
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def write_behind(settings, counters_redis):
+    settings.COUNTERS_WRITE_BEHIND = True
+    return counters_redis
+
+
+def _create_conversation(schema):
+    with TenantSchemaContext(schema):
+        return Conversation.objects.create(user_id=1)
+
+
+def _get_conversation(schema, pk):
+    with TenantSchemaContext(schema):
+        return Conversation.objects.get(pk=pk)
+
+
+def test_flush_writes_each_tenant_schema(write_behind, tenant_schemas):
+    schema_a, schema_b = tenant_schemas
+    conversation_a = _create_conversation(schema_a)
+    conversation_b = _create_conversation(schema_b)
+    assert conversation_a.id == conversation_b.id  # same id in both schemas - only the schema tells them apart
+
+    counters.increment(Conversation, conversation_a.id, tenant_schema=schema_a, message_count=2, total_tokens=100)
+    counters.increment(Conversation, conversation_b.id, tenant_schema=schema_b, message_count=5)
+    assert _get_conversation(schema_a, conversation_a.id).message_count == 0
+
+    assert counters.flush() == 2
+
+    stored_a = _get_conversation(schema_a, conversation_a.id)
+    stored_b = _get_conversation(schema_b, conversation_b.id)
+    assert (stored_a.message_count, stored_a.total_tokens) == (2, 100)
+    assert (stored_b.message_count, stored_b.total_tokens) == (5, 0)
+
+
+def test_increments_of_one_row_are_combined(write_behind, tenant_schemas):
+    schema = tenant_schemas[0]
+    conversation = _create_conversation(schema)
+    updated_at = conversation.updated_at
+
+    for _ in range(3):
+        counters.increment(Conversation, conversation.id, tenant_schema=schema, touch=('updated_at',), message_count=1)
+
+    assert counters.flush() == 1
+    stored = _get_conversation(schema, conversation.id)
+    assert stored.message_count == 3
+    assert stored.updated_at > updated_at
+    assert not write_behind.smembers(counters.DIRTY_KEY)
+
+
+def test_write_through_uses_tenant_schema(settings, counters_redis, tenant_schemas):
+    settings.COUNTERS_WRITE_BEHIND = False
+    schema_a, schema_b = tenant_schemas
+    conversation_a = _create_conversation(schema_a)
+    conversation_b = _create_conversation(schema_b)
+
+    counters.increment(Conversation, conversation_a.id, tenant_schema=schema_a, message_count=1)
+
+    assert _get_conversation(schema_a, conversation_a.id).message_count == 1
+    assert _get_conversation(schema_b, conversation_b.id).message_count == 0
+    assert not counters_redis.smembers(counters.DIRTY_KEY)
+
+
+def test_tenant_model_needs_schema(write_behind):
+    with pytest.raises(ValueError):
+        counters.increment(Conversation, 1, message_count=1)
+
+    assert not write_behind.smembers(counters.DIRTY_KEY)
+
+
+def test_failed_flush_keeps_increments(write_behind, tenant_schemas, monkeypatch):
+    schema = tenant_schemas[0]
+    conversation = _create_conversation(schema)
+    counters.increment(Conversation, conversation.id, tenant_schema=schema, message_count=4)
+
+    def fail(*args):
+        raise RuntimeError('database unavailable')
+
+    with monkeypatch.context() as patched:
+        patched.setattr(counters, '_update', fail)
+        assert counters.flush() == 0
+
+    assert counters.flush() == 1
+    assert _get_conversation(schema, conversation.id).message_count == 4
@@ -0,0 +1,139 @@
+import asyncio
+import time
+import openai
+import pytest
+from apps.agent import llm
+
+CHAT = '/v1/chat/completions'
+EMBEDDINGS = '/v1/embeddings'
+MESSAGES = [{'role': 'user', 'content': 'hello'}]
+
+
+def _prime_hedging(settings, operation, seconds=0.05):
+    """Enough fast latency samples for a hedging threshold of ~seconds"""
+    settings.LLM_HEDGE_ENABLED = True
+    for _ in range(llm.MIN_HEDGE_SAMPLES):
+        llm._record_latency(operation, seconds)
+
+
+def test_chat_completion(fake_openai):
+    response = llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    assert response.choices[0].message.content == 'echo: hello'
+    assert fake_openai.count(CHAT) == 1
+
+
+def test_create_embedding_single_and_batch(fake_openai):
+    assert llm.create_embedding('one', model='embed-test') == [0.0, 0.0, 0.0]
+    assert llm.create_embedding(['one', 'two'], model='embed-test') == [[0.0] * 3, [1.0] * 3]
+
+
+def test_retries_server_errors(fake_openai):
+    fake_openai.queue(CHAT, status=500)
+    fake_openai.queue(CHAT, status=503)
+
+    response = llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    assert response.choices[0].message.content == 'echo: hello'
+    assert fake_openai.count(CHAT) == 3
+
+
+def test_retries_rate_limit_with_capped_retry_after(fake_openai):
+    fake_openai.queue(CHAT, status=429, headers={'Retry-After': '30'})
+
+    started = time.monotonic()
+    llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    # Retry-After is capped by LLM_BACKOFF_MAX (0.1s)
+    assert time.monotonic() - started < 2
+    assert fake_openai.count(CHAT) == 2
+
+
+def test_gives_up_after_max_retries(fake_openai, settings):
+    settings.LLM_MAX_RETRIES = 1
+    for _ in range(3):
+        fake_openai.queue(CHAT, status=500)
+
+    with pytest.raises(openai.InternalServerError):
+        llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    assert fake_openai.count(CHAT) == 2
+
+
+def test_client_errors_are_not_retried(fake_openai):
+    fake_openai.queue(CHAT, status=400)
+
+    with pytest.raises(openai.BadRequestError):
+        llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    assert fake_openai.count(CHAT) == 1
+
+
+def test_deadline_bounds_slow_server(fake_openai, settings):
+    settings.LLM_REQUEST_TIMEOUT = 0.2
+    settings.LLM_DEADLINE = 0.5
+    for _ in range(5):
+        fake_openai.queue(CHAT, delay=1.0)
+
+    started = time.monotonic()
+    with pytest.raises((openai.APITimeoutError, llm.DeadlineExceeded)):
+        llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    assert time.monotonic() - started < 1.0
+
+
+def test_hedged_request_answers_when_first_is_slow(fake_openai, settings):
+    _prime_hedging(settings, 'chat:gpt-test')
+    fake_openai.queue(CHAT, delay=1.0)
+
+    started = time.monotonic()
+    response = llm.chat_completion(model='gpt-test', messages=MESSAGES)
+
+    assert response.choices[0].message.content == 'echo: hello'
+    assert time.monotonic() - started < 1.0
+    assert fake_openai.count(CHAT) == 2
+
+
+def test_losing_hedged_attempt_stops_retrying(fake_openai, settings):
+    _prime_hedging(settings, 'chat:gpt-test')
+    fake_openai.queue(CHAT, status=500, delay=0.3)  # primary: slow, then fails
+    fake_openai.queue(CHAT)                         # hedge: answers
+
+    llm.chat_completion(model='gpt-test', messages=MESSAGES)
+    time.sleep(0.6)
+
+    # The failed primary would retry, but the hedge already answered
+    assert fake_openai.count(CHAT) == 2
+
+
+def test_async_chat_completion_closes_client_with_loop(fake_openai):
+    async def ask():
+        response = await llm.achat_completion(model='gpt-test', messages=MESSAGES)
+        return response, llm.get_async_client()
+
+    response, client = asyncio.run(ask())
+
+    assert response.choices[0].message.content == 'echo: hello'
+    assert client.is_closed()
+    assert not llm._async_clients
+
+
+def test_async_client_per_loop(fake_openai):
+    async def client():
+        return llm.get_async_client()
+
+    first, second = asyncio.run(client()), asyncio.run(client())
+
+    assert first is not second
+    assert first.is_closed() and second.is_closed()
+
+
+def test_async_hedged_request(fake_openai, settings):
+    _prime_hedging(settings, 'embed:embed-test')
+    fake_openai.queue(EMBEDDINGS, delay=1.0)
+
+    started = time.monotonic()
+    vector = asyncio.run(llm.acreate_embedding('one', model='embed-test'))
+
+    assert vector == [0.0, 0.0, 0.0]
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,131 @@
+import logging
+from datetime import timedelta
+import pytest
+from django.db import connection
+from django.utils import timezone
+from apps.agent import partitions
+from apps.agent.models import Conversation, Message, MessageArchive
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def conversation():
+    return Conversation.objects.create(user_id=1)
+
+
+def _months_ago(months):
+    return partitions.add_months(partitions.month_of(timezone.now()), -months)
+
+
+def _insert_message(conversation, created_at, content='archived'):
+    # Raw insert - Message.created_at is auto_now_add
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO messages (role, content, context_used, tokens_used, metadata, created_at, conversation_id) "
+            "VALUES ('user', %s, '{}', 0, '{}', %s, %s) RETURNING id",
+            [content, created_at, conversation.id]
+        )
+        return cursor.fetchone()[0]
+
+
+def _exists(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [table])
+        return cursor.fetchone()[0] is not None
+
+
+def _expire_month(conversation, months=14):
+    month = _months_ago(months)
+    partitions.create_partition(month)
+    _insert_message(conversation, partitions._month_start(month) + timedelta(days=3))
+    return month, partitions.partition_name(month)
+
+
+def test_maintain_archives_and_drops_expired_month(conversation, media_root):
+    month, name = _expire_month(conversation)
+
+    stats = partitions.maintain('public', 12)
+
+    assert stats['archived'] == [name]
+    assert stats['dropped'] == [name]
+    assert not _exists(name)
+    assert not Message.objects.filter(content='archived').exists()
+
+    archive = MessageArchive.objects.get(month=month)
+    assert archive.row_count == 1
+    assert (media_root / archive.file_path).exists()
+
+
+def test_maintain_keeps_months_within_retention(conversation):
+    month, name = _expire_month(conversation, months=6)
+
+    stats = partitions.maintain('public', 12)
+
+    assert stats['dropped'] == []
+    assert _exists(name)
+    assert not MessageArchive.objects.filter(month=month).exists()
+
+
+def test_restore_loads_archived_month(conversation):
+    month, name = _expire_month(conversation)
+    partitions.maintain('public', 12)
+    archive = MessageArchive.objects.get(month=month)
+
+    assert partitions.restore(archive) == 1
+
+    assert Message.objects.filter(content='archived', conversation=conversation).exists()
+    archive.refresh_from_db()
+    assert archive.restored_at
+
+    # A restored month is kept for MESSAGE_RESTORE_KEEP_DAYS
+    assert partitions.maintain('public', 12)['dropped'] == []
+    assert _exists(name)
+
+
+def test_restore_skips_deleted_conversations(conversation):
+    month, _ = _expire_month(conversation)
+    partitions.maintain('public', 12)
+    conversation.delete()
+
+    assert partitions.restore(MessageArchive.objects.get(month=month)) == 0
+
+
+def test_create_partition_moves_rows_out_of_default(conversation):
+    month = _months_ago(20)
+    message_id = _insert_message(conversation, partitions._month_start(month) + timedelta(days=1))
+    assert partitions.default_partition_rows() == 1
+
+    partitions.create_partition(month)
+
+    assert partitions.default_partition_rows() == 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id FROM "{partitions.partition_name(month)}"')
+        assert cursor.fetchall() == [(message_id,)]
+
+
+def test_maintain_logs_rows_left_in_default(conversation, caplog):
+    _insert_message(conversation, partitions._month_start(_months_ago(20)))
+
+    with caplog.at_level(logging.ERROR, logger='apps.agent.partitions'):
+        partitions.maintain('public', 0)
+
+    assert partitions.DEFAULT_PARTITION in caplog.text
+
+
+def test_maintain_logs_low_coverage_and_recreates(caplog):
+    next_month = partitions.partition_name(_months_ago(-1))
+    partitions.detach_partition(next_month)
+    partitions.drop_partition(next_month)
+
+    with caplog.at_level(logging.ERROR, logger='apps.agent.partitions'):
+        stats = partitions.maintain('public', 0)
+
+    assert 'cover only 1 month(s)' in caplog.text
+    assert next_month in stats['created']
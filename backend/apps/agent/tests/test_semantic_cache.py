@@ -0,0 +1,125 @@
+import math
+from datetime import timedelta
+import pytest
+from django.utils import timezone
+from apps.agent import semantic_cache
+from apps.agent.models import CachedResponse, Conversation, Message, Prompt
+from apps.documents.models import Document
+
+DIMENSIONS = 1536
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def cache_settings(settings):
+    settings.AGENT_SEMANTIC_CACHE_THRESHOLD = 0.95
+    settings.AGENT_SEMANTIC_CACHE_TTL_HOURS = 24
+
+
+def _vector(*weights):
+    """Unit vector with the given leading components"""
+    norm = math.sqrt(sum(weight * weight for weight in weights))
+    return [weight / norm for weight in weights] + [0.0] * (DIMENSIONS - len(weights))
+
+
+def test_same_question_hits(settings):
+    entry = semantic_cache.store(1, 3, 'Are you open on Sunday?', 'Yes, 10-16.', _vector(1, 0))
+
+    hit = semantic_cache.lookup(1, 3, _vector(1, 0.05))
+
+    assert hit['id'] == entry.id
+    assert hit['answer'] == 'Yes, 10-16.'
+    assert hit['similarity'] > settings.AGENT_SEMANTIC_CACHE_THRESHOLD
+    assert CachedResponse.objects.get(id=entry.id).hits == 1
+
+
+def test_different_question_misses():
+    semantic_cache.store(1, 3, 'Are you open on Sunday?', 'Yes, 10-16.', _vector(1, 0))
+
+    assert semantic_cache.lookup(1, 3, _vector(1, 1)) is None
+
+
+def test_key_includes_user_and_prompt_version():
+    semantic_cache.store(1, 3, 'Are you open on Sunday?', 'Yes, 10-16.', _vector(1, 0))
+
+    assert semantic_cache.lookup(2, 3, _vector(1, 0)) is None
+    assert semantic_cache.lookup(1, 4, _vector(1, 0)) is None
+
+
+def test_expired_entries_miss():
+    entry = semantic_cache.store(1, 3, 'Are you open on Sunday?', 'Yes, 10-16.', _vector(1, 0))
+    CachedResponse.objects.filter(id=entry.id).update(created_at=timezone.now() - timedelta(hours=25))
+
+    assert semantic_cache.lookup(1, 3, _vector(1, 0)) is None
+
+
+def test_clear_keeps_current_prompt_version():
+    semantic_cache.store(1, 3, 'old', 'old answer', _vector(1, 0))
+    current = semantic_cache.store(1, 4, 'new', 'new answer', _vector(1, 0))
+    other_user = semantic_cache.store(2, 3, 'other', 'other answer', _vector(1, 0))
+
+    semantic_cache.clear(user_id=1, keep_version=4)
+
+    assert set(CachedResponse.objects.values_list('id', flat=True)) == {current.id, other_user.id}
+
+
+def test_document_delete_clears_cache():
+    document = Document.objects.create(user_id=1, title='Prices', file_type='txt', file_path='documents/prices.txt', file_size=10)
+    semantic_cache.store(1, 3, 'How much is a manicure?', '20 EUR', _vector(1, 0))
+
+    # Saving alone doesn't invalidate - ingestion finishing does (create_embeddings)
+    document.title = 'Prices 2026'
+    document.save()
+    assert CachedResponse.objects.exists()
+
+    document.delete()
+    assert not CachedResponse.objects.exists()
+
+
+class TestCacheableTurns:
+    """Only standalone turns use the cache - the key carries no conversation context"""
+
+    @pytest.fixture
+    def agent(self, monkeypatch):
+        from apps.agent.services import AgentService
+
+        monkeypatch.setattr(
+            'apps.integrations.calendar_ai_tools.get_calendar_tools_for_user',
+            lambda user_id, tenant_schema: None
+        )
+        return AgentService(user_id=1, tenant_schema='public')
+
+    @pytest.fixture
+    def prompt(self):
+        return Prompt(user_id=1, semantic_cache_enabled=True)
+
+    @pytest.fixture
+    def conversation(self):
+        return Conversation.objects.create(user_id=1)
+
+    def test_first_turn(self, agent, prompt, conversation):
+        assert agent._is_cacheable(prompt, _vector(1), conversation, history=[], upcoming=None)
+
+    def test_cache_disabled(self, agent, prompt, conversation):
+        prompt.semantic_cache_enabled = False
+
+        assert not agent._is_cacheable(prompt, _vector(1), conversation, history=[], upcoming=None)
+
+    def test_follow_up_turn(self, agent, prompt, conversation):
+        history = [{'role': 'user', 'content': 'Are you open on Sunday?'}, {'role': 'assistant', 'content': 'Yes'}]
+
+        assert not agent._is_cacheable(prompt, _vector(1), conversation, history=history, upcoming=None)
+
+    def test_summarized_conversation(self, agent, prompt, conversation):
+        conversation.summary = 'Customer asked about Sunday opening hours.'
+
+        assert not agent._is_cacheable(prompt, _vector(1), conversation, history=[], upcoming=None)
+
+    def test_live_calendar_data(self, agent, prompt, conversation):
+        assert not agent._is_cacheable(prompt, _vector(1), conversation, history=[], upcoming=['10:00 Manicure'])
+
+    def test_conversation_that_used_tools(self, agent, prompt, conversation):
+        Message.objects.create(conversation=conversation, role='assistant', content='Booked', metadata={'function_calls': 1})
+
+        assert not agent._is_cacheable(prompt, _vector(1), conversation, history=[], upcoming=None)
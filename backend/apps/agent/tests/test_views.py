@@ -0,0 +1,132 @@
+from datetime import timedelta
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.accounts.models import User
+from apps.agent.models import Conversation, Message
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='owner', email='owner@example.com', password='secret')
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def _conversation(user, messages=0):
+    conversation = Conversation.objects.create(user_id=user.id)
+    start = timezone.now() - timedelta(hours=1)
+    for i in range(messages):
+        message = Message.objects.create(conversation=conversation, role='user', content=f"message {i}")
+        # Distinct, ordered timestamps - auto_now_add gives no such guarantee
+        Message.objects.filter(pk=message.pk).update(created_at=start + timedelta(seconds=i))
+    return conversation
+
+
+def test_messages_pages_newest_first_without_duplicates(client, user):
+    conversation = _conversation(user, messages=120)
+    url = reverse('agent:history_messages', args=[conversation.id])
+
+    contents, pages = [], 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        contents += [message['content'] for message in response.data['results']]
+        url = response.data['next']
+        pages += 1
+
+    assert pages == 3
+    assert contents == [f"message {i}" for i in reversed(range(120))]
+
+
+def test_messages_with_same_timestamp_across_pages(client, user):
+    conversation = _conversation(user, messages=25)
+    Message.objects.filter(conversation=conversation).update(created_at=timezone.now() - timedelta(minutes=5))
+    expected = list(Message.objects.filter(conversation=conversation).order_by('-id').values_list('id', flat=True))
+
+    url = reverse('agent:history_messages', args=[conversation.id])
+    ids, params = [], {'page_size': 10}
+    while url:
+        response = client.get(url, params)
+        ids += [message['id'] for message in response.data['results']]
+        url, params = response.data['next'], None
+
+    assert ids == expected
+
+
+def test_messages_page_size(client, user):
+    conversation = _conversation(user, messages=30)
+
+    response = client.get(reverse('agent:history_messages', args=[conversation.id]), {'page_size': 10})
+
+    assert [message['content'] for message in response.data['results']] == [
+        f"message {i}" for i in reversed(range(20, 30))
+    ]
+    assert response.data['next']
+
+
+def test_messages_of_another_user_not_found(client):
+    other = User.objects.create_user(username='other', email='other@example.com', password='secret')
+    conversation = _conversation(other, messages=1)
+
+    response = client.get(reverse('agent:history_messages', args=[conversation.id]))
+
+    assert response.status_code == 404
+
+
+def test_detail_returns_latest_messages(client, user):
+    conversation = _conversation(user, messages=55)
+
+    response = client.get(reverse('agent:history_detail', args=[conversation.id]))
+
+    assert response.data['has_more_messages'] is True
+    assert [message['content'] for message in response.data['messages']] == [
+        f"message {i}" for i in range(5, 55)
+    ]
+
+
+def test_detail_without_older_messages(client, user):
+    conversation = _conversation(user, messages=3)
+
+    response = client.get(reverse('agent:history_detail', args=[conversation.id]))
+
+    assert response.data['has_more_messages'] is False
+    assert len(response.data['messages']) == 3
+
+
+def test_list_annotates_last_message(client, user):
+    conversation = _conversation(user, messages=2)
+    Conversation.objects.create(user_id=user.id)
+
+    response = client.get(reverse('agent:history_list'))
+
+    last_messages = {row['id']: row['last_message'] for row in response.data['results']}
+    assert last_messages[conversation.id]['content'] == 'message 1'
+    assert list(last_messages.values()).count(None) == 1
+
+
+def test_list_query_count_does_not_grow(client, user):
+    url = reverse('agent:history_list')
+    _conversation(user, messages=2)
+
+    with CaptureQueriesContext(connection) as few:
+        assert client.get(url).status_code == 200
+
+    for _ in range(10):
+        _conversation(user, messages=2)
+
+    with CaptureQueriesContext(connection) as many:
+        response = client.get(url)
+
+    assert response.data['count'] == 11
+    assert len(many) == len(few)
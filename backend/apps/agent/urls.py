@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
-    PromptView, chat_view, ConversationListView,
-    ConversationDetailView, test_chat_view
+    PromptView, chat_view, chat_stream_view, ConversationListView,
+    ConversationDetailView, ConversationMessagesView, test_chat_view
 )
 
 app_name = 'agent'
@@ -9,7 +9,9 @@ app_name = 'agent'
 urlpatterns = [
     path('prompt/', PromptView.as_view(), name='prompt'),
     path('chat/', chat_view, name='chat'),
+    path('chat/stream/', chat_stream_view, name='chat_stream'),
     path('test/', test_chat_view, name='test'),
     path('history/', ConversationListView.as_view(), name='history_list'),
     path('history/<int:pk>/', ConversationDetailView.as_view(), name='history_detail'),
+    path('history/<int:pk>/messages/', ConversationMessagesView.as_view(), name='history_messages'),
 ]
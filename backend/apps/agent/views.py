@@ -1,8 +1,16 @@
+import json
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Left
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from apps.accounts.middleware import TenantSchemaContext
 from .models import Prompt, Conversation, Message
 from .services import AgentService
+from . import semantic_cache, prompt_cache
 from rest_framework import serializers
 
 
@@ -11,7 +19,8 @@ class PromptSerializer(serializers.ModelSerializer):
         model = Prompt
         fields = [
             'id', 'role', 'instructions', 'context',
-            'temperature', 'max_tokens', 'model',
+            'temperature', 'max_tokens', 'model', 'fast_model', 'routing_enabled',
+            'semantic_cache_enabled',
             'is_active', 'version', 'created_at', 'updated_at'
         ]
         read_only_fields = ['version', 'created_at', 'updated_at']
@@ -27,15 +36,28 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class ConversationSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+    """
+    Conversation with its latest DETAIL_MESSAGES messages (chronological);
+    older ones are loaded page by page from history/<pk>/messages/
+    """
+    DETAIL_MESSAGES = 50
 
     class Meta:
         model = Conversation
         fields = [
             'id', 'source', 'title', 'message_count',
-            'total_tokens', 'created_at', 'updated_at', 'messages'
+            'total_tokens', 'created_at', 'updated_at'
         ]
 
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+
+        # One extra row tells whether older messages exist
+        latest = list(obj.messages.order_by('-created_at', '-id')[:self.DETAIL_MESSAGES + 1])
+        data['messages'] = MessageSerializer(reversed(latest[:self.DETAIL_MESSAGES]), many=True).data
+        data['has_more_messages'] = len(latest) > self.DETAIL_MESSAGES
+        return data
+
 
 class ConversationListSerializer(serializers.ModelSerializer):
     last_message = serializers.SerializerMethodField()
@@ -48,16 +70,29 @@ class ConversationListSerializer(serializers.ModelSerializer):
         ]
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
+        # Annotated by ConversationListView.get_queryset - no query per conversation
+        if obj.last_message_created_at:
             return {
-                'role': last_msg.role,
-                'content': last_msg.content[:100],
-                'created_at': last_msg.created_at
+                'role': obj.last_message_role,
+                'content': obj.last_message_content,
+                'created_at': obj.last_message_created_at
             }
         return None
 
 
+class MessageCursorPagination(CursorPagination):
+    """
+    Newest messages first; keyset over the (conversation, created_at) index
+
+    id breaks ties - messages sharing a timestamp (bulk imports, restored
+    archives) would otherwise repeat or be skipped across pages.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 class PromptView(generics.RetrieveUpdateAPIView):
     """Get/Update AI prompt"""
     serializer_class = PromptSerializer
@@ -77,6 +112,10 @@ class PromptView(generics.RetrieveUpdateAPIView):
         instance.version += 1
         instance.save()
 
+        # Compiled prompt and cached answers belong to the previous version
+        prompt_cache.invalidate(self.request.user.organization.schema_name, instance.user_id, instance.version)
+        semantic_cache.clear(user_id=instance.user_id, keep_version=instance.version)
+
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -135,20 +174,82 @@ def chat_view(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def chat_stream_view(request):
+    """
+    Send message to AI agent, stream the answer as Server-Sent Events
+
+    A stream occupies its worker thread until the answer is done - gunicorn
+    runs gthread workers (docker-compose) so it doesn't block a whole process.
+    """
+    conversation_id = request.data.get('conversation_id')
+    message = request.data.get('message')
+    photo_id = request.data.get('photo_id')
+
+    if not message:
+        return Response({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    tenant_schema = request.user.organization.schema_name
+
+    # Create agent service
+    agent = AgentService(
+        user_id=request.user.id,
+        tenant_schema=tenant_schema
+    )
+
+    # Create conversation if not provided
+    if not conversation_id:
+        conversation_id = agent.create_conversation(source='web').id
+    elif not Conversation.objects.filter(id=conversation_id, user_id=request.user.id).exists():
+        return Response(
+            {'error': 'Conversation not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    def event_stream():
+        # Generator runs after the view returns - keep the tenant schema explicitly
+        with TenantSchemaContext(tenant_schema):
+            try:
+                for event in agent.chat_stream(
+                    conversation_id=conversation_id,
+                    user_message=message,
+                    photo_id=photo_id
+                ):
+                    if event['type'] == 'done':
+                        event['conversation_id'] = conversation_id
+                    yield f"data: {json.dumps(event, default=str)}\n\n"
+
+            except Exception as e:
+                yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # disable nginx buffering
+    return response
+
+
 class ConversationListView(generics.ListCreateAPIView):
     """List conversations or create new one"""
     serializer_class = ConversationListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Conversation.objects.filter(user_id=self.request.user.id)
+        # Last message fields as correlated subqueries (each one index lookup), not a query per row
+        last_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at')[:1]
+
+        return Conversation.objects.filter(user_id=self.request.user.id).annotate(
+            last_message_role=Subquery(last_message.values('role')),
+            last_message_content=Subquery(last_message.values(snippet=Left('content', 100))),
+            last_message_created_at=Subquery(last_message.values('created_at')),
+        )
 
     def perform_create(self, serializer):
         serializer.save(user_id=self.request.user.id)
 
 
 class ConversationDetailView(generics.RetrieveDestroyAPIView):
-    """Get conversation with messages"""
+    """Get conversation with latest messages"""
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -156,6 +257,18 @@ class ConversationDetailView(generics.RetrieveDestroyAPIView):
         return Conversation.objects.filter(user_id=self.request.user.id)
 
 
+class ConversationMessagesView(generics.ListAPIView):
+    """Messages of a conversation, newest first, cursor-paginated (?cursor=...)"""
+    serializer_class = MessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        conversation = get_object_or_404(Conversation, id=self.kwargs['pk'], user_id=self.request.user.id)
+        return Message.objects.filter(conversation=conversation)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def test_chat_view(request):
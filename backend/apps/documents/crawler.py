@@ -0,0 +1,302 @@
+"""
+Website crawler for the knowledge base
+
+Fetches a page or every page listed in a sitemap with asyncio + httpx:
+a bounded connection pool, per-host concurrency and delay (politeness),
+conditional GETs with ETag/Last-Modified so unchanged pages cost a 304,
+and plain text extraction from HTML.
+
+URLs come from tenants, so every request (and every redirect hop, which is
+followed manually) is checked: the host must resolve to public addresses
+only, and the connection goes to the checked address (no second DNS
+lookup). Bodies are read with a WEB_CRAWL_MAX_BYTES cap and sitemaps are
+parsed with defusedxml.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+import httpx
+from defusedxml import ElementTree
+from django.conf import settings
+
+USER_AGENT = 'SlothBot/1.0 (+knowledge base crawler)'
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+# Content of these tags is not page text
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'nav', 'header', 'footer', 'form', 'iframe'}
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'aside', 'br', 'li', 'ul', 'ol', 'table', 'tr',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'dt', 'dd'
+}
+
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+class UnsafeURL(ValueError):
+    """URL is not http(s) or its host resolves to a non-public address"""
+
+
+class ResponseTooLarge(ValueError):
+    """Response body exceeds WEB_CRAWL_MAX_BYTES"""
+
+
+class PageResult:
+    """Outcome of fetching one URL"""
+
+    def __init__(self, url, status, text='', title='', etag='', last_modified='', size=0, error=''):
+        self.url = url
+        self.status = status  # 'fetched', 'not_modified', 'error'
+        self.text = text
+        self.title = title
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.error = error
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.title = ''
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == 'title':
+            self._in_title = True
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == 'title':
+            self._in_title = False
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    """Visible text of an HTML page, one block per line. Returns (title, text)"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+
+    lines = [' '.join(line.split()) for line in ''.join(parser.parts).splitlines()]
+    return parser.title.strip(), '\n'.join(line for line in lines if line)
+
+
+def crawl(url, is_sitemap=False, validators=None):
+    """
+    Crawl a page or sitemap (sync entry point for Celery tasks)
+
+    validators: {page_url: {'etag': ..., 'last_modified': ...}} from the previous crawl
+    Returns list of PageResult
+    """
+    return asyncio.run(_crawl(url, is_sitemap, validators or {}))
+
+
+async def _crawl(url, is_sitemap, validators):
+    async with _client() as client:
+        politeness = _HostPoliteness()
+
+        if is_sitemap:
+            page_urls = await _discover_sitemap(client, politeness, url)
+        else:
+            page_urls = [url]
+
+        page_urls = page_urls[:settings.WEB_CRAWL_MAX_PAGES]
+        return await asyncio.gather(*[
+            _fetch_page(client, politeness, page_url, validators.get(page_url, {}))
+            for page_url in page_urls
+        ])
+
+
+def _client():
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.WEB_CRAWL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WEB_CRAWL_MAX_CONNECTIONS,
+        ),
+        timeout=settings.WEB_CRAWL_TIMEOUT,
+        follow_redirects=False,  # redirects are followed in _get, each hop checked
+        trust_env=False,  # no proxies from the environment - connections go to the checked address
+        headers={'User-Agent': USER_AGENT},
+    )
+
+
+async def resolve_public(url):
+    """
+    Address to connect to for url
+
+    Raises UnsafeURL unless url is http(s) and every address its host
+    resolves to is public (no loopback, private, link-local, reserved...).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise UnsafeURL(f"Only http(s) URLs can be crawled: {url}")
+
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise UnsafeURL(f"Can't resolve {parsed.hostname}: {e}")
+
+    addresses = sorted({info[4][0] for info in infos})
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeURL(f"{parsed.hostname} resolves to non-public address {address}")
+
+    if not addresses:
+        raise UnsafeURL(f"Can't resolve {parsed.hostname}")
+    return addresses[0]
+
+
+class _HostPoliteness:
+    """Limit concurrent requests and enforce a minimum delay per host"""
+
+    def __init__(self):
+        self._semaphores = {}
+        self._locks = {}
+        self._last_request = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(settings.WEB_CRAWL_PER_HOST))
+        lock = self._locks.setdefault(host, asyncio.Lock())
+
+        await semaphore.acquire()
+        async with lock:
+            delay = settings.WEB_CRAWL_HOST_DELAY - (time.monotonic() - self._last_request.get(host, 0))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request[host] = time.monotonic()
+        return semaphore
+
+
+async def _get(client, politeness, url, headers=None):
+    """
+    GET with checked redirects and a body size cap
+
+    Returns (response, body, final_url); response content is not loaded, use body.
+    """
+    for _ in range(settings.WEB_CRAWL_MAX_REDIRECTS + 1):
+        semaphore = await politeness.wait(url)
+        try:
+            response, body = await _get_pinned(client, url, headers)
+        finally:
+            semaphore.release()
+
+        location = response.headers.get('location')
+        if response.status_code not in REDIRECT_STATUSES or not location:
+            return response, body, url
+
+        url = urljoin(url, location)
+
+    raise httpx.TooManyRedirects(f"More than {settings.WEB_CRAWL_MAX_REDIRECTS} redirects", request=response.request)
+
+
+async def _get_pinned(client, url, headers=None):
+    """One request to the checked address of url's host, body read up to WEB_CRAWL_MAX_BYTES"""
+    address = await resolve_public(url)
+    parsed = urlparse(url)
+
+    host = f'[{address}]' if ':' in address else address
+    if parsed.port:
+        host = f'{host}:{parsed.port}'
+
+    request_headers = {'Host': parsed.netloc.rsplit('@', 1)[-1], **(headers or {})}
+    extensions = {'sni_hostname': parsed.hostname} if parsed.scheme == 'https' else {}
+
+    async with client.stream(
+        'GET',
+        parsed._replace(netloc=host).geturl(),
+        headers=request_headers,
+        extensions=extensions,
+    ) as response:
+        if int(response.headers.get('content-length') or 0) > settings.WEB_CRAWL_MAX_BYTES:
+            raise ResponseTooLarge(f"{url} is larger than {settings.WEB_CRAWL_MAX_BYTES} bytes")
+
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) > settings.WEB_CRAWL_MAX_BYTES:
+                raise ResponseTooLarge(f"{url} is larger than {settings.WEB_CRAWL_MAX_BYTES} bytes")
+
+    return response, bytes(body)
+
+
+def _decode(response, body):
+    return body.decode(response.charset_encoding or 'utf-8', errors='replace')
+
+
+async def _discover_sitemap(client, politeness, url, depth=0):
+    """Page URLs from a sitemap; follows sitemap indexes two levels deep"""
+    response, body, url = await _get(client, politeness, url)
+    response.raise_for_status()
+
+    root = ElementTree.fromstring(body)
+    locations = [loc.text.strip() for loc in root.iter(f'{SITEMAP_NS}loc') if loc.text]
+
+    if root.tag != f'{SITEMAP_NS}sitemapindex':
+        return locations
+
+    if depth >= 2:
+        return []
+
+    nested = await asyncio.gather(*[
+        _discover_sitemap(client, politeness, urljoin(url, location), depth + 1)
+        for location in locations
+    ], return_exceptions=True)
+
+    return [page for pages in nested if not isinstance(pages, Exception) for page in pages]
+
+
+async def _fetch_page(client, politeness, url, validator):
+    """Conditional GET of a single page"""
+    headers = {}
+    if validator.get('etag'):
+        headers['If-None-Match'] = validator['etag']
+    if validator.get('last_modified'):
+        headers['If-Modified-Since'] = validator['last_modified']
+
+    try:
+        response, body, _ = await _get(client, politeness, url, headers=headers)
+
+        if response.status_code == 304:
+            return PageResult(url, 'not_modified', etag=validator.get('etag', ''),
+                              last_modified=validator.get('last_modified', ''))
+
+        response.raise_for_status()
+
+        if 'html' not in response.headers.get('content-type', 'text/html'):
+            return PageResult(url, 'error', error=f"Unsupported content type {response.headers['content-type']}")
+
+        title, text = html_to_text(_decode(response, body))
+        return PageResult(
+            url,
+            'fetched',
+            text=text,
+            title=title,
+            etag=response.headers.get('etag', ''),
+            last_modified=response.headers.get('last-modified', ''),
+            size=len(body),
+        )
+
+    except Exception as e:
+        return PageResult(url, 'error', error=str(e))
@@ -0,0 +1,218 @@
+"""
+Tenant-fair dispatch for ingestion tasks
+
+Ingestion tasks (process_document, process_photo(s), create_embeddings) are
+not sent to Celery directly. They go to a per-tenant backlog in Redis and
+are released round-robin across tenants: each tenant may have at most
+INGESTION_TENANT_CONCURRENCY x plan weight tasks in flight, and at most
+INGESTION_MAX_IN_FLIGHT tasks are released overall. A tenant rebuilding
+10k documents therefore can't starve fresh uploads of other tenants.
+
+Finished tasks free their slot through the task_postrun signal, which also
+releases the next batch. A beat task re-runs dispatch as a safety net.
+"""
+import json
+import logging
+import time
+import uuid
+from celery import current_app, shared_task
+from celery.signals import task_postrun
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from config.celery import check_payload_size
+
+logger = logging.getLogger(__name__)
+
+BACKLOG_KEY = 'ingest:backlog:{tenant}'    # list of pending task payloads
+IN_FLIGHT_KEY = 'ingest:inflight:{tenant}'  # zset: task id -> expiry timestamp
+TENANTS_KEY = 'ingest:tenants'              # set of tenants with a backlog
+CURSOR_KEY = 'ingest:cursor'                # rotates which tenant goes first
+LOCK_KEY = 'ingest:dispatch-lock'
+LOCK_TTL = 30
+
+# Pop the next payload, or drop the tenant from TENANTS_KEY if its backlog is
+# empty - in one step, so a job pushed in between can't be left without its tenant
+POP_OR_REMOVE_LUA = """
+local payload = redis.call('LPOP', KEYS[1])
+if not payload then
+    redis.call('SREM', KEYS[2], ARGV[1])
+end
+return payload
+"""
+
+# Release the dispatch lock only if it is still ours (it may have expired and been re-taken)
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def enqueue(task, **kwargs):
+    """Add ingestion task to its tenant's backlog and dispatch"""
+    enqueue_many([(task, kwargs)])
+
+
+def enqueue_many(items):
+    """Add several (task, kwargs) pairs in one round trip; kwargs must include tenant_schema"""
+    redis = get_redis_connection('default')
+    pipe = redis.pipeline()
+
+    for task, kwargs in items:
+        check_payload_size(task.name, kwargs=kwargs)
+        tenant = kwargs['tenant_schema']
+        pipe.rpush(BACKLOG_KEY.format(tenant=tenant), json.dumps({'task': task.name, 'kwargs': kwargs}))
+        pipe.sadd(TENANTS_KEY, tenant)
+
+    pipe.execute()
+    dispatch()
+
+
+def dispatch():
+    """Release backlog to Celery workers, round-robin by tenant, weighted by plan"""
+    redis = get_redis_connection('default')
+
+    # Only one dispatcher at a time; whoever holds the lock drains the backlog
+    token = uuid.uuid4().hex
+    if not redis.set(LOCK_KEY, token, nx=True, ex=LOCK_TTL):
+        return 0
+
+    pop_or_remove = redis.register_script(POP_OR_REMOVE_LUA)
+
+    try:
+        tenants = sorted(t.decode() for t in redis.smembers(TENANTS_KEY))
+        if not tenants:
+            return 0
+
+        offset = redis.incr(CURSOR_KEY) % len(tenants)
+        tenants = tenants[offset:] + tenants[:offset]
+
+        in_flight = {tenant: _in_flight_count(redis, tenant) for tenant in tenants}
+        weights = {tenant: _tenant_weight(tenant) for tenant in tenants}
+        total_in_flight = sum(in_flight.values())
+        released = 0
+
+        # Each round gives every tenant up to <weight> slots
+        active = list(tenants)
+        while active and total_in_flight < settings.INGESTION_MAX_IN_FLIGHT:
+            for tenant in list(active):
+                cap = settings.INGESTION_TENANT_CONCURRENCY * weights[tenant]
+                slots = min(
+                    weights[tenant],
+                    cap - in_flight[tenant],
+                    settings.INGESTION_MAX_IN_FLIGHT - total_in_flight
+                )
+
+                if slots <= 0:
+                    active.remove(tenant)
+                    continue
+
+                for _ in range(slots):
+                    payload = pop_or_remove(
+                        keys=[BACKLOG_KEY.format(tenant=tenant), TENANTS_KEY],
+                        args=[tenant]
+                    )
+                    if payload is None:
+                        active.remove(tenant)
+                        break
+
+                    if not _send(redis, tenant, json.loads(payload)):
+                        return released  # broker unavailable - retried on the next dispatch
+
+                    in_flight[tenant] += 1
+                    total_in_flight += 1
+                    released += 1
+
+        return released
+
+    finally:
+        redis.register_script(RELEASE_LOCK_LUA)(keys=[LOCK_KEY], args=[token])
+
+
+def queue_depths(tenants=None):
+    """Backlog and in-flight counts per tenant"""
+    redis = get_redis_connection('default')
+    if tenants is None:
+        tenants = sorted(t.decode() for t in redis.smembers(TENANTS_KEY))
+
+    return {
+        tenant: {
+            'backlog': redis.llen(BACKLOG_KEY.format(tenant=tenant)),
+            'in_flight': _in_flight_count(redis, tenant),
+        }
+        for tenant in tenants
+    }
+
+
+def _send(redis, tenant, payload):
+    """Publish one payload; on failure put it back at the head of the backlog and return False"""
+    task_id = str(uuid.uuid4())
+
+    # Slot expires after the task time limit in case the worker dies
+    expires_at = time.time() + settings.CELERY_TASK_TIME_LIMIT
+    redis.zadd(IN_FLIGHT_KEY.format(tenant=tenant), {task_id: expires_at})
+
+    try:
+        current_app.send_task(
+            payload['task'],
+            kwargs=payload['kwargs'],
+            task_id=task_id,
+            queue=settings.INGESTION_QUEUE
+        )
+    except Exception as e:
+        logger.error(f"Error sending {payload['task']} for {tenant}, returned to backlog: {e}")
+        pipe = redis.pipeline()
+        pipe.zrem(IN_FLIGHT_KEY.format(tenant=tenant), task_id)
+        pipe.lpush(BACKLOG_KEY.format(tenant=tenant), json.dumps(payload))
+        pipe.sadd(TENANTS_KEY, tenant)
+        pipe.execute()
+        return False
+
+    return True
+
+
+def _in_flight_count(redis, tenant):
+    key = IN_FLIGHT_KEY.format(tenant=tenant)
+    redis.zremrangebyscore(key, '-inf', time.time())
+    return redis.zcard(key)
+
+
+def _tenant_weight(tenant):
+    """Dispatch weight from the organization's plan (cached)"""
+    cache_key = f'ingest:weight:{tenant}'
+    weight = cache.get(cache_key)
+
+    if weight is None:
+        from apps.subscriptions.models import Subscription
+
+        plan_slug = Subscription.objects.filter(
+            organization__schema_name=tenant
+        ).values_list('plan__slug', flat=True).first()
+        weight = settings.INGESTION_PLAN_WEIGHTS.get(plan_slug, 1)
+        cache.set(cache_key, weight, 300)
+
+    return max(int(weight), 1)
+
+
+@task_postrun.connect
+def _release_slot(task_id=None, kwargs=None, **extra):
+    """Free the tenant's slot when a dispatched task finishes and release more work"""
+    tenant = (kwargs or {}).get('tenant_schema')
+    if not tenant or not task_id:
+        return
+
+    try:
+        redis = get_redis_connection('default')
+        if redis.zrem(IN_FLIGHT_KEY.format(tenant=tenant), task_id):
+            dispatch()
+    except Exception as e:
+        logger.error(f"Error releasing ingestion slot for {tenant}: {e}")
+
+
+@shared_task
+def dispatch_ingestion():
+    """Periodic safety net: release backlog that wasn't picked up"""
+    released = dispatch()
+    return f"Released {released} ingestion tasks"
@@ -0,0 +1,61 @@
+"""
+Image pre-processing before Google Vision
+
+Phone photos are downscaled, EXIF-rotated and recompressed before upload,
+and a perceptual hash (dHash) lets near-identical shots reuse the Vision
+results of a photo that was already analyzed.
+"""
+import io
+from django.conf import settings
+from PIL import Image, ImageOps
+
+HASH_SIZE = 8  # 8x8 -> 64-bit hash
+_MASK = (1 << 64) - 1
+
+
+def prepare_image(image_file):
+    """
+    Normalize orientation, downscale to VISION_MAX_IMAGE_EDGE and recompress to JPEG
+
+    image_file: binary file-like object (original bytes are never loaded whole)
+    Returns (jpeg_bytes, phash)
+    """
+    image = Image.open(image_file)
+    image.draft('RGB', (settings.VISION_MAX_IMAGE_EDGE, settings.VISION_MAX_IMAGE_EDGE))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    max_edge = settings.VISION_MAX_IMAGE_EDGE
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    phash = perceptual_hash(image)
+
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=settings.VISION_JPEG_QUALITY, optimize=True)
+    return output.getvalue(), phash
+
+
+def perceptual_hash(image):
+    """
+    Difference hash: compare neighbouring pixels of a 9x8 grayscale thumbnail
+
+    Stored as signed 64-bit so it fits a BigIntegerField.
+    """
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = (value << 1) | (left > right)
+
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hashes"""
+    return bin((hash_a ^ hash_b) & _MASK).count('1')
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='user_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='current_stage',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='processingjob',
+            index=models.Index(fields=['content_type', 'object_id'], name='processing__content_5d1c3e_idx'),
+        ),
+    ]
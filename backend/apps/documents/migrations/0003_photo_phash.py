@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_processingjob_stages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='phash',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
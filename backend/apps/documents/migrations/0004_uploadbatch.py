@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_photo_phash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('source', models.CharField(choices=[('archive', 'Zip Archive'), ('files', 'Multiple Files')], max_length=20)),
+                ('total_files', models.IntegerField(default=0)),
+                ('skipped', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Upload Batch',
+                'verbose_name_plural': 'Upload Batches',
+                'db_table': 'upload_batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='documents', to='documents.uploadbatch'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='photos', to='documents.uploadbatch'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_uploadbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='DocumentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField()),
+                ('file_type', models.CharField(choices=[('pdf', 'PDF'), ('docx', 'Word Document'), ('txt', 'Text File'), ('xlsx', 'Excel'), ('csv', 'CSV')], max_length=10)),
+                ('file_path', models.CharField(max_length=500)),
+                ('file_size', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='documents.document')),
+            ],
+            options={
+                'verbose_name': 'Document Version',
+                'verbose_name_plural': 'Document Versions',
+                'db_table': 'document_versions',
+                'ordering': ['-version'],
+                'unique_together': {('document', 'version')},
+            },
+        ),
+    ]
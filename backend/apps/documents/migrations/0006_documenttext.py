@@ -0,0 +1,67 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_text_out_of_row(apps, schema_editor):
+    import zstandard
+
+    Document = apps.get_model('documents', 'Document')
+    DocumentText = apps.get_model('documents', 'DocumentText')
+    compressor = zstandard.ZstdCompressor(level=3)
+
+    for document_id, text in Document.objects.exclude(extracted_text='').values_list('id', 'extracted_text').iterator():
+        raw = text.encode('utf-8')
+        data = compressor.compress(raw)
+        DocumentText.objects.create(
+            document_id=document_id,
+            codec='zstd',
+            data=data,
+            raw_size=len(raw),
+            compressed_size=len(data),
+        )
+
+
+def move_text_back(apps, schema_editor):
+    import zstandard
+
+    Document = apps.get_model('documents', 'Document')
+    DocumentText = apps.get_model('documents', 'DocumentText')
+    decompressor = zstandard.ZstdDecompressor()
+
+    for blob in DocumentText.objects.iterator():
+        Document.objects.filter(id=blob.document_id).update(
+            extracted_text=decompressor.decompress(bytes(blob.data)).decode('utf-8')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_document_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text_blob', serialize=False, to='documents.document')),
+                ('codec', models.CharField(default='zstd', max_length=10)),
+                ('data', models.BinaryField()),
+                ('raw_size', models.IntegerField(default=0)),
+                ('compressed_size', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Document Text',
+                'verbose_name_plural': 'Document Texts',
+                'db_table': 'document_texts',
+            },
+        ),
+        migrations.RunPython(move_text_out_of_row, move_text_back),
+        migrations.RemoveField(
+            model_name='document',
+            name='extracted_text',
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_documenttext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('url', models.URLField(max_length=500)),
+                ('is_sitemap', models.BooleanField(default=False)),
+                ('recrawl_interval_hours', models.IntegerField(default=24)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('crawling', 'Crawling'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('last_crawled_at', models.DateTimeField(blank=True, null=True)),
+                ('last_stats', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Web Source',
+                'verbose_name_plural': 'Web Sources',
+                'db_table': 'web_sources',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file_type',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('docx', 'Word Document'), ('txt', 'Text File'), ('xlsx', 'Excel'), ('csv', 'CSV'), ('url', 'Web Page')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='documentversion',
+            name='file_type',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('docx', 'Word Document'), ('txt', 'Text File'), ('xlsx', 'Excel'), ('csv', 'CSV'), ('url', 'Web Page')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='web_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='documents.websource'),
+        ),
+    ]
@@ -1,8 +1,82 @@
+import zstandard
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+class UploadBatch(models.Model):
+    """
+    Масове завантаження файлів - zip архів або кілька файлів (в tenant schema)
+    """
+    SOURCE_CHOICES = [
+        ('archive', 'Zip Archive'),
+        ('files', 'Multiple Files'),
+    ]
+
+    user_id = models.IntegerField(db_index=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    total_files = models.IntegerField(default=0)
+    skipped = models.JSONField(default=list, blank=True)  # [{'name': ..., 'reason': ...}]
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'upload_batches'
+        verbose_name = 'Upload Batch'
+        verbose_name_plural = 'Upload Batches'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Batch {self.id} - {self.total_files} files"
+
+
+class WebSource(models.Model):
+    """
+    Сайт або sitemap, сторінки якого імпортуються в базу знань (в tenant schema)
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('crawling', 'Crawling'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user_id = models.IntegerField(db_index=True)
+    url = models.URLField(max_length=500)
+    is_sitemap = models.BooleanField(default=False)
+    recrawl_interval_hours = models.IntegerField(default=24)  # 0 = no periodic re-crawl
+
+    # Crawl status
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error_message = models.TextField(blank=True)
+    last_crawled_at = models.DateTimeField(null=True, blank=True)
+    last_stats = models.JSONField(default=dict, blank=True)  # {'fetched': 3, 'not_modified': 12, ...}
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'web_sources'
+        verbose_name = 'Web Source'
+        verbose_name_plural = 'Web Sources'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def is_due(self):
+        if not self.recrawl_interval_hours or self.status == 'crawling':
+            return False
+        if not self.last_crawled_at:
+            return True
+        return timezone.now() - self.last_crawled_at >= timedelta(hours=self.recrawl_interval_hours)
+
+
 class Document(models.Model):
     """
     Завантажені документи (в tenant schema)
@@ -13,13 +87,15 @@ class Document(models.Model):
         ('txt', 'Text File'),
         ('xlsx', 'Excel'),
         ('csv', 'CSV'),
+        ('url', 'Web Page'),
     ]
 
     user_id = models.IntegerField(db_index=True)  # Reference to User from public schema
     title = models.CharField(max_length=255)
     file_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
-    file_path = models.CharField(max_length=500)  # S3 URL or local path
+    file_path = models.CharField(max_length=500)  # S3 URL or local path; page URL for 'url'
     file_size = models.IntegerField()  # bytes
+    version = models.IntegerField(default=1)  # bumped on re-upload
 
     # Processing status
     is_processed = models.BooleanField(default=False)
@@ -27,10 +103,27 @@ class Document(models.Model):
     processing_error = models.TextField(blank=True)
     processed_at = models.DateTimeField(null=True, blank=True)
 
-    # Extracted content
-    extracted_text = models.TextField(blank=True)
+    # Extracted content - full text lives compressed in DocumentText, see extracted_text
     metadata = models.JSONField(default=dict, blank=True)
 
+    # Bulk upload this document came from
+    batch = models.ForeignKey(
+        UploadBatch,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='documents'
+    )
+
+    # Website this page was crawled from (file_type 'url')
+    web_source = models.ForeignKey(
+        WebSource,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='documents'
+    )
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -48,6 +141,90 @@ class Document(models.Model):
     def __str__(self):
         return self.title
 
+    @property
+    def extracted_text(self):
+        """Full extracted text, loaded and decompressed on first access"""
+        if not hasattr(self, '_extracted_text'):
+            try:
+                self._extracted_text = self.text_blob.get_text()
+            except DocumentText.DoesNotExist:
+                self._extracted_text = ''
+        return self._extracted_text
+
+    def set_extracted_text(self, text):
+        """Compress and store extracted text out of the documents table"""
+        DocumentText.store(self, text)
+        self._extracted_text = text
+
+
+class DocumentText(models.Model):
+    """
+    Стиснутий (zstd) витягнутий текст документа - окрема таблиця, щоб documents лишалась малою (в tenant schema)
+    """
+    document = models.OneToOneField(
+        Document,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='text_blob'
+    )
+    codec = models.CharField(max_length=10, default='zstd')
+    data = models.BinaryField()
+    raw_size = models.IntegerField(default=0)  # bytes, utf-8
+    compressed_size = models.IntegerField(default=0)
+
+    # Timestamps
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'document_texts'
+        verbose_name = 'Document Text'
+        verbose_name_plural = 'Document Texts'
+
+    def __str__(self):
+        return f"Text of document {self.document_id} ({self.compressed_size}/{self.raw_size} bytes)"
+
+    @classmethod
+    def store(cls, document, text):
+        raw = text.encode('utf-8')
+        data = zstandard.ZstdCompressor(level=settings.DOCUMENT_TEXT_ZSTD_LEVEL).compress(raw)
+        blob, _ = cls.objects.update_or_create(
+            document=document,
+            defaults={
+                'codec': 'zstd',
+                'data': data,
+                'raw_size': len(raw),
+                'compressed_size': len(data),
+            }
+        )
+        return blob
+
+    def get_text(self):
+        return zstandard.ZstdDecompressor().decompress(bytes(self.data)).decode('utf-8')
+
+
+class DocumentVersion(models.Model):
+    """
+    Попередні версії документа - файл, замінений новим завантаженням (в tenant schema)
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
+    version = models.IntegerField()
+    file_type = models.CharField(max_length=10, choices=Document.TYPE_CHOICES)
+    file_path = models.CharField(max_length=500)
+    file_size = models.IntegerField()
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'document_versions'
+        verbose_name = 'Document Version'
+        verbose_name_plural = 'Document Versions'
+        ordering = ['-version']
+        unique_together = ['document', 'version']
+
+    def __str__(self):
+        return f"{self.document_id} v{self.version}"
+
 
 class Photo(models.Model):
     """
@@ -69,9 +246,21 @@ class Photo(models.Model):
     faces = models.JSONField(default=list, blank=True)  # face detection
     colors = models.JSONField(default=list, blank=True)  # dominant colors
 
+    # Perceptual hash (dHash) of the pre-processed image, used to reuse Vision results
+    phash = models.BigIntegerField(null=True, blank=True, db_index=True)
+
     # Metadata
     metadata = models.JSONField(default=dict, blank=True)
 
+    # Bulk upload this photo came from
+    batch = models.ForeignKey(
+        UploadBatch,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='photos'
+    )
+
     # Timestamps
     processed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -101,6 +290,7 @@ class ProcessingJob(models.Model):
     ]
 
     celery_task_id = models.CharField(max_length=255, unique=True, db_index=True)
+    user_id = models.IntegerField(null=True, blank=True, db_index=True)
 
     # Generic relation to Document or Photo
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -112,6 +302,10 @@ class ProcessingJob(models.Model):
     progress = models.IntegerField(default=0)  # 0-100
     error_message = models.TextField(blank=True)
 
+    # Pipeline stages: download, extract, chunk, embed, index
+    current_stage = models.CharField(max_length=20, blank=True)
+    stage_timings = models.JSONField(default=dict, blank=True)  # stage -> seconds
+
     # Timestamps
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -122,6 +316,17 @@ class ProcessingJob(models.Model):
         verbose_name = 'Processing Job'
         verbose_name_plural = 'Processing Jobs'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+        ]
 
     def __str__(self):
         return f"Job {self.celery_task_id} - {self.status}"
+
+    @property
+    def duration(self):
+        """Total processing time in seconds"""
+        if not self.started_at:
+            return None
+        end = self.completed_at or timezone.now()
+        return (end - self.started_at).total_seconds()
@@ -0,0 +1,97 @@
+"""
+Text normalization between extraction and embeddings
+
+PDF brochures repeat the same header, footer, page number and legal text on
+every page. Lines that show up on a large share of pages are stripped,
+whitespace is collapsed and blank runs are removed, so chunks (and
+embedding spend) go to real content.
+"""
+import math
+import re
+from collections import Counter
+from django.conf import settings
+from apps.embeddings.tokens import count_tokens
+
+_SPACES = re.compile(r'[ \t\u00a0\u2000-\u200b]+')
+_DIGITS = re.compile(r'\d+')
+_PAGE_NUMBER = re.compile(
+    r'^[-–—\s]*(page|p\.|стор\.?|сторінка|str\.?|strona|seite|s\.)?\s*\d+'
+    r'(\s*(/|of|з|із|z|von)\s*\d+)?[-–—\s]*$',
+    re.IGNORECASE
+)
+
+
+def normalize_pages(pages):
+    """
+    Strip repeated headers/footers and page numbers, collapse whitespace
+
+    pages: list of page texts (a single item for formats without pages)
+    Returns (text, stats)
+    """
+    page_lines = [
+        [_SPACES.sub(' ', line).strip() for line in page.splitlines()]
+        for page in pages
+    ]
+    page_edges = [_edge_indexes(lines) for lines in page_lines]
+
+    repeated = set()
+    if len(pages) >= settings.NORMALIZE_MIN_PAGES:
+        # Count on how many pages each header/footer line appears (page-number digits ignored)
+        counts = Counter()
+        for lines, edges in zip(page_lines, page_edges):
+            counts.update({_fingerprint(lines[index]) for index in edges})
+
+        threshold = max(2, math.ceil(len(pages) * settings.NORMALIZE_REPEAT_RATIO))
+        repeated = {fingerprint for fingerprint, count in counts.items() if count >= threshold}
+
+    lines_removed = 0
+    cleaned_pages = []
+    for lines, edges in zip(page_lines, page_edges):
+        kept = []
+        for index, line in enumerate(lines):
+            # Only the top/bottom of a page is boilerplate; repeated lines or bare
+            # numbers elsewhere may be real content (service names, prices)
+            if index in edges and (_fingerprint(line) in repeated or _PAGE_NUMBER.match(line)):
+                lines_removed += 1
+                continue
+            # Keep a single blank line between paragraphs
+            if not line and (not kept or not kept[-1]):
+                continue
+            kept.append(line)
+
+        page_text = '\n'.join(kept).strip()
+        if page_text:
+            cleaned_pages.append(page_text)
+
+    text = '\n\n'.join(cleaned_pages)
+
+    tokens_before = count_tokens('\n'.join(pages))
+    tokens_after = count_tokens(text)
+    stats = {
+        'pages': len(pages),
+        'lines_removed': lines_removed,
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_after,
+        'tokens_saved': tokens_before - tokens_after,
+    }
+
+    return text, stats
+
+
+def has_content(chunk):
+    """Chunk has at least some letters or digits worth embedding"""
+    return bool(re.search(r'\w', chunk))
+
+
+def _edge_indexes(lines):
+    """Indexes of the first/last NORMALIZE_EDGE_LINES non-empty lines of a page"""
+    filled = [index for index, line in enumerate(lines) if line]
+    size = settings.NORMALIZE_EDGE_LINES
+    # Short pages: only the very first and last line can be header/footer
+    if len(filled) <= size * 2:
+        size = 1
+    return set(filled[:size] + filled[-size:])
+
+
+def _fingerprint(line):
+    return _DIGITS.sub('#', line.lower())
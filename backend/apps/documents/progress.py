@@ -0,0 +1,130 @@
+"""
+Ingestion progress tracking
+
+Keeps the ProcessingJob of an upload up to date while the pipeline runs:
+which stage is active, how long each stage took and overall progress.
+Progress writes are throttled so per-chunk updates don't hammer the DB;
+fields held back by the throttle go out with the next write.
+"""
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from .models import ProcessingJob
+
+# Progress (0-100) reached when each stage finishes
+STAGE_PROGRESS = {
+    'download': 10,
+    'extract': 30,
+    'chunk': 40,
+    'embed': 90,
+    'index': 100,
+}
+
+
+class JobTracker:
+    """
+    Records stage timings and progress on a ProcessingJob.
+
+    Safe to use without a job (e.g. embeddings rebuild) - every call is a no-op.
+    """
+
+    def __init__(self, job=None):
+        self.job = job
+        self._last_write = 0.0
+        self._pending = set()  # fields changed but not written yet (throttled)
+
+    @classmethod
+    def start(cls, celery_task_id, instance, user_id=None):
+        """Create (or resume on retry) the job for an uploaded Document/Photo"""
+        job, _ = ProcessingJob.objects.get_or_create(
+            celery_task_id=celery_task_id,
+            defaults={
+                'content_type': ContentType.objects.get_for_model(instance),
+                'object_id': instance.id,
+                'user_id': user_id,
+            }
+        )
+        job.status = 'processing'
+        job.started_at = job.started_at or timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+        return cls(job)
+
+    @classmethod
+    def resume(cls, job_id):
+        """Continue tracking a job started by an upstream task"""
+        if not job_id:
+            return cls()
+        return cls(ProcessingJob.objects.filter(id=job_id).first())
+
+    @property
+    def job_id(self):
+        return self.job.id if self.job else None
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage; repeated entries accumulate"""
+        if not self.job:
+            yield
+            return
+
+        if self.job.current_stage != name:
+            self.job.current_stage = name
+            self._save(['current_stage'], force=True)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_timing(name, time.monotonic() - started)
+
+    def add_timing(self, name, seconds):
+        """Add time measured elsewhere (e.g. a shared batch request) to a stage"""
+        if not self.job:
+            return
+        timings = self.job.stage_timings
+        timings[name] = round(timings.get(name, 0) + seconds, 3)
+        self._save(['stage_timings'])
+
+    def finish_stage(self, name):
+        """Mark stage as done and bump progress to its checkpoint"""
+        self.set_progress(STAGE_PROGRESS[name], force=True)
+
+    def set_progress(self, progress, force=False):
+        if not self.job:
+            return
+        self.job.progress = max(self.job.progress, min(int(progress), 100))
+        self._save(['progress', 'stage_timings'], force=force)
+
+    def step_progress(self, stage_from, stage_to, done, total):
+        """Interpolate progress between two stage checkpoints (throttled)"""
+        start = STAGE_PROGRESS[stage_from]
+        end = STAGE_PROGRESS[stage_to]
+        self.set_progress(start + (end - start) * done / max(total, 1))
+
+    def complete(self):
+        if not self.job:
+            return
+        self.job.status = 'completed'
+        self.job.progress = 100
+        self.job.current_stage = ''
+        self.job.completed_at = timezone.now()
+        self._save(['status', 'progress', 'current_stage', 'completed_at', 'stage_timings'], force=True)
+
+    def fail(self, error):
+        if not self.job:
+            return
+        self.job.status = 'failed'
+        self.job.error_message = str(error)
+        self.job.completed_at = timezone.now()
+        self._save(['status', 'error_message', 'completed_at', 'stage_timings'], force=True)
+
+    def _save(self, fields, force=False):
+        self._pending.update(fields)
+        now = time.monotonic()
+        if not force and now - self._last_write < settings.PROCESSING_PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        self.job.save(update_fields=sorted(self._pending))
+        self._pending.clear()
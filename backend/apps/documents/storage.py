@@ -0,0 +1,67 @@
+"""
+Object storage access for ingestion tasks
+
+One S3 client per process (boto3 clients are thread-safe) with a tuned
+connection pool, and downloads that stream into a SpooledTemporaryFile:
+small objects stay in memory, large ones spill to disk and are fetched
+with parallel ranged GETs.
+"""
+import tempfile
+import threading
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+
+MB = 1024 * 1024
+
+_s3_client = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Process-wide S3 client"""
+    global _s3_client
+
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    's3',
+                    config=Config(
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': 3, 'mode': 'standard'},
+                        tcp_keepalive=True,
+                    )
+                )
+
+    return _s3_client
+
+
+def open_stored_file(file_path):
+    """
+    Open file from S3 or local storage as a binary file-like object
+
+    Caller is responsible for closing it (use as context manager).
+    """
+    if not settings.USE_S3:
+        return open(file_path, 'rb')
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=settings.S3_SPOOL_MAX_MEMORY_MB * MB)
+    try:
+        get_s3_client().download_fileobj(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=file_path,
+            Fileobj=spooled,
+            Config=TransferConfig(
+                multipart_threshold=settings.S3_RANGED_GET_THRESHOLD_MB * MB,
+                multipart_chunksize=settings.S3_RANGED_GET_CHUNK_MB * MB,
+                max_concurrency=settings.S3_RANGED_GET_CONCURRENCY,
+            )
+        )
+    except Exception:
+        spooled.close()
+        raise
+
+    spooled.seek(0)
+    return spooled
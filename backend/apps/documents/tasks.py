@@ -1,14 +1,26 @@
+import logging
 from celery import shared_task
 from django.utils import timezone
-from google.cloud import vision
 import PyPDF2
 import docx
 import openpyxl
+import csv
 import io
-import boto3
+import time
+import hashlib
+from datetime import timedelta
 from django.conf import settings
 from apps.accounts.middleware import TenantSchemaContext
-from .models import Document, Photo, ProcessingJob
+from .models import Document, Photo, WebSource
+from .progress import JobTracker
+from . import vision as vision_api
+from .images import prepare_image, hamming_distance
+from .storage import open_stored_file
+from .dispatcher import enqueue, enqueue_many
+from .normalization import normalize_pages
+from .crawler import crawl
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True)
@@ -17,40 +29,60 @@ def process_document(self, document_id, tenant_schema):
     Process document: extract text, parse content, create embeddings
     """
     with TenantSchemaContext(tenant_schema):
+        tracker = JobTracker()
         try:
             document = Document.objects.get(id=document_id)
             document.processing_status = 'processing'
             document.save()
+            tracker = JobTracker.start(self.request.id, document, user_id=document.user_id)
 
             # Download file from S3 or local storage
-            file_content = _download_file(document.file_path)
-
-            # Extract text based on file type
-            if document.file_type == 'pdf':
-                text = _extract_text_from_pdf(file_content)
-            elif document.file_type == 'docx':
-                text = _extract_text_from_docx(file_content)
-            elif document.file_type == 'txt':
-                text = file_content.decode('utf-8')
-            elif document.file_type in ['xlsx', 'csv']:
-                text = _extract_text_from_excel(file_content)
-            else:
-                text = ""
+            with tracker.stage('download'):
+                file_obj = open_stored_file(document.file_path)
+            tracker.finish_stage('download')
+
+            # Extract text based on file type (extractors read from the file object)
+            with file_obj, tracker.stage('extract'):
+                if document.file_type == 'pdf':
+                    pages = _extract_text_from_pdf(file_obj)
+                elif document.file_type == 'docx':
+                    pages = [_extract_text_from_docx(file_obj)]
+                elif document.file_type == 'txt':
+                    pages = [_extract_text_from_txt(file_obj)]
+                elif document.file_type == 'xlsx':
+                    pages = [_extract_text_from_excel(file_obj)]
+                elif document.file_type == 'csv':
+                    pages = [_extract_text_from_csv(file_obj)]
+                else:
+                    pages = []
+            tracker.finish_stage('extract')
+
+            # Strip repeated headers/footers and page numbers before chunking
+            with tracker.stage('normalize'):
+                text, normalization = normalize_pages(pages)
+            document.metadata['normalization'] = normalization
+            logger.info(
+                f"Document {document_id}: normalization saved {normalization['tokens_saved']} "
+                f"of {normalization['tokens_before']} tokens"
+            )
 
-            # Save extracted text
-            document.extracted_text = text
+            # Save extracted text (compressed, out of the documents table)
+            document.set_extracted_text(text)
             document.is_processed = True
             document.processing_status = 'completed'
             document.processed_at = timezone.now()
             document.save()
 
-            # Create embeddings (trigger another task)
+            # Create embeddings (trigger another task, same job continues there).
+            # Only a reference is sent - the worker loads the text itself.
             from apps.embeddings.tasks import create_embeddings
-            create_embeddings.delay(
-                content=text,
+            enqueue(
+                create_embeddings,
                 source_type='document',
                 source_id=document.id,
-                tenant_schema=tenant_schema
+                tenant_schema=tenant_schema,
+                version=document.version,
+                job_id=tracker.job_id
             )
 
             return f"Document {document_id} processed successfully"
@@ -59,6 +91,7 @@ def process_document(self, document_id, tenant_schema):
             document.processing_status = 'failed'
             document.processing_error = str(e)
             document.save()
+            tracker.fail(e)
             raise
 
 
@@ -68,89 +101,29 @@ def process_photo(self, photo_id, tenant_schema):
     Process photo: Google Vision API analysis, OCR, create embeddings
     """
     with TenantSchemaContext(tenant_schema):
+        tracker = JobTracker()
         try:
             photo = Photo.objects.get(id=photo_id)
             photo.processing_status = 'processing'
             photo.save()
+            tracker = JobTracker.start(self.request.id, photo, user_id=photo.user_id)
 
             # Download image from S3
-            image_content = _download_file(photo.file_path)
-
-            # Initialize Google Vision client
-            client = vision.ImageAnnotatorClient()
-            image = vision.Image(content=image_content)
-
-            # Perform multiple detections
-            # 1. Label detection
-            labels_response = client.label_detection(image=image)
-            labels = [
-                {
-                    'description': label.description,
-                    'score': label.score
-                }
-                for label in labels_response.label_annotations
-            ]
-
-            # 2. Text detection (OCR)
-            text_response = client.text_detection(image=image)
-            text = text_response.text_annotations[0].description if text_response.text_annotations else ""
-
-            # 3. Object detection
-            objects_response = client.object_localization(image=image)
-            objects = [
-                {
-                    'name': obj.name,
-                    'score': obj.score
-                }
-                for obj in objects_response.localized_object_annotations
-            ]
-
-            # 4. Face detection
-            faces_response = client.face_detection(image=image)
-            faces = [
-                {
-                    'joy': face.joy_likelihood.name,
-                    'sorrow': face.sorrow_likelihood.name,
-                    'anger': face.anger_likelihood.name
-                }
-                for face in faces_response.face_annotations
-            ]
-
-            # 5. Color detection
-            colors_response = client.image_properties(image=image)
-            colors = [
-                {
-                    'color': {
-                        'red': color.color.red,
-                        'green': color.color.green,
-                        'blue': color.color.blue
-                    },
-                    'score': color.score,
-                    'pixel_fraction': color.pixel_fraction
-                }
-                for color in colors_response.image_properties_annotation.dominant_colors.colors
-            ]
-
-            # Save results
-            photo.labels = labels
-            photo.text = text
-            photo.detected_objects = objects
-            photo.faces = faces
-            photo.colors = colors
-            photo.is_processed = True
-            photo.processing_status = 'completed'
-            photo.processed_at = timezone.now()
-            photo.save()
+            with tracker.stage('download'):
+                image_file = open_stored_file(photo.file_path)
+            tracker.finish_stage('download')
 
-            # Create embeddings from extracted text and labels
-            combined_text = f"{text} {' '.join([l['description'] for l in labels])}"
-            from apps.embeddings.tasks import create_embeddings
-            create_embeddings.delay(
-                content=combined_text,
-                source_type='photo',
-                source_id=photo.id,
-                tenant_schema=tenant_schema
-            )
+            with image_file, tracker.stage('preprocess'):
+                image_content, photo.phash = prepare_image(image_file)
+                result = _find_cached_vision_result(photo)
+
+            # Vision analysis (one request, all features) is the "extract" stage for photos
+            if result is None:
+                with tracker.stage('extract'):
+                    result = vision_api.annotate_image(image_content)
+            tracker.finish_stage('extract')
+
+            _save_photo_results(photo, result, tenant_schema, tracker)
 
             return f"Photo {photo_id} processed successfully"
 
@@ -158,8 +131,250 @@ def process_photo(self, photo_id, tenant_schema):
             photo.processing_status = 'failed'
             photo.processing_error = str(e)
             photo.save()
+            tracker.fail(e)
+            raise
+
+
+@shared_task(bind=True)
+def process_photos_batch(self, photo_ids, tenant_schema):
+    """
+    Process several photos with batched Vision requests (up to 16 images per call)
+    """
+    with TenantSchemaContext(tenant_schema):
+        photos = list(Photo.objects.filter(id__in=photo_ids, is_processed=False))
+        Photo.objects.filter(id__in=[p.id for p in photos]).update(processing_status='processing')
+
+        trackers = {
+            photo.id: JobTracker.start(f"{self.request.id}:{photo.id}", photo, user_id=photo.user_id)
+            for photo in photos
+        }
+
+        # Download and pre-process all images first; near-duplicates reuse cached results
+        downloaded = []
+        for photo in photos:
+            tracker = trackers[photo.id]
+            try:
+                with tracker.stage('download'):
+                    image_file = open_stored_file(photo.file_path)
+                tracker.finish_stage('download')
+
+                with image_file, tracker.stage('preprocess'):
+                    image_content, photo.phash = prepare_image(image_file)
+                    cached = _find_cached_vision_result(photo)
+            except Exception as e:
+                _fail_photo(photo, e, tracker)
+                continue
+
+            if cached is not None:
+                tracker.finish_stage('extract')
+                _save_photo_results(photo, cached, tenant_schema, tracker)
+            else:
+                downloaded.append((photo, image_content))
+
+        # Analyze in batches; batch time is attributed to every photo in it
+        for start in range(0, len(downloaded), vision_api.MAX_BATCH_SIZE):
+            batch = downloaded[start:start + vision_api.MAX_BATCH_SIZE]
+            batch_started = time.monotonic()
+            try:
+                results = vision_api.annotate_images([content for _, content in batch])
+            except Exception as e:
+                for photo, _ in batch:
+                    _fail_photo(photo, e, trackers[photo.id])
+                continue
+            elapsed = time.monotonic() - batch_started
+
+            for (photo, _), result in zip(batch, results):
+                tracker = trackers[photo.id]
+                if isinstance(result, Exception):
+                    _fail_photo(photo, result, tracker)
+                    continue
+
+                tracker.add_timing('extract', elapsed)
+                tracker.finish_stage('extract')
+                _save_photo_results(photo, result, tenant_schema, tracker)
+
+        return f"Processed {len(photos)} photos, {len(downloaded)} sent to Vision"
+
+
+@shared_task
+def process_pending_photos(tenant_schema, limit=100, min_age_minutes=0):
+    """
+    Pick up photos still waiting for analysis and send them through batched Vision requests
+
+    min_age_minutes: leave newer photos alone - they are most likely still in the ingestion backlog
+    """
+    with TenantSchemaContext(tenant_schema):
+        photo_ids = list(
+            Photo.objects.filter(
+                processing_status='pending',
+                created_at__lt=timezone.now() - timedelta(minutes=min_age_minutes)
+            )
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    if photo_ids:
+        enqueue(process_photos_batch, photo_ids=photo_ids, tenant_schema=tenant_schema)
+
+    return f"Queued {len(photo_ids)} pending photos"
+
+
+@shared_task
+def sweep_pending_photos():
+    """
+    Periodic safety net: queue photos left pending (lost task, failed enqueue), for every tenant
+    """
+    from apps.accounts.models import Organization
+
+    swept = 0
+    for schema_name in Organization.objects.filter(is_active=True).values_list('schema_name', flat=True):
+        try:
+            process_pending_photos(schema_name, min_age_minutes=settings.PENDING_PHOTOS_MIN_AGE_MINUTES)
+            swept += 1
+        except Exception as e:
+            logger.error(f"Error sweeping pending photos for {schema_name}: {e}")
+
+    return f"Swept pending photos of {swept} tenants"
+
+
+@shared_task
+def crawl_web_source(web_source_id, tenant_schema):
+    """
+    Crawl a website/sitemap into Documents; only changed pages get re-embedded
+    """
+    from apps.embeddings.tasks import create_embeddings
+    from apps.subscriptions.models import Subscription
+
+    with TenantSchemaContext(tenant_schema):
+        source = WebSource.objects.get(id=web_source_id)
+        source.status = 'crawling'
+        source.save(update_fields=['status'])
+
+        try:
+            pages = {doc.file_path: doc for doc in source.documents.all()}
+            validators = {url: doc.metadata.get('http', {}) for url, doc in pages.items()}
+
+            results = crawl(source.url, is_sitemap=source.is_sitemap, validators=validators)
+
+            # New pages count against the plan's document limit
+            subscription = Subscription.objects.filter(organization__schema_name=tenant_schema).first()
+            remaining = subscription.remaining('documents') if subscription else None
+
+            stats = {'fetched': 0, 'not_modified': 0, 'unchanged': 0, 'changed': 0, 'new': 0, 'errors': 0, 'skipped': 0}
+            to_embed = []
+
+            for page in results:
+                if page.status == 'error':
+                    stats['errors'] += 1
+                    logger.warning(f"Web source {web_source_id}: {page.url} failed: {page.error}")
+                    continue
+
+                if page.status == 'not_modified':
+                    stats['not_modified'] += 1
+                    continue
+
+                stats['fetched'] += 1
+                content_hash = hashlib.sha256(page.text.encode('utf-8')).hexdigest()
+                http = {'etag': page.etag, 'last_modified': page.last_modified}
+                document = pages.get(page.url)
+
+                if document is None:
+                    if remaining is not None and remaining <= 0:
+                        stats['skipped'] += 1
+                        continue
+
+                    document = Document.objects.create(
+                        user_id=source.user_id,
+                        title=(page.title or page.url)[:255],
+                        file_type='url',
+                        file_path=page.url,
+                        file_size=page.size,
+                        web_source=source,
+                    )
+                    if remaining is not None:
+                        remaining -= 1
+                    stats['new'] += 1
+
+                elif document.metadata.get('content_hash') == content_hash:
+                    # Server doesn't support conditional GET but page text is the same
+                    document.metadata['http'] = http
+                    document.save(update_fields=['metadata'])
+                    stats['unchanged'] += 1
+                    continue
+
+                else:
+                    document.version += 1
+                    stats['changed'] += 1
+
+                document.title = (page.title or page.url)[:255]
+                document.file_size = page.size
+                document.metadata['content_hash'] = content_hash
+                document.metadata['http'] = http
+                document.set_extracted_text(page.text)
+                document.is_processed = True
+                document.processing_status = 'completed'
+                document.processing_error = ''
+                document.processed_at = timezone.now()
+                document.save()
+
+                to_embed.append((
+                    create_embeddings,
+                    {
+                        'source_type': 'document',
+                        'source_id': document.id,
+                        'tenant_schema': tenant_schema,
+                        'version': document.version,
+                    }
+                ))
+
+            if subscription and stats['new']:
+                subscription.increment_usage('documents', stats['new'])
+
+            source.status = 'completed'
+            source.error_message = ''
+            source.last_crawled_at = timezone.now()
+            source.last_stats = stats
+            source.save()
+
+        except Exception as e:
+            source.status = 'failed'
+            source.error_message = str(e)
+            source.last_crawled_at = timezone.now()
+            source.save()
             raise
 
+    # create_embeddings diffs chunks, so changed pages only re-embed what changed
+    if to_embed:
+        enqueue_many(to_embed)
+
+    return f"Web source {web_source_id}: {stats}"
+
+
+@shared_task
+def recrawl_web_sources():
+    """
+    Queue re-crawls of web sources whose interval has passed, for every tenant
+    """
+    from apps.accounts.models import Organization
+
+    queued = 0
+    for schema_name in Organization.objects.filter(is_active=True).values_list('schema_name', flat=True):
+        try:
+            with TenantSchemaContext(schema_name):
+                due = [source.id for source in WebSource.objects.exclude(recrawl_interval_hours=0) if source.is_due]
+        except Exception as e:
+            logger.error(f"Error listing web sources for {schema_name}: {e}")
+            continue
+
+        if due:
+            enqueue_many([
+                (crawl_web_source, {'web_source_id': source_id, 'tenant_schema': schema_name})
+                for source_id in due
+            ])
+            queued += len(due)
+
+    return f"Queued {queued} web source re-crawls"
+
 
 @shared_task
 def cleanup_old_files():
@@ -172,41 +387,105 @@ def cleanup_old_files():
 
 # Helper functions
 
-def _download_file(file_path):
-    """Download file from S3 or local storage"""
-    if settings.USE_S3:
-        s3 = boto3.client('s3')
-        response = s3.get_object(
-            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-            Key=file_path
-        )
-        return response['Body'].read()
-    else:
-        with open(file_path, 'rb') as f:
-            return f.read()
-
-
-def _extract_text_from_pdf(file_content):
-    """Extract text from PDF"""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+def _save_photo_results(photo, result, tenant_schema, tracker):
+    """Store Vision results on photo and trigger embeddings"""
+    photo.labels = result['labels']
+    photo.text = result['text']
+    photo.detected_objects = result['detected_objects']
+    photo.faces = result['faces']
+    photo.colors = result['colors']
+    photo.is_processed = True
+    photo.processing_status = 'completed'
+    photo.processed_at = timezone.now()
+    photo.save()
+
+    # Create embeddings from extracted text and labels (loaded by the worker)
+    from apps.embeddings.tasks import create_embeddings
+    enqueue(
+        create_embeddings,
+        source_type='photo',
+        source_id=photo.id,
+        tenant_schema=tenant_schema,
+        job_id=tracker.job_id
+    )
+
+
+def _find_cached_vision_result(photo):
+    """
+    Reuse Vision results of an already analyzed near-identical photo in this tenant
+
+    Exact hash matches come from the index; otherwise recent photos are scanned
+    for a Hamming distance within VISION_PHASH_MAX_DISTANCE.
+    """
+    if photo.phash is None:
+        return None
+
+    analyzed = Photo.objects.filter(
+        is_processed=True,
+        phash__isnull=False
+    ).exclude(id=photo.id)
+
+    match_id = analyzed.filter(phash=photo.phash).values_list('id', flat=True).first()
+
+    if match_id is None and settings.VISION_PHASH_MAX_DISTANCE > 0:
+        candidates = analyzed.order_by('-created_at').values_list('id', 'phash')[:settings.VISION_PHASH_SCAN_LIMIT]
+        best_distance = settings.VISION_PHASH_MAX_DISTANCE + 1
+        for candidate_id, candidate_hash in candidates:
+            distance = hamming_distance(photo.phash, candidate_hash)
+            if distance < best_distance:
+                match_id, best_distance = candidate_id, distance
+
+    if match_id is None:
+        return None
 
+    match = Photo.objects.get(id=match_id)
+    photo.metadata['vision_cache_source'] = match.id
+    return {
+        'labels': match.labels,
+        'text': match.text,
+        'detected_objects': match.detected_objects,
+        'faces': match.faces,
+        'colors': match.colors,
+    }
 
-def _extract_text_from_docx(file_content):
+
+def _fail_photo(photo, error, tracker):
+    photo.processing_status = 'failed'
+    photo.processing_error = str(error)
+    photo.save()
+    tracker.fail(error)
+
+
+def _extract_text_from_pdf(file_obj):
+    """Extract text from PDF, one item per page"""
+    pdf_reader = PyPDF2.PdfReader(file_obj)
+    return [page.extract_text() or "" for page in pdf_reader.pages]
+
+
+def _extract_text_from_docx(file_obj):
     """Extract text from DOCX"""
-    doc = docx.Document(io.BytesIO(file_content))
+    doc = docx.Document(file_obj)
     text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
     return text
 
 
-def _extract_text_from_excel(file_content):
+def _extract_text_from_txt(file_obj):
+    """Extract text from plain text file"""
+    return io.TextIOWrapper(file_obj, encoding='utf-8', errors='replace').read()
+
+
+def _extract_text_from_excel(file_obj):
     """Extract text from Excel"""
-    workbook = openpyxl.load_workbook(io.BytesIO(file_content))
-    text = ""
+    workbook = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    lines = []
     for sheet in workbook.worksheets:
         for row in sheet.iter_rows(values_only=True):
-            text += " ".join([str(cell) for cell in row if cell]) + "\n"
-    return text
+            lines.append(" ".join([str(cell) for cell in row if cell]))
+    workbook.close()
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _extract_text_from_csv(file_obj):
+    """Extract text from CSV (streamed row by row)"""
+    reader = csv.reader(io.TextIOWrapper(file_obj, encoding='utf-8', errors='replace', newline=''))
+    return "".join(" ".join(cell for cell in row if cell) + "\n" for row in reader)
@@ -0,0 +1,75 @@
+import pytest
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from apps.documents import crawler, dispatcher, vision
+from .fake_site import FakeSite
+from .fake_vision import FakeVisionServer
+
+FAKE_SITE_HOST = 'site.test'
+
+
+@pytest.fixture
+def fake_vision(settings):
+    """Fake Vision server with the shared Vision client pointed at it"""
+    server = FakeVisionServer().start()
+    settings.GOOGLE_VISION_API_ENDPOINT = server.endpoint
+    vision._client = None
+    yield server
+
+    vision._client = None
+    server.stop()
+
+
+@pytest.fixture
+def ingest_redis():
+    """Redis with the ingestion dispatcher keys cleared before and after"""
+    redis = get_redis_connection('default')
+
+    def clear():
+        keys = redis.keys('ingest:*')
+        if keys:
+            redis.delete(*keys)
+        cache.delete_pattern('ingest:weight:*')
+
+    clear()
+    yield redis
+    clear()
+
+
+@pytest.fixture
+def sent_tasks(monkeypatch):
+    """Tasks released by the dispatcher, as [(tenant_schema, task name, task_id)]; nothing reaches Celery"""
+    sent = []
+
+    class FakeApp:
+        def send_task(self, name, kwargs=None, task_id=None, queue=None):
+            sent.append((kwargs['tenant_schema'], name, task_id))
+
+    monkeypatch.setattr(dispatcher, 'current_app', FakeApp())
+    return sent
+
+
+@pytest.fixture
+def fake_site(settings, monkeypatch):
+    """
+    Local site reachable as http://site.test:<port>/ from the crawler
+
+    Only site.test is resolved to the loopback server; every other host goes
+    through the real public-address check.
+    """
+    site = FakeSite().start()
+    settings.WEB_CRAWL_HOST_DELAY = 0
+    settings.WEB_CRAWL_TIMEOUT = 5.0
+
+    resolve_public = crawler.resolve_public
+
+    async def resolve(url):
+        if crawler.urlparse(url).hostname == FAKE_SITE_HOST:
+            return '127.0.0.1'
+        return await resolve_public(url)
+
+    monkeypatch.setattr(crawler, 'resolve_public', resolve)
+    site.url = f'http://{FAKE_SITE_HOST}:{site.port}'
+    yield site
+
+    site.stop()
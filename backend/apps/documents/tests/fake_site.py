@@ -0,0 +1,63 @@
+"""
+Local HTTP fixture server for crawler tests
+
+Serves pages registered with add(); answers 304 when If-None-Match matches
+the page's ETag. Records (path, headers) of every request; headers are case-insensitive.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeSite:
+
+    def __init__(self):
+        self.requests = []
+        self._pages = {}
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add(self, path, body='', status=200, headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        self._pages[path] = (status, {'Content-Type': 'text/html; charset=utf-8', **(headers or {})}, body)
+
+    def requested(self, path):
+        return [headers for request_path, headers in self.requests if request_path == path]
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                site.requests.append((self.path, self.headers))
+                status, headers, body = site._pages.get(self.path, (404, {}, b'Not found'))
+
+                etag = headers.get('ETag')
+                if etag and self.headers.get('If-None-Match') == etag:
+                    status, body = 304, b''
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
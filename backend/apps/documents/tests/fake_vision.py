@@ -0,0 +1,80 @@
+"""
+Local fake Google Vision server for tests
+
+Answers images:annotate over REST (the transport vision.get_client() uses
+with GOOGLE_VISION_API_ENDPOINT) with the same canned annotations for every
+image; an image whose bytes are BAD_IMAGE gets a per-image error instead.
+"""
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BAD_IMAGE = b'bad image'
+
+ANNOTATIONS = {
+    'labelAnnotations': [{'description': 'Nail polish', 'score': 0.93}],
+    'textAnnotations': [{'description': 'Manicure 20 EUR'}],
+    'localizedObjectAnnotations': [{'name': 'Bottle', 'score': 0.81}],
+    'faceAnnotations': [{
+        'joyLikelihood': 'VERY_LIKELY',
+        'sorrowLikelihood': 'VERY_UNLIKELY',
+        'angerLikelihood': 'UNLIKELY',
+    }],
+    'imagePropertiesAnnotation': {
+        'dominantColors': {
+            'colors': [{'color': {'red': 200, 'green': 30, 'blue': 60}, 'score': 0.6, 'pixelFraction': 0.4}]
+        }
+    },
+}
+
+
+class FakeVisionServer:
+
+    def __init__(self):
+        self.requests = []  # [AnnotateImageRequest dicts] per HTTP request
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                image_requests = json.loads(self.rfile.read(length) or b'{}').get('requests', [])
+                server.requests.append(image_requests)
+
+                responses = []
+                for image_request in image_requests:
+                    if base64.b64decode(image_request['image']['content']) == BAD_IMAGE:
+                        responses.append({'error': {'code': 3, 'message': 'Bad image data'}})
+                    else:
+                        responses.append(ANNOTATIONS)
+
+                data = json.dumps({'responses': responses}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from defusedxml import EntitiesForbidden
+from apps.documents import crawler
+from apps.documents.views import WebSourceSerializer
+
+PAGE = """
+<html>
+  <head><title>Prices</title><style>body {}</style></head>
+  <body>
+    <nav>Home | Contact</nav>
+    <h1>Manicure</h1>
+    <p>Classic   manicure - 20 EUR</p>
+    <script>track()</script>
+  </body>
+</html>
+"""
+
+
+def _sitemap(urls, index=False):
+    tag, item = ('sitemapindex', 'sitemap') if index else ('urlset', 'url')
+    entries = ''.join(f'<{item}><loc>{url}</loc></{item}>' for url in urls)
+    return f'<?xml version="1.0"?><{tag} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{tag}>'
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/',
+    'http://localhost:8000/',
+    'http://10.0.0.5/',
+    'http://192.168.1.1/',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://[::1]/',
+    'http://0.0.0.0/',
+    'http://224.0.0.1/',
+    'file:///etc/passwd',
+    'ftp://example.com/',
+    'http:///no-host',
+])
+def test_resolve_public_rejects_unsafe_urls(url):
+    with pytest.raises(crawler.UnsafeURL):
+        asyncio.run(crawler.resolve_public(url))
+
+
+def test_resolve_public_returns_checked_address():
+    assert asyncio.run(crawler.resolve_public('https://8.8.8.8/dns')) == '8.8.8.8'
+
+
+@pytest.mark.django_db
+def test_web_source_serializer_rejects_private_url():
+    serializer = WebSourceSerializer(data={'url': 'http://10.0.0.5/admin'})
+
+    assert not serializer.is_valid()
+    assert 'url' in serializer.errors
+
+
+def test_html_to_text_skips_boilerplate():
+    title, text = crawler.html_to_text(PAGE)
+
+    assert title == 'Prices'
+    assert text == 'Manicure\nClassic manicure - 20 EUR'
+
+
+def test_crawl_page(fake_site):
+    fake_site.add('/prices', PAGE, headers={'ETag': '"v1"', 'Last-Modified': 'Mon, 05 Oct 2026 10:00:00 GMT'})
+
+    [page] = crawler.crawl(f'{fake_site.url}/prices')
+
+    assert page.status == 'fetched'
+    assert page.title == 'Prices'
+    assert 'Classic manicure - 20 EUR' in page.text
+    assert page.etag == '"v1"'
+    # Connection goes to the checked address, the site still sees its own host name
+    assert fake_site.requested('/prices')[0]['Host'] == f'site.test:{fake_site.port}'
+
+
+def test_conditional_get_returns_not_modified(fake_site):
+    url = f'{fake_site.url}/prices'
+    fake_site.add('/prices', PAGE, headers={'ETag': '"v1"'})
+
+    [page] = crawler.crawl(url, validators={url: {'etag': '"v1"'}})
+
+    assert page.status == 'not_modified'
+    assert fake_site.requested('/prices')[0]['If-None-Match'] == '"v1"'
+
+
+def test_sitemap_index_is_followed(fake_site):
+    xml = {'Content-Type': 'application/xml'}
+    fake_site.add('/sitemap.xml', _sitemap([f'{fake_site.url}/pages.xml'], index=True), headers=xml)
+    fake_site.add('/pages.xml', _sitemap([f'{fake_site.url}/a', f'{fake_site.url}/b']), headers=xml)
+    fake_site.add('/a', '<p>Page A</p>')
+    fake_site.add('/b', '<p>Page B</p>')
+
+    pages = crawler.crawl(f'{fake_site.url}/sitemap.xml', is_sitemap=True)
+
+    assert sorted(page.text for page in pages) == ['Page A', 'Page B']
+
+
+def test_sitemap_entities_are_rejected(fake_site):
+    billion_laughs = (
+        '<?xml version="1.0"?><!DOCTYPE lolz [<!ENTITY lol "lol"><!ENTITY lol2 "&lol;&lol;&lol;&lol;">]>'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><url><loc>&lol2;</loc></url></urlset>'
+    )
+    fake_site.add('/sitemap.xml', billion_laughs, headers={'Content-Type': 'application/xml'})
+
+    with pytest.raises(EntitiesForbidden):
+        crawler.crawl(f'{fake_site.url}/sitemap.xml', is_sitemap=True)
+
+
+def test_redirect_within_site_is_followed(fake_site):
+    fake_site.add('/old', status=301, headers={'Location': '/new'})
+    fake_site.add('/new', '<p>Moved here</p>')
+
+    [page] = crawler.crawl(f'{fake_site.url}/old')
+
+    assert page.status == 'fetched'
+    assert page.text == 'Moved here'
+
+
+def test_redirect_to_private_address_is_blocked(fake_site):
+    fake_site.add('/go', status=302, headers={'Location': f'http://127.0.0.1:{fake_site.port}/internal'})
+    fake_site.add('/internal', '<p>Secret</p>')
+
+    [page] = crawler.crawl(f'{fake_site.url}/go')
+
+    assert page.status == 'error'
+    assert 'non-public address' in page.error
+    assert fake_site.requested('/internal') == []
+
+
+def test_redirect_loop_stops(fake_site, settings):
+    settings.WEB_CRAWL_MAX_REDIRECTS = 3
+    fake_site.add('/loop', status=302, headers={'Location': '/loop'})
+
+    [page] = crawler.crawl(f'{fake_site.url}/loop')
+
+    assert page.status == 'error'
+    assert len(fake_site.requested('/loop')) == 4
+
+
+def test_response_size_is_capped(fake_site, settings):
+    settings.WEB_CRAWL_MAX_BYTES = 1024
+    fake_site.add('/huge', '<p>' + 'x' * 4096 + '</p>')
+
+    [page] = crawler.crawl(f'{fake_site.url}/huge')
+
+    assert page.status == 'error'
+    assert 'larger than 1024 bytes' in page.error
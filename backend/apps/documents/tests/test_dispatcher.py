@@ -0,0 +1,149 @@
+import json
+from collections import Counter
+import pytest
+from django.core.cache import cache
+from apps.documents import dispatcher
+from apps.documents.tasks import process_document
+
+
+@pytest.fixture(autouse=True)
+def dispatch_settings(settings, ingest_redis, sent_tasks):
+    settings.INGESTION_TENANT_CONCURRENCY = 10
+    settings.INGESTION_MAX_IN_FLIGHT = 4
+    for tenant in ('tenant_a', 'tenant_b'):
+        cache.set(f'ingest:weight:{tenant}', 1)
+
+
+def _enqueue_backlog(redis, jobs):
+    """Fill backlogs without releasing anything: dispatch() skips while another dispatcher holds the lock"""
+    redis.set(dispatcher.LOCK_KEY, 'other-dispatcher')
+    for tenant, count in jobs.items():
+        dispatcher.enqueue_many([
+            (process_document, {'document_id': i, 'tenant_schema': tenant})
+            for i in range(count)
+        ])
+    redis.delete(dispatcher.LOCK_KEY)
+
+
+def test_dispatch_skips_while_lock_is_held(ingest_redis, sent_tasks):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 3})
+
+    assert sent_tasks == []
+    assert dispatcher.queue_depths() == {'tenant_a': {'backlog': 3, 'in_flight': 0}}
+
+
+def test_big_backlog_does_not_starve_other_tenant(ingest_redis, sent_tasks):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 100, 'tenant_b': 2})
+
+    assert dispatcher.dispatch() == 4
+    assert Counter(tenant for tenant, _, _ in sent_tasks) == {'tenant_a': 2, 'tenant_b': 2}
+
+
+def test_plan_weight_gives_more_slots(ingest_redis, sent_tasks, settings):
+    settings.INGESTION_MAX_IN_FLIGHT = 6
+    cache.set('ingest:weight:tenant_a', 2)
+    _enqueue_backlog(ingest_redis, {'tenant_a': 100, 'tenant_b': 100})
+
+    dispatcher.dispatch()
+
+    assert Counter(tenant for tenant, _, _ in sent_tasks) == {'tenant_a': 4, 'tenant_b': 2}
+
+
+def test_tenant_concurrency_cap(ingest_redis, sent_tasks, settings):
+    settings.INGESTION_TENANT_CONCURRENCY = 2
+    _enqueue_backlog(ingest_redis, {'tenant_a': 10})
+
+    dispatcher.dispatch()
+
+    assert len(sent_tasks) == 2
+    assert dispatcher.queue_depths()['tenant_a'] == {'backlog': 8, 'in_flight': 2}
+
+
+def test_finished_task_releases_next(ingest_redis, sent_tasks, settings):
+    settings.INGESTION_TENANT_CONCURRENCY = 1
+    _enqueue_backlog(ingest_redis, {'tenant_a': 2})
+    dispatcher.dispatch()
+    tenant, _, task_id = sent_tasks[0]
+
+    dispatcher._release_slot(task_id=task_id, kwargs={'tenant_schema': tenant})
+
+    assert len(sent_tasks) == 2
+    assert dispatcher.queue_depths()['tenant_a'] == {'backlog': 0, 'in_flight': 1}
+
+
+def test_only_tenants_with_backlog_stay_registered(ingest_redis, sent_tasks):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 10, 'tenant_b': 1})
+
+    # Second round finds tenant_b's backlog empty; tenant_a still has 6 jobs when slots run out
+    dispatcher.dispatch()
+
+    tenants = {tenant.decode() for tenant in ingest_redis.smembers(dispatcher.TENANTS_KEY)}
+    assert tenants == {'tenant_a'}
+
+
+def test_job_enqueued_after_drain_is_dispatched(ingest_redis, sent_tasks):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 1})
+    dispatcher.dispatch()
+    assert not ingest_redis.sismember(dispatcher.TENANTS_KEY, 'tenant_a')
+
+    dispatcher.enqueue(process_document, document_id=99, tenant_schema='tenant_a')
+
+    assert len(sent_tasks) == 2
+
+
+def test_pop_or_remove_is_atomic(ingest_redis):
+    pop_or_remove = ingest_redis.register_script(dispatcher.POP_OR_REMOVE_LUA)
+    backlog = dispatcher.BACKLOG_KEY.format(tenant='tenant_a')
+    ingest_redis.rpush(backlog, 'job')
+    ingest_redis.sadd(dispatcher.TENANTS_KEY, 'tenant_a')
+
+    assert pop_or_remove(keys=[backlog, dispatcher.TENANTS_KEY], args=['tenant_a']) == b'job'
+    assert ingest_redis.sismember(dispatcher.TENANTS_KEY, 'tenant_a')
+
+    assert pop_or_remove(keys=[backlog, dispatcher.TENANTS_KEY], args=['tenant_a']) is None
+    assert not ingest_redis.sismember(dispatcher.TENANTS_KEY, 'tenant_a')
+
+
+def test_failed_send_returns_job_to_backlog(ingest_redis, sent_tasks, monkeypatch):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 3, 'tenant_b': 1})
+
+    def broker_down(*args, **kwargs):
+        raise ConnectionError('broker unavailable')
+
+    with monkeypatch.context() as patched:
+        patched.setattr(dispatcher.current_app, 'send_task', broker_down)
+        assert dispatcher.dispatch() == 0
+
+    assert dispatcher.queue_depths() == {
+        'tenant_a': {'backlog': 3, 'in_flight': 0},
+        'tenant_b': {'backlog': 1, 'in_flight': 0},
+    }
+    # Back at the head, in original order
+    first = json.loads(ingest_redis.lindex(dispatcher.BACKLOG_KEY.format(tenant='tenant_a'), 0))
+    assert first['kwargs']['document_id'] == 0
+
+    assert dispatcher.dispatch() == 4
+    assert len(sent_tasks) == 4
+
+
+def test_expired_lock_taken_by_another_dispatcher_is_not_released(ingest_redis, sent_tasks, monkeypatch):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 1})
+    send = dispatcher._send
+
+    def slow_send(redis, tenant, payload):
+        # Our lock expired mid-dispatch and another dispatcher took it
+        redis.set(dispatcher.LOCK_KEY, 'other-dispatcher')
+        return send(redis, tenant, payload)
+
+    monkeypatch.setattr(dispatcher, '_send', slow_send)
+    dispatcher.dispatch()
+
+    assert ingest_redis.get(dispatcher.LOCK_KEY) == b'other-dispatcher'
+
+
+def test_lock_is_released_after_dispatch(ingest_redis, sent_tasks):
+    _enqueue_backlog(ingest_redis, {'tenant_a': 1})
+
+    dispatcher.dispatch()
+
+    assert ingest_redis.get(dispatcher.LOCK_KEY) is None
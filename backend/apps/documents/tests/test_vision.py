@@ -0,0 +1,40 @@
+import pytest
+from apps.documents import vision
+from .fake_vision import BAD_IMAGE
+
+
+def test_annotate_image_sends_one_request_with_all_features(fake_vision):
+    result = vision.annotate_image(b'photo')
+
+    assert len(fake_vision.requests) == 1
+    assert len(fake_vision.requests[0]) == 1
+    assert len(fake_vision.requests[0][0]['features']) == len(vision.FEATURES)
+
+    assert result['labels'] == [{'description': 'Nail polish', 'score': pytest.approx(0.93)}]
+    assert result['text'] == 'Manicure 20 EUR'
+    assert result['detected_objects'] == [{'name': 'Bottle', 'score': pytest.approx(0.81)}]
+    assert result['faces'] == [{'joy': 'VERY_LIKELY', 'sorrow': 'VERY_UNLIKELY', 'anger': 'UNLIKELY'}]
+    assert result['colors'][0]['color'] == {'red': 200, 'green': 30, 'blue': 60}
+    assert result['colors'][0]['pixel_fraction'] == pytest.approx(0.4)
+
+
+def test_annotate_images_batches_by_api_limit(fake_vision):
+    results = vision.annotate_images([b'photo %d' % i for i in range(vision.MAX_BATCH_SIZE + 4)])
+
+    assert [len(batch) for batch in fake_vision.requests] == [vision.MAX_BATCH_SIZE, 4]
+    assert len(results) == vision.MAX_BATCH_SIZE + 4
+    assert all(result['text'] == 'Manicure 20 EUR' for result in results)
+
+
+def test_annotate_images_keeps_per_image_errors_aligned(fake_vision):
+    results = vision.annotate_images([b'first', BAD_IMAGE, b'third'])
+
+    assert results[0]['labels'][0]['description'] == 'Nail polish'
+    assert isinstance(results[1], vision.VisionError)
+    assert str(results[1]) == 'Bad image data'
+    assert results[2]['labels'][0]['description'] == 'Nail polish'
+
+
+def test_annotate_image_raises_on_error(fake_vision):
+    with pytest.raises(vision.VisionError):
+        vision.annotate_image(BAD_IMAGE)
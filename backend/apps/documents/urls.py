@@ -1,5 +1,11 @@
 from django.urls import path
-from .views import DocumentUploadView, DocumentListView, DocumentDetailView
+from .views import (
+    DocumentUploadView, DocumentListView, DocumentDetailView, DocumentVersionView,
+    BulkUploadView, batch_detail_view,
+    WebSourceListCreateView, WebSourceDetailView, web_source_crawl_view,
+    ProcessingJobListView, ProcessingJobDetailView, job_stats_view,
+    queue_depth_view
+)
 
 app_name = 'documents'
 
@@ -7,4 +13,20 @@ urlpatterns = [
     path('upload/', DocumentUploadView.as_view(), name='upload'),
     path('', DocumentListView.as_view(), name='list'),
     path('<int:pk>/', DocumentDetailView.as_view(), name='detail'),
+    path('<int:pk>/versions/', DocumentVersionView.as_view(), name='versions'),
+
+    # Bulk upload (zip archive or multiple files, documents and photos)
+    path('bulk/', BulkUploadView.as_view(), name='bulk_upload'),
+    path('batches/<int:pk>/', batch_detail_view, name='batch_detail'),
+
+    # Websites and sitemaps (crawled into documents, re-crawled periodically)
+    path('web/', WebSourceListCreateView.as_view(), name='web_sources'),
+    path('web/<int:pk>/', WebSourceDetailView.as_view(), name='web_source_detail'),
+    path('web/<int:pk>/crawl/', web_source_crawl_view, name='web_source_crawl'),
+
+    # Ingestion progress (documents and photos)
+    path('jobs/', ProcessingJobListView.as_view(), name='job_list'),
+    path('jobs/stats/', job_stats_view, name='job_stats'),
+    path('jobs/<int:pk>/', ProcessingJobDetailView.as_view(), name='job_detail'),
+    path('queues/', queue_depth_view, name='queue_depth'),
 ]
@@ -1,21 +1,75 @@
+import asyncio
+import os
+import tempfile
+import zipfile
 from rest_framework import generics, permissions, status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.files import File
 from django.core.files.storage import default_storage
-from .models import Document, Photo
+from django.contrib.contenttypes.models import ContentType
+from .models import Document, DocumentVersion, Photo, ProcessingJob, UploadBatch, WebSource
 from rest_framework import serializers
-from .tasks import process_document, process_photo
+from .tasks import process_document, process_photo, process_photos_batch, crawl_web_source
+from .vision import MAX_BATCH_SIZE
+from .crawler import resolve_public, UnsafeURL
+from .dispatcher import enqueue, enqueue_many, queue_depths
+
+# Uploadable document types ('url' pages come from WebSource crawls)
+DOCUMENT_TYPES = [file_type for file_type, _ in Document.TYPE_CHOICES if file_type != 'url']
+IMAGE_TYPES = ['jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tiff']
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+
+class EntryTooLarge(ValueError):
+    pass
 
 
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
         fields = [
-            'id', 'title', 'file_type', 'file_path', 'file_size',
-            'is_processed', 'processing_status', 'extracted_text',
+            'id', 'title', 'file_type', 'file_path', 'file_size', 'version',
+            'is_processed', 'processing_status', 'metadata',
             'created_at'
         ]
-        read_only_fields = ['file_path', 'file_size', 'is_processed', 'processing_status']
+        read_only_fields = ['file_path', 'file_size', 'version', 'is_processed', 'processing_status', 'metadata']
+
+
+class DocumentDetailSerializer(DocumentSerializer):
+    """Single document incl. full text (loaded lazily, not part of list responses)"""
+    extracted_text = serializers.CharField(read_only=True)
+
+    class Meta(DocumentSerializer.Meta):
+        fields = DocumentSerializer.Meta.fields + ['extracted_text']
+
+
+class DocumentVersionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentVersion
+        fields = ['id', 'version', 'file_type', 'file_path', 'file_size', 'created_at']
+
+
+class WebSourceSerializer(serializers.ModelSerializer):
+    pages = serializers.IntegerField(source='documents.count', read_only=True)
+
+    class Meta:
+        model = WebSource
+        fields = [
+            'id', 'url', 'is_sitemap', 'recrawl_interval_hours', 'status', 'error_message',
+            'last_crawled_at', 'last_stats', 'pages', 'created_at'
+        ]
+        read_only_fields = ['status', 'error_message', 'last_crawled_at', 'last_stats']
+
+    def validate_url(self, value):
+        # Addresses are checked again on every request of a crawl (DNS can change)
+        try:
+            asyncio.run(resolve_public(value))
+        except UnsafeURL as e:
+            raise serializers.ValidationError(str(e))
+        return value
 
 
 class PhotoSerializer(serializers.ModelSerializer):
@@ -28,6 +82,19 @@ class PhotoSerializer(serializers.ModelSerializer):
         read_only_fields = ['file_path', 'file_size', 'is_processed', 'labels', 'text', 'objects']
 
 
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    source_type = serializers.CharField(source='content_type.model', read_only=True)
+    duration = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ProcessingJob
+        fields = [
+            'id', 'source_type', 'object_id', 'status', 'progress',
+            'current_stage', 'stage_timings', 'duration', 'error_message',
+            'started_at', 'completed_at', 'created_at'
+        ]
+
+
 class DocumentUploadView(generics.CreateAPIView):
     """Upload and process document"""
     serializer_class = DocumentSerializer
@@ -69,10 +136,11 @@ class DocumentUploadView(generics.CreateAPIView):
         # Increment usage
         subscription.increment_usage('documents')
 
-        # Trigger async processing
-        process_document.delay(
-            document.id,
-            request.user.organization.schema_name
+        # Trigger async processing (tenant-fair queue)
+        enqueue(
+            process_document,
+            document_id=document.id,
+            tenant_schema=request.user.organization.schema_name
         )
 
         return Response(
@@ -92,13 +160,146 @@ class DocumentListView(generics.ListAPIView):
 
 class DocumentDetailView(generics.RetrieveDestroyAPIView):
     """Get or delete document"""
-    serializer_class = DocumentSerializer
+    serializer_class = DocumentDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         return Document.objects.filter(user_id=self.request.user.id)
 
 
+class DocumentVersionView(generics.GenericAPIView):
+    """
+    GET: list previous versions of a document
+    POST: upload new version - only changed chunks get re-embedded
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def get_document(self, pk):
+        return Document.objects.filter(id=pk, user_id=self.request.user.id).first()
+
+    def get(self, request, pk):
+        document = self.get_document(pk)
+        if not document:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'current_version': document.version,
+            'versions': DocumentVersionSerializer(document.versions.all(), many=True).data
+        })
+
+    def post(self, request, pk):
+        document = self.get_document(pk)
+        if not document:
+            return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if document.file_type == 'url':
+            return Response(
+                {'error': 'Web pages are updated by re-crawling their source'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_type = file_obj.name.split('.')[-1].lower()
+        if file_type not in DOCUMENT_TYPES:
+            return Response({'error': 'Unsupported file type'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Keep previous file as a version record
+        DocumentVersion.objects.create(
+            document=document,
+            version=document.version,
+            file_type=document.file_type,
+            file_path=document.file_path,
+            file_size=document.file_size
+        )
+
+        document.file_path = default_storage.save(f'documents/{file_obj.name}', file_obj)
+        document.file_size = file_obj.size
+        document.file_type = file_type
+        document.version += 1
+        document.processing_status = 'pending'
+        document.processing_error = ''
+        document.save()
+
+        # Re-process; create_embeddings diffs chunks against the previous version
+        enqueue(
+            process_document,
+            document_id=document.id,
+            tenant_schema=request.user.organization.schema_name
+        )
+
+        return Response(DocumentSerializer(document).data, status=status.HTTP_202_ACCEPTED)
+
+
+class WebSourceListCreateView(generics.ListCreateAPIView):
+    """
+    GET: list websites/sitemaps imported into the knowledge base
+    POST: add URL or sitemap - pages are crawled in the background
+    """
+    serializer_class = WebSourceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return WebSource.objects.filter(user_id=self.request.user.id)
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        subscription = request.user.organization.subscription
+        if not subscription.is_within_limits('documents'):
+            return Response(
+                {'error': 'Document limit exceeded'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+
+        url = serializer.validated_data['url']
+        source = serializer.save(
+            user_id=request.user.id,
+            is_sitemap=serializer.validated_data.get('is_sitemap') or url.rstrip('/').endswith('.xml')
+        )
+
+        enqueue(
+            crawl_web_source,
+            web_source_id=source.id,
+            tenant_schema=request.user.organization.schema_name
+        )
+
+        return Response(self.get_serializer(source).data, status=status.HTTP_201_CREATED)
+
+
+class WebSourceDetailView(generics.RetrieveDestroyAPIView):
+    """Get or delete web source (deleting removes its pages)"""
+    serializer_class = WebSourceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return WebSource.objects.filter(user_id=self.request.user.id)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def web_source_crawl_view(request, pk):
+    """Re-crawl web source now; unchanged pages are skipped"""
+    source = WebSource.objects.filter(id=pk, user_id=request.user.id).first()
+    if not source:
+        return Response({'error': 'Web source not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if source.status == 'crawling':
+        return Response({'error': 'Crawl already in progress'}, status=status.HTTP_409_CONFLICT)
+
+    enqueue(
+        crawl_web_source,
+        web_source_id=source.id,
+        tenant_schema=request.user.organization.schema_name
+    )
+
+    return Response(WebSourceSerializer(source).data, status=status.HTTP_202_ACCEPTED)
+
+
 class PhotoUploadView(generics.CreateAPIView):
     """Upload and process photo"""
     serializer_class = PhotoSerializer
@@ -136,10 +337,11 @@ class PhotoUploadView(generics.CreateAPIView):
         # Increment usage
         subscription.increment_usage('photos')
 
-        # Trigger async processing
-        process_photo.delay(
-            photo.id,
-            request.user.organization.schema_name
+        # Trigger async processing (tenant-fair queue)
+        enqueue(
+            process_photo,
+            photo_id=photo.id,
+            tenant_schema=request.user.organization.schema_name
         )
 
         return Response(
@@ -155,3 +357,286 @@ class PhotoListView(generics.ListAPIView):
 
     def get_queryset(self):
         return Photo.objects.filter(user_id=self.request.user.id)
+
+
+class BulkUploadView(generics.GenericAPIView):
+    """
+    Upload many documents/photos at once: a zip archive ('archive') or several 'files'
+
+    One subscription check, rows created with bulk_create, processing enqueued
+    in one round trip to the tenant-fair queue. Returns batch ID for polling aggregate progress.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        archive = request.FILES.get('archive')
+        files = request.FILES.getlist('files')
+
+        if not archive and not files:
+            return Response({'error': 'No archive or files provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if archive and not zipfile.is_zipfile(archive):
+            return Response({'error': 'Archive must be a zip file'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if archive:
+            with zipfile.ZipFile(archive) as zf:
+                if len(zf.infolist()) > settings.BULK_UPLOAD_MAX_ENTRIES:
+                    return Response(
+                        {'error': f'Archive has more than {settings.BULK_UPLOAD_MAX_ENTRIES} entries'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        subscription = request.user.organization.subscription
+        quota = {
+            'documents': subscription.remaining('documents'),
+            'photos': subscription.remaining('photos'),
+        }
+
+        batch = UploadBatch.objects.create(
+            user_id=request.user.id,
+            source='archive' if archive else 'files'
+        )
+
+        documents = []
+        photos = []
+        skipped = []
+        extract_budget = settings.BULK_UPLOAD_MAX_TOTAL_BYTES
+
+        for name, file_obj, size in self._iter_entries(archive, files):
+            if len(documents) + len(photos) >= settings.BULK_UPLOAD_MAX_FILES:
+                skipped.append({'name': name, 'reason': 'Too many files in one batch'})
+                continue
+
+            extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+            if extension in DOCUMENT_TYPES:
+                kind, target = 'documents', documents
+            elif extension in IMAGE_TYPES:
+                kind, target = 'photos', photos
+            else:
+                skipped.append({'name': name, 'reason': 'Unsupported file type'})
+                continue
+
+            if quota[kind] is not None and len(target) >= quota[kind]:
+                skipped.append({'name': name, 'reason': f'{kind.capitalize()} limit exceeded'})
+                continue
+
+            if archive:
+                # info.file_size comes from the archive itself and can lie (zip bombs) -
+                # extract with a cap on what is actually inflated, then store the copy
+                limit = min(settings.BULK_UPLOAD_MAX_FILE_BYTES, extract_budget)
+                try:
+                    file_obj = self._extract(file_obj, limit)
+                except EntryTooLarge:
+                    extract_budget -= limit
+                    reason = 'File too large' if limit == settings.BULK_UPLOAD_MAX_FILE_BYTES else 'Archive too large'
+                    skipped.append({'name': name, 'reason': reason})
+                    continue
+                size = file_obj.tell()
+                extract_budget -= size
+                file_obj.seek(0)
+
+            try:
+                # Storage write streams the entry in chunks
+                file_path = default_storage.save(f'{kind}/{name}', File(file_obj, name=name))
+            finally:
+                if archive:
+                    file_obj.close()
+
+            if kind == 'documents':
+                documents.append(Document(
+                    user_id=request.user.id,
+                    title=name,
+                    file_type=extension,
+                    file_path=file_path,
+                    file_size=size,
+                    batch=batch
+                ))
+            else:
+                photos.append(Photo(
+                    user_id=request.user.id,
+                    file_path=file_path,
+                    file_size=size,
+                    batch=batch
+                ))
+
+        documents = Document.objects.bulk_create(documents)
+        photos = Photo.objects.bulk_create(photos)
+
+        batch.total_files = len(documents) + len(photos)
+        batch.skipped = skipped
+        batch.save(update_fields=['total_files', 'skipped'])
+
+        if documents:
+            subscription.increment_usage('documents', len(documents))
+        if photos:
+            subscription.increment_usage('photos', len(photos))
+
+        # Enqueue everything at once; photos go through batched Vision requests
+        tenant_schema = request.user.organization.schema_name
+        photo_ids = [photo.id for photo in photos]
+        tasks = [
+            (process_document, {'document_id': document.id, 'tenant_schema': tenant_schema})
+            for document in documents
+        ]
+        tasks += [
+            (process_photos_batch, {'photo_ids': photo_ids[i:i + MAX_BATCH_SIZE], 'tenant_schema': tenant_schema})
+            for i in range(0, len(photo_ids), MAX_BATCH_SIZE)
+        ]
+        if tasks:
+            enqueue_many(tasks)
+
+        return Response({
+            'batch_id': batch.id,
+            'documents': len(documents),
+            'photos': len(photos),
+            'skipped': skipped,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _extract(self, entry, limit):
+        """Copy a zip entry to a temp file, raise EntryTooLarge past limit bytes"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        try:
+            # Read at most one byte past the limit - enough to tell it's too large
+            remaining = limit + 1
+            while remaining > 0:
+                chunk = entry.read(min(EXTRACT_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                spooled.write(chunk)
+                remaining -= len(chunk)
+            if spooled.tell() > limit:
+                raise EntryTooLarge(f"Entry is larger than {limit} bytes")
+        except BaseException:
+            spooled.close()
+            raise
+        return spooled
+
+    def _iter_entries(self, archive, files):
+        """Yield (name, file_obj, size) without reading entries into memory"""
+        if archive:
+            with zipfile.ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    name = os.path.basename(info.filename)
+                    # Skip folders, macOS metadata and hidden files
+                    if info.is_dir() or not name or name.startswith('.') or '__MACOSX' in info.filename:
+                        continue
+                    with zf.open(info) as entry:
+                        yield name, entry, info.file_size
+        else:
+            for file_obj in files:
+                yield os.path.basename(file_obj.name), file_obj, file_obj.size
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_detail_view(request, pk):
+    """Aggregate processing progress of a bulk upload"""
+    try:
+        batch = UploadBatch.objects.get(id=pk, user_id=request.user.id)
+    except UploadBatch.DoesNotExist:
+        return Response({'error': 'Batch not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    items = []
+    for model, queryset in ((Document, batch.documents), (Photo, batch.photos)):
+        statuses = dict(queryset.values_list('id', 'processing_status'))
+        job_progress = dict(
+            ProcessingJob.objects.filter(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id__in=statuses.keys()
+            ).order_by('created_at').values_list('object_id', 'progress')
+        )
+        for object_id, processing_status in statuses.items():
+            if object_id in job_progress:
+                progress = job_progress[object_id]
+            else:
+                progress = 100 if processing_status in ('completed', 'failed') else 0
+            items.append((processing_status, progress))
+
+    counts = {'pending': 0, 'processing': 0, 'completed': 0, 'failed': 0}
+    for processing_status, _ in items:
+        counts[processing_status] = counts.get(processing_status, 0) + 1
+
+    return Response({
+        'batch_id': batch.id,
+        'total_files': batch.total_files,
+        'status_counts': counts,
+        'progress': round(sum(progress for _, progress in items) / len(items)) if items else 100,
+        'skipped': batch.skipped,
+        'created_at': batch.created_at,
+    })
+
+
+class ProcessingJobListView(generics.ListAPIView):
+    """List user's ingestion jobs (filter with ?status=processing)"""
+    serializer_class = ProcessingJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = ProcessingJob.objects.filter(
+            user_id=self.request.user.id
+        ).select_related('content_type')
+
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+
+        return queryset
+
+
+class ProcessingJobDetailView(generics.RetrieveAPIView):
+    """
+    Poll single ingestion job
+
+    Short polling rather than a held-open stream, so no worker is tied up per
+    watching client. Retry-After tells the client when to ask again while the job runs.
+    """
+    serializer_class = ProcessingJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ProcessingJob.objects.filter(
+            user_id=self.request.user.id
+        ).select_related('content_type')
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.data['status'] not in ('completed', 'failed'):
+            response['Retry-After'] = max(int(settings.PROCESSING_PROGRESS_INTERVAL), 1)
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def job_stats_view(request):
+    """Average time per stage over recent completed jobs - shows where ingestion time goes"""
+    jobs = ProcessingJob.objects.filter(
+        user_id=request.user.id,
+        status='completed'
+    ).values_list('stage_timings', flat=True)[:100]
+
+    totals = {}
+    for timings in jobs:
+        for stage, seconds in timings.items():
+            total, count = totals.get(stage, (0, 0))
+            totals[stage] = (total + seconds, count + 1)
+
+    return Response({
+        'jobs': len(jobs),
+        'avg_stage_seconds': {
+            stage: round(total / count, 3)
+            for stage, (total, count) in totals.items()
+        }
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def queue_depth_view(request):
+    """Ingestion backlog per tenant - staff see all tenants, others their own"""
+    if request.user.is_staff:
+        depths = queue_depths()
+    else:
+        depths = queue_depths([request.user.organization.schema_name])
+
+    return Response({'tenants': depths})
@@ -0,0 +1,129 @@
+"""
+Google Vision API helpers
+
+All five detections (labels, OCR, objects, faces, colors) are requested in a
+single AnnotateImageRequest, and several images are sent together with
+batch_annotate_images, so image bytes are uploaded once per photo.
+
+Set GOOGLE_VISION_API_ENDPOINT to point the client at another server
+(e.g. a local fake Vision server for testing).
+"""
+from django.conf import settings
+from google.api_core.client_options import ClientOptions
+from google.cloud import vision
+
+# Vision API limit for images in one batch_annotate_images call
+MAX_BATCH_SIZE = 16
+
+FEATURES = [
+    vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION),
+    vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION),
+    vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION),
+    vision.Feature(type_=vision.Feature.Type.FACE_DETECTION),
+    vision.Feature(type_=vision.Feature.Type.IMAGE_PROPERTIES),
+]
+
+_client = None
+
+
+class VisionError(Exception):
+    """Vision API returned an error for a single image"""
+
+
+def get_client():
+    """Process-wide ImageAnnotatorClient (reuses the channel between tasks)"""
+    global _client
+
+    if _client is None:
+        endpoint = settings.GOOGLE_VISION_API_ENDPOINT
+        if endpoint:
+            from google.auth.credentials import AnonymousCredentials
+            _client = vision.ImageAnnotatorClient(
+                credentials=AnonymousCredentials(),
+                transport='rest',
+                client_options=ClientOptions(api_endpoint=endpoint),
+            )
+        else:
+            _client = vision.ImageAnnotatorClient()
+
+    return _client
+
+
+def annotate_image(image_content):
+    """Run all detections for one image in a single request"""
+    response = get_client().annotate_image(_build_request(image_content))
+    return parse_response(response)
+
+
+def annotate_images(image_contents):
+    """
+    Run all detections for several images, MAX_BATCH_SIZE per request
+
+    Returns list aligned with input: parsed result dict or VisionError
+    """
+    results = []
+
+    for start in range(0, len(image_contents), MAX_BATCH_SIZE):
+        batch = image_contents[start:start + MAX_BATCH_SIZE]
+        response = get_client().batch_annotate_images(
+            requests=[_build_request(content) for content in batch]
+        )
+
+        for image_response in response.responses:
+            try:
+                results.append(parse_response(image_response))
+            except VisionError as e:
+                results.append(e)
+
+    return results
+
+
+def parse_response(response):
+    """Map AnnotateImageResponse onto Photo fields"""
+    if response.error.message:
+        raise VisionError(response.error.message)
+
+    return {
+        'labels': [
+            {
+                'description': label.description,
+                'score': label.score
+            }
+            for label in response.label_annotations
+        ],
+        'text': response.text_annotations[0].description if response.text_annotations else "",
+        'detected_objects': [
+            {
+                'name': obj.name,
+                'score': obj.score
+            }
+            for obj in response.localized_object_annotations
+        ],
+        'faces': [
+            {
+                'joy': face.joy_likelihood.name,
+                'sorrow': face.sorrow_likelihood.name,
+                'anger': face.anger_likelihood.name
+            }
+            for face in response.face_annotations
+        ],
+        'colors': [
+            {
+                'color': {
+                    'red': color.color.red,
+                    'green': color.color.green,
+                    'blue': color.color.blue
+                },
+                'score': color.score,
+                'pixel_fraction': color.pixel_fraction
+            }
+            for color in response.image_properties_annotation.dominant_colors.colors
+        ],
+    }
+
+
+def _build_request(image_content):
+    return vision.AnnotateImageRequest(
+        image=vision.Image(content=image_content),
+        features=FEATURES,
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('embeddings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embedding',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
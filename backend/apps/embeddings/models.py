@@ -18,6 +18,7 @@ class Embedding(models.Model):
 
     # Content
     content = models.TextField()  # оригінальний текст
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of content, for version diffs
 
     # Vector (pgvector extension) - dimension 1536 for OpenAI ada-002
     # This will be created with raw SQL since Django doesn't natively support vector type
@@ -1,21 +1,39 @@
+import hashlib
+import logging
 from celery import shared_task
-from django.utils import timezone
-from django.conf import settings
+from django.db import connection, transaction
 from apps.accounts.middleware import TenantSchemaContext
 from .models import Embedding, VectorStore
-import openai
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from apps.agent import llm, semantic_cache
 
-openai.api_key = settings.OPENAI_API_KEY
+logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True)
-def create_embeddings(self, content, source_type, source_id, tenant_schema):
+def create_embeddings(self, source_type, source_id, tenant_schema, version=None, job_id=None):
     """
-    Create embeddings from text content
+    Create embeddings for a document/photo
+
+    Task message only carries a reference; content is loaded here so large
+    texts never travel through the broker or the result backend.
+
+    version: Document.version the task was queued for - skipped if superseded
+    job_id: ProcessingJob started by process_document/process_photo, if any
     """
+    from apps.documents.progress import JobTracker
+    from apps.documents.normalization import has_content
+
     with TenantSchemaContext(tenant_schema):
+        tracker = JobTracker()
         try:
+            tracker = JobTracker.resume(job_id)
+
+            content = load_source_text(source_type, source_id, version)
+            if content is None:
+                tracker.complete()
+                return f"Skipped {source_type}:{source_id} - missing or superseded by a newer version"
+
             # Get vector store settings
             vector_store = VectorStore.objects.first()
             if not vector_store:
@@ -24,57 +42,105 @@ def create_embeddings(self, content, source_type, source_id, tenant_schema):
                 )
 
             # Split text into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=vector_store.chunk_size,
-                chunk_overlap=vector_store.chunk_overlap,
-                length_function=len,
-            )
-
-            chunks = text_splitter.split_text(content)
-
-            # Create embeddings for each chunk
-            embeddings_created = 0
-            for chunk in chunks:
-                if not chunk.strip():
-                    continue
-
-                # Generate embedding using OpenAI
-                response = openai.embeddings.create(
-                    model=vector_store.embedding_model,
-                    input=chunk
-                )
-
-                vector = response.data[0].embedding
-
-                # Create embedding record
-                embedding = Embedding.objects.create(
-                    source_type=source_type,
-                    source_id=source_id,
-                    content=chunk,
-                    metadata={
-                        'model': vector_store.embedding_model,
-                        'chunk_index': embeddings_created
-                    }
+            with tracker.stage('chunk'):
+                text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=vector_store.chunk_size,
+                    chunk_overlap=vector_store.chunk_overlap,
+                    length_function=len,
+                    add_start_index=True,
                 )
 
-                # Store vector in database (using raw SQL for pgvector)
-                from django.db import connection
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        f"UPDATE embeddings SET vector = %s::vector WHERE id = %s",
-                        [vector, embedding.id]
+                # Drop chunks with nothing but whitespace/punctuation left after normalization.
+                # Character offsets point back into the source text.
+                chunks = [
+                    (doc.page_content, doc.metadata['start_index'])
+                    for doc in text_splitter.create_documents([content])
+                    if has_content(doc.page_content)
+                ]
+            tracker.finish_stage('chunk')
+
+            # Diff against existing chunks of this source: unchanged chunks keep their vectors
+            existing = {}
+            for embedding_id, content_hash, chunk_content in Embedding.objects.filter(
+                source_type=source_type,
+                source_id=source_id
+            ).values_list('id', 'content_hash', 'content'):
+                existing.setdefault(content_hash or _hash_chunk(chunk_content), []).append(embedding_id)
+
+            reused = []  # (embedding_id, chunk_index, start)
+            new_chunks = []  # (chunk_index, chunk, content_hash, start)
+            for chunk_index, (chunk, start) in enumerate(chunks):
+                content_hash = _hash_chunk(chunk)
+                if existing.get(content_hash):
+                    reused.append((existing[content_hash].pop(), chunk_index, start))
+                else:
+                    new_chunks.append((chunk_index, chunk, content_hash, start))
+            stale_ids = [embedding_id for ids in existing.values() for embedding_id in ids]
+
+            # Generate embeddings only for changed chunks
+            vectors = []
+            for done, (chunk_index, chunk, content_hash, start) in enumerate(new_chunks, 1):
+                with tracker.stage('embed'):
+                    vector = llm.create_embedding(
+                        input=chunk,
+                        model=vector_store.embedding_model
+                    )
+                vectors.append(vector)
+                tracker.step_progress('chunk', 'embed', done, len(new_chunks))
+
+            # Swap new chunks in and stale ones out in one transaction
+            with tracker.stage('index'), transaction.atomic():
+                for (chunk_index, chunk, content_hash, start), vector in zip(new_chunks, vectors):
+                    embedding = Embedding.objects.create(
+                        source_type=source_type,
+                        source_id=source_id,
+                        content=chunk,
+                        content_hash=content_hash,
+                        metadata={
+                            'model': vector_store.embedding_model,
+                            'chunk_index': chunk_index,
+                            'start_offset': start,
+                            'end_offset': start + len(chunk)
+                        }
                     )
 
-                embeddings_created += 1
+                    # Store vector in database (using raw SQL for pgvector)
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"UPDATE embeddings SET vector = %s::vector WHERE id = %s",
+                            [vector, embedding.id]
+                        )
+
+                # Unchanged chunks may have moved within the document
+                reused_embeddings = Embedding.objects.in_bulk([embedding_id for embedding_id, _, _ in reused])
+                for embedding_id, chunk_index, start in reused:
+                    embedding = reused_embeddings[embedding_id]
+                    embedding.metadata['chunk_index'] = chunk_index
+                    embedding.metadata['start_offset'] = start
+                    embedding.metadata['end_offset'] = start + len(embedding.content)
+                    embedding.content_hash = embedding.content_hash or _hash_chunk(embedding.content)
+                Embedding.objects.bulk_update(reused_embeddings.values(), ['metadata', 'content_hash'])
+
+                Embedding.objects.filter(id__in=stale_ids).delete()
 
             # Update stats
-            vector_store.total_embeddings = Embedding.objects.count()
-            vector_store.save()
-
-            return f"Created {embeddings_created} embeddings for {source_type}:{source_id}"
+            with tracker.stage('index'):
+                vector_store.total_embeddings = Embedding.objects.count()
+                vector_store.save()
+
+            # Knowledge changed - cached answers may be stale (once per source, not per chunk)
+            if new_chunks or stale_ids:
+                semantic_cache.clear()
+            tracker.complete()
+
+            return (
+                f"Embeddings for {source_type}:{source_id}: "
+                f"{len(new_chunks)} created, {len(reused)} reused, {len(stale_ids)} removed"
+            )
 
         except Exception as e:
-            print(f"Error creating embeddings: {e}")
+            logger.exception(f"Error creating embeddings for {source_type}:{source_id} in {tenant_schema}")
+            tracker.fail(e)
             raise
 
 
@@ -86,47 +152,85 @@ def rebuild_vector_store(tenant_schema):
     with TenantSchemaContext(tenant_schema):
         # Delete all existing embeddings
         Embedding.objects.all().delete()
+        semantic_cache.clear()
 
-        # Re-process all documents
+        # Re-process all documents (through the tenant-fair queue so other tenants aren't starved)
         from apps.documents.models import Document, Photo
-        from apps.agent.models import Prompt
+        from apps.documents.dispatcher import enqueue_many
+
+        tasks = []
 
         # Documents
-        for doc in Document.objects.filter(is_processed=True):
-            create_embeddings.delay(
-                content=doc.extracted_text,
-                source_type='document',
-                source_id=doc.id,
-                tenant_schema=tenant_schema
-            )
+        for doc_id, doc_version in Document.objects.filter(is_processed=True).values_list('id', 'version'):
+            tasks.append((create_embeddings, {
+                'source_type': 'document',
+                'source_id': doc_id,
+                'tenant_schema': tenant_schema,
+                'version': doc_version
+            }))
 
         # Photos
-        for photo in Photo.objects.filter(is_processed=True):
-            combined_text = f"{photo.text} {' '.join([l['description'] for l in photo.labels])}"
-            create_embeddings.delay(
-                content=combined_text,
-                source_type='photo',
-                source_id=photo.id,
-                tenant_schema=tenant_schema
-            )
+        for photo_id in Photo.objects.filter(is_processed=True).values_list('id', flat=True):
+            tasks.append((create_embeddings, {
+                'source_type': 'photo',
+                'source_id': photo_id,
+                'tenant_schema': tenant_schema
+            }))
+
+        if tasks:
+            enqueue_many(tasks)
 
         return "Vector store rebuild initiated"
 
 
-def search_similar(query_text, tenant_schema, limit=5):
+def load_source_text(source_type, source_id, version=None):
+    """
+    Text to embed for a source (claim-check: tasks pass references, not content)
+
+    Returns None if the source is gone or a newer document version exists.
+    """
+    from apps.documents.models import Document, Photo
+
+    if source_type == 'document':
+        document = Document.objects.filter(id=source_id).first()
+        if not document or (version is not None and document.version != version):
+            return None
+        return document.extracted_text
+
+    if source_type == 'photo':
+        photo = Photo.objects.filter(id=source_id).first()
+        if not photo:
+            return None
+        return f"{photo.text} {' '.join([l['description'] for l in photo.labels])}"
+
+    return None
+
+
+def _hash_chunk(chunk):
+    """Content hash used to match unchanged chunks between document versions"""
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+
+def embed_query(query_text):
+    """Embedding vector for a search query"""
+    return llm.create_embedding(
+        input=query_text,
+        model='text-embedding-ada-002'
+    )
+
+
+def search_similar(query_text, tenant_schema, limit=5, query_vector=None):
     """
     Search for similar embeddings using cosine similarity
+
+    query_vector: precomputed embed_query(query_text), if the caller needs it too
     """
     with TenantSchemaContext(tenant_schema):
         # Generate embedding for query
-        response = openai.embeddings.create(
-            model='text-embedding-ada-002',
-            input=query_text
-        )
-        query_vector = response.data[0].embedding
+        if query_vector is None:
+            query_vector = embed_query(query_text)
 
         # Search using pgvector cosine similarity
-        from django.db import connection
         with connection.cursor() as cursor:
             cursor.execute("""
                 SELECT id, source_type, source_id, content,
@@ -0,0 +1,36 @@
+"""
+Token counting with tiktoken
+"""
+from functools import lru_cache
+import tiktoken
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=None):
+    """Encoding for model, falls back to cl100k_base for unknown models"""
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text, model=None):
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, model=None):
+    """Cut text to at most max_tokens tokens"""
+    if not text or max_tokens <= 0:
+        return ''
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
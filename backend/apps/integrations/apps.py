@@ -12,6 +12,8 @@ class IntegrationsConfig(AppConfig):
 
         Start all active Telegram bots that were previously connected
         """
+        import apps.integrations.signals  # noqa
+
         # Import here to avoid AppRegistryNotReady error
         # Тимчасово закоментовано щоб не блокувати старт
         # from .tasks import start_all_active_telegram_bots
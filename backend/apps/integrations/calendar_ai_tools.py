@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import re
 from .google_calendar import GoogleCalendarService, BookingEmailService
 from .models import Integration
+from . import client_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,22 +22,36 @@ class CalendarAITools:
     def __init__(self, user_id, tenant_schema):
         self.user_id = user_id
         self.tenant_schema = tenant_schema
-        self.calendar_service = None
+        self._calendar_service = None
+
+    @property
+    def calendar_service(self):
+        """Pooled GoogleCalendarService, built on first tool use"""
+        if self._calendar_service is None:
+            self._calendar_service = client_pool.pool.get(
+                'google_calendar',
+                self.user_id,
+                self._load_calendar_service
+            )
+        return self._calendar_service
 
-        # Load integration
+    def _load_calendar_service(self):
         try:
             integration = Integration.objects.get(
-                user_id=user_id,
+                user_id=self.user_id,
                 integration_type='google_calendar',
                 status='active'
             )
-            self.calendar_service = GoogleCalendarService(integration)
+            return GoogleCalendarService(integration)
         except Integration.DoesNotExist:
-            logger.warning(f"No Google Calendar integration for user {user_id}")
+            logger.warning(f"No Google Calendar integration for user {self.user_id}")
+        except Exception as e:
+            logger.error(f"Error loading Google Calendar for user {self.user_id}: {e}")
+        return None
 
     def is_available(self):
-        """Check if calendar integration is available"""
-        return self.calendar_service is not None
+        """Check if calendar integration is available (cached, doesn't build the client)"""
+        return client_pool.has_active_integration(self.user_id, 'google_calendar')
 
     def check_availability(self, date_str, duration_minutes=60):
         """
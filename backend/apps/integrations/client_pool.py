@@ -0,0 +1,104 @@
+"""
+Per-process pool of initialized integration clients
+
+Building a client (Integration query, Fernet decryption, googleapiclient
+build) is done once per user and integration type and reused by later chat
+turns until INTEGRATION_CLIENT_TTL expires or the Integration is saved.
+
+Saving an Integration bumps a generation counter in the cache, so pools in
+other processes (gunicorn workers, Celery) drop their copy on next use too.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'integrations:generation:{integration_type}:{user_id}'
+ACTIVE_KEY = 'integrations:active:{integration_type}:{user_id}'
+
+# Saves touching only these fields (message counters) don't change the client
+STATS_FIELDS = {'messages_received', 'messages_sent', 'last_activity', 'updated_at'}
+
+
+class ClientPool:
+    """TTL-bounded map of (integration_type, user_id) -> client, safe to share between threads"""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}  # key -> (client, generation, expires_at)
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def get(self, integration_type, user_id, factory):
+        """Pooled client, or factory() result if missing/stale. factory may return None"""
+        key = (integration_type, user_id)
+        generation = _generation(integration_type, user_id)
+
+        entry = self._entries.get(key)
+        if entry and entry[1] == generation and entry[2] > time.monotonic():
+            return entry[0]
+
+        # One build per key at a time; concurrent callers wait and reuse it
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] == generation and entry[2] > time.monotonic():
+                return entry[0]
+
+            client = factory()
+
+            with self._lock:
+                if len(self._entries) >= self.max_size and key not in self._entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][2])
+                    self._entries.pop(oldest)
+                    self._build_locks.pop(oldest, None)
+                self._entries[key] = (client, generation, time.monotonic() + self.ttl)
+
+            return client
+
+    def discard(self, integration_type, user_id):
+        with self._lock:
+            self._entries.pop((integration_type, user_id), None)
+
+
+pool = ClientPool(
+    ttl=settings.INTEGRATION_CLIENT_TTL,
+    max_size=settings.INTEGRATION_CLIENT_POOL_SIZE
+)
+
+
+def has_active_integration(user_id, integration_type):
+    """Cached check that user has an active integration (no decryption, no client build)"""
+    key = ACTIVE_KEY.format(integration_type=integration_type, user_id=user_id)
+    active = cache.get(key)
+
+    if active is None:
+        from .models import Integration
+
+        active = Integration.objects.filter(
+            user_id=user_id,
+            integration_type=integration_type,
+            status='active'
+        ).exists()
+        cache.set(key, active, settings.INTEGRATION_CLIENT_TTL)
+
+    return active
+
+
+def invalidate(user_id, integration_type):
+    """Drop pooled client and cached status in every process"""
+    key = GENERATION_KEY.format(integration_type=integration_type, user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+    cache.delete(ACTIVE_KEY.format(integration_type=integration_type, user_id=user_id))
+    pool.discard(integration_type, user_id)
+
+
+def _generation(integration_type, user_id):
+    return cache.get(GENERATION_KEY.format(integration_type=integration_type, user_id=user_id), 0)
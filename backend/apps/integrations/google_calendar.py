@@ -11,8 +11,12 @@ Features:
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+import google_auth_httplib2
+import httplib2
 from django.conf import settings
 from datetime import datetime, timedelta
+import threading
 import pytz
 import logging
 
@@ -35,6 +39,7 @@ class GoogleCalendarService:
         self.integration = integration
         self.credentials = None
         self.service = None
+        self._local = threading.local()
 
         # Load credentials
         self._load_credentials()
@@ -55,8 +60,19 @@ class GoogleCalendarService:
             scopes=self.SCOPES
         )
 
-        # Build service
-        self.service = build('calendar', 'v3', credentials=self.credentials)
+        # Build service. Instances are pooled and shared between threads
+        # (client_pool), httplib2 is not thread-safe - one Http per thread.
+        self.service = build(
+            'calendar', 'v3',
+            credentials=self.credentials,
+            requestBuilder=self._build_request
+        )
+
+    def _build_request(self, http, *args, **kwargs):
+        """Execute API requests over this thread's own authorized Http"""
+        if not hasattr(self._local, 'http'):
+            self._local.http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+        return HttpRequest(self._local.http, *args, **kwargs)
 
     @staticmethod
     def get_authorization_url(redirect_uri):
@@ -3,6 +3,7 @@ from django.core.exceptions import ValidationError
 import json
 from cryptography.fernet import Fernet
 from django.conf import settings
+from django.utils.functional import cached_property
 
 
 class Integration(models.Model):
@@ -22,6 +23,9 @@ class Integration(models.Model):
         ('disabled', 'Disabled'),
     ]
 
+    # Set to now whenever message counters are bumped (apps.agent.counters)
+    STATS_TOUCH = ('last_activity', 'updated_at')
+
     user_id = models.IntegerField(db_index=True)
     integration_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -55,6 +59,13 @@ class Integration(models.Model):
     def __str__(self):
         return f"{self.get_integration_type_display()} - {self.status}"
 
+    @cached_property
+    def tenant_schema(self):
+        """Schema of the owner's organization (for counter updates, see apps.agent.counters)"""
+        from apps.accounts.models import User
+
+        return User.objects.select_related('organization').get(id=self.user_id).organization.schema_name
+
     def set_credentials(self, credentials_dict):
         """Encrypt and store credentials"""
         # Use Fernet for symmetric encryption
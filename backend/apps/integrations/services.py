@@ -7,6 +7,7 @@ from googleapiclient.discovery import build
 from django.conf import settings
 from apps.agent.services import AgentService
 from apps.agent.models import Conversation
+from apps.agent import counters
 from .models import Integration
 
 
@@ -23,8 +24,13 @@ class TelegramService:
         """Send message to Telegram"""
         try:
             await self.bot.send_message(chat_id=chat_id, text=text)
-            self.integration.messages_sent += 1
-            self.integration.save()
+            counters.increment(
+                Integration,
+                self.integration.id,
+                tenant_schema=self.integration.tenant_schema,
+                touch=Integration.STATS_TOUCH,
+                messages_sent=1
+            )
             return True
         except Exception as e:
             print(f"Error sending Telegram message: {e}")
@@ -36,8 +42,13 @@ class TelegramService:
         user_message = update.message.text
 
         # Increment received counter
-        self.integration.messages_received += 1
-        self.integration.save()
+        counters.increment(
+            Integration,
+            self.integration.id,
+            tenant_schema=self.integration.tenant_schema,
+            touch=Integration.STATS_TOUCH,
+            messages_received=1
+        )
 
         # Get or create conversation for this Telegram chat
         from apps.accounts.middleware import TenantSchemaContext
@@ -107,8 +118,13 @@ class WhatsAppService:
                 to=f'whatsapp:{to_number}'
             )
 
-            self.integration.messages_sent += 1
-            self.integration.save()
+            counters.increment(
+                Integration,
+                self.integration.id,
+                tenant_schema=self.integration.tenant_schema,
+                touch=Integration.STATS_TOUCH,
+                messages_sent=1
+            )
 
             return message.sid
 
@@ -119,8 +135,13 @@ class WhatsAppService:
     def handle_webhook(self, from_number, message_body):
         """Handle incoming WhatsApp message"""
         # Increment received counter
-        self.integration.messages_received += 1
-        self.integration.save()
+        counters.increment(
+            Integration,
+            self.integration.id,
+            tenant_schema=self.integration.tenant_schema,
+            touch=Integration.STATS_TOUCH,
+            messages_received=1
+        )
 
         # Get or create conversation
         from apps.accounts.middleware import TenantSchemaContext
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Integration
+from .client_pool import invalidate, STATS_FIELDS
+
+
+@receiver(post_save, sender=Integration)
+def invalidate_integration_client(sender, instance, update_fields=None, **kwargs):
+    """
+    Скидає закешований клієнт інтеграції після зміни credentials/статусу
+    """
+    # Message counters are bumped on every message - they don't affect the client
+    if update_fields and set(update_fields) <= STATS_FIELDS:
+        return
+
+    invalidate(instance.user_id, instance.integration_type)
+
+
+@receiver(post_delete, sender=Integration)
+def invalidate_deleted_integration_client(sender, instance, **kwargs):
+    invalidate(instance.user_id, instance.integration_type)
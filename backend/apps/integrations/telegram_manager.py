@@ -9,6 +9,7 @@ from telegram.ext import Application, MessageHandler, CommandHandler, filters
 from django.conf import settings
 from apps.agent.services import AgentService
 from apps.agent.models import Conversation
+from apps.agent import counters
 from .models import Integration
 import logging
 
@@ -167,8 +168,13 @@ class TelegramBotManager:
             user = User.objects.get(id=integration.user_id)
 
             # Increment received messages
-            integration.messages_received += 1
-            integration.save()
+            counters.increment(
+                Integration,
+                integration.id,
+                tenant_schema=user.organization.schema_name,
+                touch=Integration.STATS_TOUCH,
+                messages_received=1
+            )
 
             # Get or create conversation
             chat_id = str(update.effective_chat.id)
@@ -196,8 +202,13 @@ class TelegramBotManager:
                 await update.message.reply_text(result['message'])
 
                 # Increment sent messages
-                integration.messages_sent += 1
-                integration.save()
+                counters.increment(
+                    Integration,
+                    integration.id,
+                    tenant_schema=user.organization.schema_name,
+                    touch=Integration.STATS_TOUCH,
+                    messages_sent=1
+                )
 
         except Exception as e:
             logger.error(f"Error handling message: {e}")
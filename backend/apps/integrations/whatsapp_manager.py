@@ -8,6 +8,7 @@ from twilio.rest import Client
 from django.conf import settings
 from apps.agent.services import AgentService
 from apps.agent.models import Conversation
+from apps.agent import counters
 from apps.accounts.models import User
 from apps.accounts.middleware import TenantSchemaContext
 from .models import Integration
@@ -44,8 +45,13 @@ class WhatsAppManager:
             )
 
             # Increment sent counter
-            integration.messages_sent += 1
-            integration.save()
+            counters.increment(
+                Integration,
+                integration.id,
+                tenant_schema=integration.tenant_schema,
+                touch=Integration.STATS_TOUCH,
+                messages_sent=1
+            )
 
             return message.sid
 
@@ -80,8 +86,13 @@ class WhatsAppManager:
             user = User.objects.get(id=integration.user_id)
 
             # Increment received messages
-            integration.messages_received += 1
-            integration.save()
+            counters.increment(
+                Integration,
+                integration.id,
+                tenant_schema=user.organization.schema_name,
+                touch=Integration.STATS_TOUCH,
+                messages_received=1
+            )
 
             # Get or create conversation
             clean_from_number = from_number.replace('whatsapp:', '')
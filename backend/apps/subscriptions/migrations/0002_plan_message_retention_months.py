@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='message_retention_months',
+            field=models.IntegerField(default=12),
+        ),
+    ]
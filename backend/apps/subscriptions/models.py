@@ -28,6 +28,9 @@ class Plan(models.Model):
     max_messages_per_month = models.IntegerField(default=5000)
     max_storage_mb = models.IntegerField(default=1000)
 
+    # Chat messages older than this are moved to the cold archive (0 - keep forever)
+    message_retention_months = models.IntegerField(default=12)
+
     # Features (JSON array of feature slugs)
     features = models.JSONField(default=list)
 
@@ -147,14 +150,28 @@ class Subscription(models.Model):
 
         return True
 
-    def increment_usage(self, usage_type):
+    def remaining(self, limit_type):
+        """How many more items fit into the plan limit (None = unlimited)"""
+        limits = {
+            'messages': (self.used_messages, self.plan.max_messages_per_month),
+            'photos': (self.used_photos, self.plan.max_photos_per_month),
+            'documents': (self.used_documents, self.plan.max_documents),
+        }
+
+        if limit_type in limits:
+            used, max_allowed = limits[limit_type]
+            return max(max_allowed - used, 0)
+
+        return None
+
+    def increment_usage(self, usage_type, amount=1):
         """Increment usage counter"""
         if usage_type == 'messages':
-            self.used_messages += 1
+            self.used_messages += amount
         elif usage_type == 'photos':
-            self.used_photos += 1
+            self.used_photos += amount
         elif usage_type == 'documents':
-            self.used_documents += 1
+            self.used_documents += amount
 
         self.save(update_fields=[f'used_{usage_type}'])
 
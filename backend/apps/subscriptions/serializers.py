@@ -9,7 +9,7 @@ class PlanSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'description',
             'price_monthly', 'price_yearly',
             'max_users', 'max_documents', 'max_photos_per_month',
-            'max_messages_per_month', 'max_storage_mb',
+            'max_messages_per_month', 'max_storage_mb', 'message_retention_months',
             'features', 'trial_days', 'is_active'
         ]
 
@@ -1,11 +1,40 @@
 import os
-from celery import Celery
+import json
+from celery import Celery, Task
 from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.development')
 
-app = Celery('sloth')
+
+class TaskPayloadTooLarge(ValueError):
+    """Task arguments exceed CELERY_TASK_MAX_PAYLOAD_BYTES"""
+
+
+def check_payload_size(task_name, args=None, kwargs=None):
+    """
+    Reject oversized task messages - pass references (ids) instead of content
+    so Redis and the django-db result backend stay small
+    """
+    from django.conf import settings
+
+    size = len(json.dumps([args or [], kwargs or {}], default=str))
+    if size > settings.CELERY_TASK_MAX_PAYLOAD_BYTES:
+        raise TaskPayloadTooLarge(
+            f"Task {task_name} payload is {size} bytes "
+            f"(limit {settings.CELERY_TASK_MAX_PAYLOAD_BYTES}); pass ids instead of content"
+        )
+
+
+class GuardedTask(Task):
+    """Base task class enforcing the payload size limit on publish"""
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        check_payload_size(self.name, args, kwargs)
+        return super().apply_async(args, kwargs, **options)
+
+
+app = Celery('sloth', task_cls=GuardedTask)
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
@@ -41,10 +70,32 @@ app.conf.beat_schedule = {
     },
 
     # Documents
+    'dispatch-ingestion': {
+        'task': 'apps.documents.dispatcher.dispatch_ingestion',
+        'schedule': 30.0,  # Every 30 seconds
+    },
+    'sweep-pending-photos': {
+        'task': 'apps.documents.tasks.sweep_pending_photos',
+        'schedule': crontab(minute='*/15'),  # Every 15 minutes
+    },
+    'recrawl-web-sources': {
+        'task': 'apps.documents.tasks.recrawl_web_sources',
+        'schedule': crontab(minute=15),  # Hourly at :15
+    },
     'cleanup-old-files': {
         'task': 'apps.documents.tasks.cleanup_old_files',
         'schedule': crontab(day_of_week=0, hour=3, minute=0),  # Weekly on Sunday at 03:00
     },
+
+    # Agent
+    'flush-counters': {
+        'task': 'apps.agent.tasks.flush_counters',
+        'schedule': 10.0,  # Every 10 seconds (only does work with COUNTERS_WRITE_BEHIND)
+    },
+    'maintain-message-partitions': {
+        'task': 'apps.agent.tasks.maintain_message_partitions',
+        'schedule': crontab(hour=4, minute=0),  # Daily at 04:00
+    },
 }
 
 app.conf.timezone = 'UTC'
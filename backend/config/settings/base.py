@@ -195,6 +195,42 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
+CELERY_TASK_MAX_PAYLOAD_BYTES = env.int('CELERY_TASK_MAX_PAYLOAD_BYTES', default=64 * 1024)  # larger task args are rejected
+
+# Ingestion progress (ProcessingJob)
+PROCESSING_PROGRESS_INTERVAL = env.float('PROCESSING_PROGRESS_INTERVAL', default=1.0)  # seconds between progress writes
+BULK_UPLOAD_MAX_FILES = env.int('BULK_UPLOAD_MAX_FILES', default=500)
+BULK_UPLOAD_MAX_ENTRIES = env.int('BULK_UPLOAD_MAX_ENTRIES', default=2000)  # zip entries incl. skipped ones
+BULK_UPLOAD_MAX_FILE_BYTES = env.int('BULK_UPLOAD_MAX_FILE_BYTES', default=50 * 1024 * 1024)  # per extracted entry
+BULK_UPLOAD_MAX_TOTAL_BYTES = env.int('BULK_UPLOAD_MAX_TOTAL_BYTES', default=500 * 1024 * 1024)  # all extracted entries
+
+# Boilerplate stripping before chunking (apps.documents.normalization)
+NORMALIZE_MIN_PAGES = env.int('NORMALIZE_MIN_PAGES', default=3)  # fewer pages: no repeated-line detection
+NORMALIZE_REPEAT_RATIO = env.float('NORMALIZE_REPEAT_RATIO', default=0.5)  # share of pages a line must appear on
+NORMALIZE_EDGE_LINES = env.int('NORMALIZE_EDGE_LINES', default=4)  # lines at top/bottom of a page treated as header/footer
+
+# Extracted document text is stored zstd-compressed in document_texts
+DOCUMENT_TEXT_ZSTD_LEVEL = env.int('DOCUMENT_TEXT_ZSTD_LEVEL', default=3)
+
+# Website/sitemap crawler (apps.documents.crawler)
+WEB_CRAWL_MAX_CONNECTIONS = env.int('WEB_CRAWL_MAX_CONNECTIONS', default=10)  # connection pool size per crawl
+WEB_CRAWL_PER_HOST = env.int('WEB_CRAWL_PER_HOST', default=2)  # concurrent requests to one host
+WEB_CRAWL_HOST_DELAY = env.float('WEB_CRAWL_HOST_DELAY', default=0.5)  # seconds between requests to one host
+WEB_CRAWL_TIMEOUT = env.float('WEB_CRAWL_TIMEOUT', default=15.0)  # seconds
+WEB_CRAWL_MAX_PAGES = env.int('WEB_CRAWL_MAX_PAGES', default=200)  # pages per web source
+WEB_CRAWL_MAX_BYTES = env.int('WEB_CRAWL_MAX_BYTES', default=5 * 1024 * 1024)  # per response body
+WEB_CRAWL_MAX_REDIRECTS = env.int('WEB_CRAWL_MAX_REDIRECTS', default=5)
+
+# Tenant-fair ingestion dispatch (apps.documents.dispatcher)
+INGESTION_QUEUE = env('INGESTION_QUEUE', default='celery')
+INGESTION_TENANT_CONCURRENCY = env.int('INGESTION_TENANT_CONCURRENCY', default=4)  # tasks in flight per tenant (x plan weight)
+INGESTION_MAX_IN_FLIGHT = env.int('INGESTION_MAX_IN_FLIGHT', default=32)  # tasks in flight across all tenants
+INGESTION_PLAN_WEIGHTS = {  # plan slug -> share of dispatch slots
+    'free': 1,
+    'starter': 2,
+    'professional': 3,
+    'enterprise': 4,
+}
 
 # Cache Configuration
 CACHES = {
@@ -233,13 +269,89 @@ if USE_S3:
     AWS_QUERYSTRING_AUTH = True
     AWS_QUERYSTRING_EXPIRE = 3600
 
+    # Ingestion downloads (apps.documents.storage)
+    S3_MAX_POOL_CONNECTIONS = env.int('S3_MAX_POOL_CONNECTIONS', default=20)
+    S3_SPOOL_MAX_MEMORY_MB = env.int('S3_SPOOL_MAX_MEMORY_MB', default=8)  # larger files spill to disk
+    S3_RANGED_GET_THRESHOLD_MB = env.int('S3_RANGED_GET_THRESHOLD_MB', default=16)
+    S3_RANGED_GET_CHUNK_MB = env.int('S3_RANGED_GET_CHUNK_MB', default=8)
+    S3_RANGED_GET_CONCURRENCY = env.int('S3_RANGED_GET_CONCURRENCY', default=4)
+
     # Storage backends
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
 
 # API Keys
 OPENAI_API_KEY = env('OPENAI_API_KEY', default='')
+OPENAI_BASE_URL = env('OPENAI_BASE_URL', default='')  # e.g. local fake OpenAI server
 GOOGLE_CLOUD_API_KEY = env('GOOGLE_CLOUD_API_KEY', default='')
+GOOGLE_VISION_API_ENDPOINT = env('GOOGLE_VISION_API_ENDPOINT', default='')  # e.g. local fake Vision server
+
+# Photo pre-processing before Vision
+VISION_MAX_IMAGE_EDGE = env.int('VISION_MAX_IMAGE_EDGE', default=1600)  # px, longest side
+VISION_JPEG_QUALITY = env.int('VISION_JPEG_QUALITY', default=85)
+VISION_PHASH_MAX_DISTANCE = env.int('VISION_PHASH_MAX_DISTANCE', default=5)  # bits; 0 = exact matches only
+VISION_PHASH_SCAN_LIMIT = env.int('VISION_PHASH_SCAN_LIMIT', default=5000)  # recent photos checked for near matches
+PENDING_PHOTOS_MIN_AGE_MINUTES = env.int('PENDING_PHOTOS_MIN_AGE_MINUTES', default=15)  # sweep only photos pending longer
+
+# Shared OpenAI client (apps.agent.llm)
+LLM_MAX_CONNECTIONS = env.int('LLM_MAX_CONNECTIONS', default=20)  # httpx pool per process
+LLM_MAX_KEEPALIVE = env.int('LLM_MAX_KEEPALIVE', default=10)
+LLM_KEEPALIVE_EXPIRY = env.float('LLM_KEEPALIVE_EXPIRY', default=30.0)  # seconds
+LLM_CONNECT_TIMEOUT = env.float('LLM_CONNECT_TIMEOUT', default=5.0)
+LLM_REQUEST_TIMEOUT = env.float('LLM_REQUEST_TIMEOUT', default=30.0)  # single attempt
+LLM_DEADLINE = env.float('LLM_DEADLINE', default=45.0)  # whole call incl. retries, below gunicorn timeout
+LLM_MAX_RETRIES = env.int('LLM_MAX_RETRIES', default=3)  # on 429/5xx/connection errors
+LLM_BACKOFF_BASE = env.float('LLM_BACKOFF_BASE', default=0.5)  # seconds, doubled per attempt
+LLM_BACKOFF_MAX = env.float('LLM_BACKOFF_MAX', default=8.0)
+LLM_HEDGE_ENABLED = env.bool('LLM_HEDGE_ENABLED', default=False)  # duplicate requests slower than p95
+
+# AI agent - context for a chat turn is assembled concurrently, each step with its own timeout (seconds)
+AGENT_CONTEXT_WORKERS = env.int('AGENT_CONTEXT_WORKERS', default=16)  # thread pool size per process
+AGENT_CONTEXT_TIMEOUTS = {
+    'prompt': env.float('AGENT_PROMPT_TIMEOUT', default=2.0),
+    'rag': env.float('AGENT_RAG_TIMEOUT', default=4.0),  # query embedding + pgvector search
+    'history': env.float('AGENT_HISTORY_TIMEOUT', default=2.0),
+    'calendar': env.float('AGENT_CALENDAR_TIMEOUT', default=2.5),  # Google Calendar round trip
+}
+
+# Tool calls - several calls in one response run concurrently; loop until a text answer
+AGENT_TOOL_WORKERS = env.int('AGENT_TOOL_WORKERS', default=8)  # thread pool size per process
+AGENT_TOOL_TIMEOUT = env.float('AGENT_TOOL_TIMEOUT', default=20.0)  # seconds per tool call
+AGENT_MAX_TOOL_STEPS = env.int('AGENT_MAX_TOOL_STEPS', default=3)  # tool rounds before an answer is forced
+
+# Prompt token budget (apps.agent.context_packer) - pieces beyond it are truncated or dropped
+AGENT_INPUT_TOKEN_BUDGET = env.int('AGENT_INPUT_TOKEN_BUDGET', default=6000)
+AGENT_USER_MESSAGE_MAX_TOKENS = env.int('AGENT_USER_MESSAGE_MAX_TOKENS', default=1000)
+AGENT_RAG_CHUNK_MAX_TOKENS = env.int('AGENT_RAG_CHUNK_MAX_TOKENS', default=600)
+AGENT_HISTORY_MESSAGE_MAX_TOKENS = env.int('AGENT_HISTORY_MESSAGE_MAX_TOKENS', default=400)
+AGENT_MIN_CONTEXT_PIECE_TOKENS = env.int('AGENT_MIN_CONTEXT_PIECE_TOKENS', default=50)  # smaller leftovers are dropped
+
+# Conversation history - last messages go verbatim, older ones as a rolling summary
+AGENT_HISTORY_MESSAGES = env.int('AGENT_HISTORY_MESSAGES', default=6)
+AGENT_SUMMARY_BATCH = env.int('AGENT_SUMMARY_BATCH', default=4)  # messages outside the window before re-summarizing
+AGENT_SUMMARY_MODEL = env('AGENT_SUMMARY_MODEL', default='gpt-3.5-turbo')
+AGENT_SUMMARY_MAX_TOKENS = env.int('AGENT_SUMMARY_MAX_TOKENS', default=400)
+
+# Semantic response cache (opt-in per Prompt.semantic_cache_enabled)
+AGENT_SEMANTIC_CACHE_THRESHOLD = env.float('AGENT_SEMANTIC_CACHE_THRESHOLD', default=0.96)  # min cosine similarity
+AGENT_SEMANTIC_CACHE_TTL_HOURS = env.int('AGENT_SEMANTIC_CACHE_TTL_HOURS', default=72)
+
+# Model routing (apps.agent.router) - easy turns go to a fast model
+AGENT_ROUTING_ENABLED = env.bool('AGENT_ROUTING_ENABLED', default=True)
+AGENT_FAST_MODEL = env('AGENT_FAST_MODEL', default='gpt-3.5-turbo')  # per tenant: Prompt.fast_model
+AGENT_ROUTING_MAX_FAST_TOKENS = env.int('AGENT_ROUTING_MAX_FAST_TOKENS', default=40)  # longer messages -> full model
+AGENT_ROUTING_MIN_RAG_SIMILARITY = env.float('AGENT_ROUTING_MIN_RAG_SIMILARITY', default=0.85)
+AGENT_ROUTING_MAX_FAST_HISTORY = env.int('AGENT_ROUTING_MAX_FAST_HISTORY', default=12)  # history messages
+
+# Conversation/integration counters (apps.agent.counters) - optionally buffered in Redis
+COUNTERS_WRITE_BEHIND = env.bool('COUNTERS_WRITE_BEHIND', default=False)
+COUNTERS_FLUSH_BATCH = env.int('COUNTERS_FLUSH_BATCH', default=1000)  # rows per flush
+
+# Monthly message partitions (apps.agent.partitions) - old months are archived to storage
+MESSAGE_PARTITIONS_AHEAD = env.int('MESSAGE_PARTITIONS_AHEAD', default=3)  # months created in advance
+MESSAGE_RETENTION_MONTHS = env.int('MESSAGE_RETENTION_MONTHS', default=12)  # without a plan; 0 - keep forever
+MESSAGE_RESTORE_KEEP_DAYS = env.int('MESSAGE_RESTORE_KEEP_DAYS', default=30)  # restored months before re-archiving
+
 STRIPE_SECRET_KEY = env('STRIPE_SECRET_KEY', default='')
 STRIPE_PUBLISHABLE_KEY = env('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_WEBHOOK_SECRET = env('STRIPE_WEBHOOK_SECRET', default='')
@@ -256,6 +368,10 @@ TWILIO_WHATSAPP_NUMBER = env('TWILIO_WHATSAPP_NUMBER', default='')
 GOOGLE_CLIENT_ID = env('GOOGLE_CLIENT_ID', default='')
 GOOGLE_CLIENT_SECRET = env('GOOGLE_CLIENT_SECRET', default='')
 
+# Initialized integration clients reused across chat turns (apps.integrations.client_pool)
+INTEGRATION_CLIENT_TTL = env.int('INTEGRATION_CLIENT_TTL', default=900)  # seconds
+INTEGRATION_CLIENT_POOL_SIZE = env.int('INTEGRATION_CLIENT_POOL_SIZE', default=500)  # clients per process
+
 # Frontend URL
 FRONTEND_URL = env('FRONTEND_URL', default='http://localhost:5173')
 
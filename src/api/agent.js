@@ -29,6 +29,8 @@ export const agentAPI = {
   // History
   getChatHistory: () => api.get('/agent/history/'),
   getChatDetail: (chatId) => api.get(`/agent/history/${chatId}/`),
+  getChatMessages: (chatId, cursor = null) =>
+    api.get(`/agent/history/${chatId}/messages/`, { params: cursor ? { cursor } : {} }),
 
   // Integrations
   getIntegrations: () => api.get('/integrations/'),